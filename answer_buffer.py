@@ -0,0 +1,366 @@
+"""答案的异步批量写入（write-behind）
+
+默认关闭（ANSWER_WRITE_BEHIND=1 开启）。开启后 submit_answer 不在请求里写库：
+答案先追加到本进程的缓冲文件（只 write 到页缓存，不 fsync），再放入有界队列，
+后台线程攒够 ANSWER_FLUSH_SIZE 条或每隔 ANSWER_FLUSH_INTERVAL 秒，
+把队列中的答案合并成一个事务批量写入（题目、答案、细分项汇总）。
+
+崩溃安全：
+- 缓冲文件按批次轮换，事务提交后才删除对应的文件
+- 同一事务中写入 AnswerSpoolBatch(批次 ID)，重放时跳过已提交的批次，不会重复写入
+- worker 的后台线程启动时接管已退出进程遗留的缓冲文件并重放
+- 队列满时 submit 返回 False，调用方退回同步写入，不丢弃答案
+- 批次因个别答案的数据错误（约束冲突、字段类型不对）写入失败时，改为逐条写入，
+  无法写入的答案移到死信文件（缓冲文件目录下的 dead_letter.jsonl），不阻塞后面的批次
+
+配置（环境变量）：
+    ANSWER_WRITE_BEHIND     设为 1 开启
+    ANSWER_BUFFER_MAX       队列上限（条），默认 1000
+    ANSWER_FLUSH_SIZE       攒够多少条立即写入，默认 50
+    ANSWER_FLUSH_INTERVAL   最长写入间隔（秒），默认 1
+    ANSWER_SPOOL_DIR        缓冲文件目录，默认 logs/answer_spool
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import DataError, IntegrityError
+
+from models import db, PracticeSession, Question, UserAnswer, AnswerSpoolBatch
+import question_templates
+import stats_rollup
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_SPOOL_DIR = os.path.join(basedir, 'logs', 'answer_spool')
+DEAD_LETTER_FILE = 'dead_letter.jsonl'
+
+# 说明答案本身有问题（重试也不会成功）的错误：批次改为逐条写入，挑出有问题的答案
+BAD_RECORD_ERRORS = (IntegrityError, DataError, KeyError, TypeError, ValueError)
+
+logger = logging.getLogger(__name__)
+
+
+def make_answer_record(user_id, session_id, question_data, correct_value, sub_item, user_answer,
+                       is_correct, response_time):
+    """submit_answer 的一条答案（可 JSON 序列化，写入缓冲文件）
+
+    客户端提交的字段在这里校验并转换类型，有问题时抛出 ValueError，
+    不让写不进数据库的答案进入批量写入队列
+    """
+    if not isinstance(question_data, dict):
+        raise ValueError('question_data 必须是对象')
+    if correct_value is None or correct_value == '':
+        raise ValueError('缺少正确答案')
+    try:
+        session_id = int(session_id)
+        response_time = float(response_time or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f'无效的会话 ID 或响应时间: {session_id!r}, {response_time!r}')
+    if not math.isfinite(response_time):
+        raise ValueError(f'无效的响应时间: {response_time!r}')
+    return {
+        'user_id': user_id,
+        'session_id': session_id,
+        'exercise_type': str(question_data.get('exercise_type') or ''),
+        'question_data': json.dumps(question_data),
+        'correct_answer': str(correct_value),
+        'sub_item': None if sub_item is None else str(sub_item),
+        'user_answer': None if user_answer is None else str(user_answer),
+        'is_correct': bool(is_correct),
+        'response_time': response_time,
+        'created_at': datetime.utcnow().isoformat(),
+    }
+
+
+def write_answers(records):
+    """把答案写入当前数据库会话（不提交）：批量插入题目和答案，并更新细分项汇总"""
+    session_ids = {record['session_id'] for record in records}
+    sessions = {s.id: s for s in PracticeSession.query.filter(PracticeSession.id.in_(session_ids))}
+    template_ids = question_templates.intern_many(
+        [(record['exercise_type'], record['question_data']) for record in records])
+
+    questions = []
+    for record, template_id in zip(records, template_ids):
+        questions.append(Question(
+            session_id=record['session_id'],
+            exercise_type=record['exercise_type'],
+            template_id=template_id,
+            correct_answer=record['correct_answer'],
+            sub_item=record['sub_item'],
+            created_at=datetime.fromisoformat(record['created_at']),
+        ))
+    db.session.add_all(questions)
+    db.session.flush()  # 获取 question.id（多行 INSERT）
+
+    answers = []
+    for record, question in zip(records, questions):
+        answers.append(UserAnswer(
+            user_id=record['user_id'],
+            question_id=question.id,
+            user_answer=record['user_answer'],
+            is_correct=record['is_correct'],
+            response_time=record['response_time'],
+            timestamp=datetime.fromisoformat(record['created_at']),
+        ))
+    db.session.add_all(answers)
+    stats_rollup.record_answers([(question, answer, sessions.get(record['session_id']))
+                                 for record, question, answer in zip(records, questions, answers)])
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AnswerBuffer:
+    """进程内的答案写入队列 + 缓冲文件 + 后台批量写入线程"""
+
+    def __init__(self, app, spool_dir=DEFAULT_SPOOL_DIR, max_size=1000, flush_size=50, flush_interval=1.0):
+        self.app = app
+        self.spool_dir = spool_dir
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        """（fork 后）重置本进程状态"""
+        self._queue = []  # 当前批次（与 _segment 文件内容一致）
+        self._segment = None  # (批次 ID, 文件路径, 文件对象)
+        self._pending = []  # 已轮换、待提交的批次 [(批次 ID, 文件路径, 记录列表)]
+        self._seq = itertools.count()
+        self._thread = None
+        self._stopping = False
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.fallbacks = 0
+        self.failures = 0
+        self.recovered = 0
+        self.dead_letters = 0
+
+    def submit(self, record):
+        """放入队列；队列已满时返回 False（调用方应同步写入）"""
+        with self._lock:
+            self._ensure_started()
+            if len(self._queue) + sum(len(batch[2]) for batch in self._pending) >= self.max_size:
+                self.fallbacks += 1
+                return False
+            if self._segment is None:
+                self._open_segment()
+            segment_file = self._segment[2]
+            segment_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            segment_file.flush()
+            self._queue.append(record)
+            self.submitted += 1
+            queued = len(self._queue)
+        if queued >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """把队列中的答案写入数据库，返回写入的条数"""
+        with self._flush_lock:
+            with self._lock:
+                self._rotate()
+                pending = list(self._pending)
+            written = 0
+            for batch in pending:
+                batch_id, path, records = batch
+                try:
+                    self._commit(batch_id, records)
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning("⚠️ 批量写入答案失败（%d 条，稍后重试）: %s", len(records), e)
+                    break
+                with self._lock:
+                    self._pending.remove(batch)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                written += len(records)
+            return written
+
+    def shutdown(self):
+        """停止后台线程并写入剩余答案（进程退出时调用）"""
+        if self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': len(self._queue) + sum(len(batch[2]) for batch in self._pending),
+                'submitted': self.submitted,
+                'written': self.written,
+                'batches': self.batches,
+                'fallbacks': self.fallbacks,
+                'failures': self.failures,
+                'recovered': self.recovered,
+                'dead_letters': self.dead_letters,
+            }
+
+    def _ensure_started(self):
+        # 调用方持有 _lock
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._reset()
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='answer-buffer', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def _run(self):
+        self._recover()
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _open_segment(self):
+        batch_id = f"answers-{os.getpid()}-{int(time.time() * 1000)}-{next(self._seq)}"
+        path = os.path.join(self.spool_dir, batch_id + '.jsonl')
+        self._segment = (batch_id, path, open(path, 'a', encoding='utf-8'))
+
+    def _rotate(self):
+        # 调用方持有 _lock：当前批次转入待提交列表，下一条答案写入新文件
+        if self._segment is None:
+            return
+        batch_id, path, segment_file = self._segment
+        segment_file.close()
+        self._segment = None
+        if self._queue:
+            self._pending.append((batch_id, path, self._queue))
+        else:
+            os.remove(path)
+        self._queue = []
+
+    def _commit(self, batch_id, records):
+        with self.app.app_context():
+            try:
+                if db.session.get(AnswerSpoolBatch, batch_id) is None:
+                    write_answers(records)
+                    db.session.add(AnswerSpoolBatch(id=batch_id))
+                    db.session.commit()
+                    self.written += len(records)
+                    self.batches += 1
+                return
+            except BAD_RECORD_ERRORS as e:
+                db.session.rollback()
+                logger.warning("⚠️ 答案批次 %s 含有无法写入的答案，改为逐条写入: %s", batch_id, e)
+            except Exception:
+                db.session.rollback()
+                raise
+            self._commit_one_by_one(batch_id, records)
+
+    def _commit_one_by_one(self, batch_id, records):
+        """逐条写入批次中的答案，无法写入的移到死信文件；每条单独记录批次 ID（<批次 ID>#<序号>），重放时跳过已写入的"""
+        # 调用方已进入 app_context
+        for i, record in enumerate(records):
+            record_id = f"{batch_id}#{i}"
+            try:
+                if db.session.get(AnswerSpoolBatch, record_id) is not None:
+                    continue
+                write_answers([record])
+                db.session.add(AnswerSpoolBatch(id=record_id))
+                db.session.commit()
+                self.written += 1
+            except BAD_RECORD_ERRORS as e:
+                db.session.rollback()
+                self._dead_letter(batch_id, record, e)
+            except Exception:
+                # 数据库暂时不可用等：整批稍后重试（已写入的答案不会重复写入）
+                db.session.rollback()
+                raise
+        try:
+            db.session.add(AnswerSpoolBatch(id=batch_id))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.batches += 1
+
+    def _dead_letter(self, batch_id, record, error):
+        path = os.path.join(self.spool_dir, DEAD_LETTER_FILE)
+        entry = {'batch_id': batch_id, 'error': f'{type(error).__name__}: {error}', 'record': record}
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.dead_letters += 1
+        logger.error("💀 答案无法写入数据库，已移到 %s: %s", path, error)
+
+    def _recover(self):
+        """接管已退出进程遗留的缓冲文件，加入待提交列表"""
+        try:
+            names = sorted(os.listdir(self.spool_dir))
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith('.jsonl'):
+                continue
+            # 遗留文件为 answers-<pid>-...，接管中的文件为 claimed-<pid>--answers-<pid>-...
+            if name.startswith('claimed-'):
+                owner, _, base = name[len('claimed-'):].partition('--')
+            elif name.startswith('answers-'):
+                owner, base = name.split('-')[1], name
+            else:
+                continue
+            if not owner.isdigit() or int(owner) == os.getpid() or _pid_alive(int(owner)):
+                continue
+            claimed = os.path.join(self.spool_dir, f"claimed-{os.getpid()}--{base}")
+            try:
+                os.rename(os.path.join(self.spool_dir, name), claimed)
+            except OSError:
+                continue  # 已被其他 worker 接管
+            records = []
+            with open(claimed, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break  # 进程退出时写了一半的最后一行
+            if not records:
+                os.remove(claimed)
+                continue
+            with self._lock:
+                self._pending.append((base[:-len('.jsonl')], claimed, records))
+                self.recovered += len(records)
+        if self._pending:
+            logger.info("♻️ 接管遗留的答案缓冲 %d 条", self.recovered)
+            self._wakeup.set()
+
+
+def from_env(app):
+    """根据环境变量创建 AnswerBuffer；未开启时返回 None"""
+    if os.environ.get('ANSWER_WRITE_BEHIND', '0') != '1':
+        return None
+    return AnswerBuffer(
+        app,
+        spool_dir=os.environ.get('ANSWER_SPOOL_DIR', DEFAULT_SPOOL_DIR),
+        max_size=int(os.environ.get('ANSWER_BUFFER_MAX', '1000')),
+        flush_size=int(os.environ.get('ANSWER_FLUSH_SIZE', '50')),
+        flush_interval=float(os.environ.get('ANSWER_FLUSH_INTERVAL', '1')),
+    )
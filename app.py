@@ -1,43 +1,95 @@
 from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from models import db, User, PracticeSession, UserAnswer, Question
+from models import db, User, PracticeSession
+from sample_bank import get_sample_bank, convert_note_name as sample_note_name
+import audio_engine
+from audio_cache import RenderTimeout, get_render_cache, render_key
+from question_index import IntervalQuestionIndex
+from knowledge_cache import get_knowledge_cache
+import identity_cache
+import static_assets
+import song_segments
+import audio_delivery
+import audio_profiles
+import audio_sprites
+import stats_rollup
+import db_migrations
+import sqlite_profile
+import answer_buffer
+import request_timing
+import structured_logging
+import log_tail
+import log_archive
 from datetime import datetime, timedelta, date
+from collections import namedtuple
+import hashlib
 import random
 import os
 import json
 import logging
-import sys
+import time
+import fcntl
 
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+# 结构化日志（JSON 行、分级、队列异步写出，见 structured_logging.py）
+structured_logging.configure()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'opear_secret_key_2025'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, '..', 'opear.db')
-# 禁用静态文件缓存（开发环境）
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('OPEAR_DATABASE_URI', 'sqlite:///' + os.path.join(basedir, '..', 'opear.db'))
+# SQLite 引擎配置（WAL、busy_timeout 等，见 sqlite_profile.py）
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlite_profile.engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# 禁用静态文件缓存（开发环境）；带内容哈希版本号的 URL 在 set_cache_control 中长期缓存
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+# url_for('static', ...) 自动带上 ?v=<内容哈希>（见 static_assets.py）
+app.url_defaults(static_assets.add_static_version)
+static_assets.get_asset_manifest().prime()
 db.init_app(app)
+with app.app_context():
+    sqlite_profile.install(db.engine)
+    # SQL 执行耗时计入请求计时的 db 阶段（见 request_timing.py）
+    if request_timing.enabled():
+        request_timing.install_sql_timer(db.engine)
+
+# 答案异步批量写入（ANSWER_WRITE_BEHIND=1 开启，见 answer_buffer.py）
+answer_writer = answer_buffer.from_env(app)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# 登录用户按 id 缓存在进程内，已登录的请求不必每次查询 user 表（见 identity_cache.py）
+identity_cache.install(User)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity_cache.get_identity_cache().get(int(user_id), lambda uid: db.session.get(User, uid))
 
 # 添加缓存控制头
 @app.after_request
 def set_cache_control(response: Response):
     """设置缓存控制头，防止浏览器缓存HTML页面"""
+    # 带当前内容版本号的静态文件和音频：长期缓存，不再重新验证
+    if request.endpoint in ('static', 'serve_audio'):
+        filename = (request.view_args or {}).get('filename', '')
+        if request.endpoint == 'serve_audio':
+            filename = 'audio/' + filename
+        if static_assets.is_current_version(filename, request.args.get('v')):
+            response.headers['Cache-Control'] = static_assets.IMMUTABLE_CACHE_CONTROL
+            return response
     # 对于HTML页面，禁用缓存
     if response.content_type and 'text/html' in response.content_type:
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0'
         response.headers['Pragma'] = 'no-cache'
         response.headers['Expires'] = '0'
-    # 对于JSON响应，也禁用缓存
-    elif response.content_type and 'application/json' in response.content_type:
+        # 请求浏览器在后续请求中带上网络状况提示（出题时选择音频编码档位，见 audio_profiles.py）
+        response.headers['Accept-CH'] = 'Save-Data, ECT, Downlink'
+    # 对于JSON响应，也禁用缓存（视图已自行设置缓存策略的除外，如带版本号的知识库数据）
+    elif response.content_type and 'application/json' in response.content_type and 'Cache-Control' not in response.headers:
         response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
         response.headers['Pragma'] = 'no-cache'
     # 对于静态文件（CSS/JS），设置较短的缓存时间（开发环境）
@@ -45,6 +97,41 @@ def set_cache_control(response: Response):
         response.headers['Cache-Control'] = 'no-cache, must-revalidate'
     return response
 
+# 请求分阶段计时：Server-Timing 响应头 + 按接口的延迟直方图（见 request_timing.py）
+@app.before_request
+def start_request_timing():
+    if request_timing.enabled():
+        request_timing.start()
+
+@app.after_request
+def add_server_timing(response: Response):
+    timing = request_timing.finish()
+    if timing is None:
+        return response
+    total, durations, counts = timing
+    response.headers['Server-Timing'] = request_timing.server_timing_header(total, durations, counts)
+    request_timing.get_histograms().observe_request(request.endpoint or 'not_found', total, durations)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus 文本格式的请求延迟直方图（合并所有 gunicorn worker）"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('unauthorized\n', status=401, mimetype='text/plain')
+    body = request_timing.render_prometheus(request_timing.get_histograms().merged())
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+@app.context_processor
+def inject_audio_base_url():
+    """前端拼接音频地址的前缀（见 audio_delivery.py）"""
+    return {'audio_base_url': audio_delivery.base_url()}
+
+@app.route('/audio/<path:filename>')
+def serve_audio(filename):
+    """校验音频路径后发送，或交给反向代理发送（X-Accel-Redirect / X-Sendfile）"""
+    return audio_delivery.deliver(filename)
+
 # 练习类型定义
 EXERCISE_TYPES = {
     'interval': {
@@ -120,6 +207,10 @@ for octave in octaves:
     for note in note_letters:
         NOTE_NAMES.append(f"{note}{octave}")
 
+# 音程题目索引（导入时预先计算所有合法组合，并预热默认过滤条件）
+INTERVAL_INDEX = IntervalQuestionIndex(len(NOTE_NAMES), INTERVALS)
+INTERVAL_INDEX.candidates([v['name'] for v in INTERVALS.values()], ['up', 'down'])
+
 # 音阶定义（半音数序列，从根音开始）
 SCALES = {
     'major': {
@@ -266,7 +357,6 @@ ROMAN_NUMERAL_CHORDS = {
 def generate_interval_audio(note1, note2, duration=1.0):
     """生成音程音频文件"""
     try:
-        import numpy as np
         from scipy.io import wavfile
         
         # 音频文件路径
@@ -297,7 +387,7 @@ def generate_interval_audio(note1, note2, duration=1.0):
         
         # 确保采样率相同
         if sr1 != sr2:
-            print(f"采样率不同: {sr1} vs {sr2}")
+            logger.warning("采样率不同: %s vs %s", sr1, sr2)
             return False
         
         # 处理可能的多声道音频（如果是立体声，取左声道）
@@ -306,21 +396,13 @@ def generate_interval_audio(note1, note2, duration=1.0):
         if len(audio2.shape) > 1:
             audio2 = audio2[:, 0]
         
-        # 取每个音符的前1秒
+        # 取每个音符的前1秒（不足1秒用零填充）
         samples_per_second = sr1
-        audio1_1sec = audio1[:min(samples_per_second, len(audio1))]
-        audio2_1sec = audio2[:min(samples_per_second, len(audio2))]
-        
-        # 如果音频长度不足1秒，用零填充
-        if len(audio1_1sec) < samples_per_second:
-            padding1 = np.zeros(samples_per_second - len(audio1_1sec), dtype=audio1_1sec.dtype)
-            audio1_1sec = np.concatenate([audio1_1sec, padding1])
-        if len(audio2_1sec) < samples_per_second:
-            padding2 = np.zeros(samples_per_second - len(audio2_1sec), dtype=audio2_1sec.dtype)
-            audio2_1sec = np.concatenate([audio2_1sec, padding2])
+        audio1_1sec = audio_engine.fit_frames(audio1, samples_per_second)
+        audio2_1sec = audio_engine.fit_frames(audio2, samples_per_second)
         
         # 拼接两个音符（先播放note1，再播放note2）
-        combined_audio = np.concatenate([audio1_1sec, audio2_1sec])
+        combined_audio = audio_engine.concat([audio1_1sec, audio2_1sec])
         
         # 保存音频文件
         wavfile.write(output_path, sr1, combined_audio)
@@ -328,20 +410,99 @@ def generate_interval_audio(note1, note2, duration=1.0):
         return True
         
     except Exception as e:
-        print(f"生成音频失败: {e}")
+        logger.exception("生成音频失败: %s", e)
         return False
 
-def generate_chord_audio(chord_notes, duration=2.0):
+def build_chord_notes(root_note_letter, chord_type, octave=4):
+    """计算和弦中的所有音符（如 ('C', 'major') -> ['C4', 'E4', 'G4']）"""
+    root_idx = KEYS.index(root_note_letter)
+    chord_notes = []
+    for semitone_offset in CHORD_TYPES[chord_type]['pattern']:
+        note_idx_in_octave = (root_idx + semitone_offset) % 12
+        note_letter = note_letters[note_idx_in_octave]
+        # 计算实际八度（考虑跨八度的情况）
+        actual_octave = octave + (semitone_offset // 12)
+        chord_notes.append(f"{note_letter}{actual_octave}")
+    return chord_notes
+
+def build_scale_audio_notes(key, scale_type, octave):
+    """完整音阶音频使用的音符：一个八度的音阶音 + 高八度根音"""
+    root_idx = KEYS.index(key)
+    scale_notes = []
+    for semitone_offset in SCALES[scale_type]['pattern']:
+        note_letter = note_letters[(root_idx + semitone_offset) % 12]
+        actual_octave = octave + (root_idx + semitone_offset) // 12
+        scale_notes.append(f"{note_letter}{actual_octave}")
+    scale_notes.append(f"{key}{octave + 1}")
+    return scale_notes
+
+# 音程音频对每个音符及整体做音量归一化（与 static/audio/interval 中已有文件的生成方式一致）
+INTERVAL_NORMALIZE = True
+
+def generate_interval_mp3(note1_openear, note2_openear, normalize=INTERVAL_NORMALIZE, force=False):
+    """生成音程音频文件（两个音符各取1秒，无缝衔接）
+    
+    参数:
+        note1_openear / note2_openear: 音源格式的音符名称（如 'Cs4'）
+        normalize: 是否对每个音符和整体做峰值归一化
+        force: 为 True 时忽略缓存清单重新生成（离线预渲染使用）
+    
+    返回:
+        相对路径（如 'interval/C4_G4_1sec.mp3'），音源不存在返回 None；生成失败抛出异常
+        （其他 worker 正在渲染同一文件且等待超时抛出 RenderTimeout）
+    """
+    bank = get_sample_bank('piano')
+    if not bank.has(note1_openear) or not bank.has(note2_openear):
+        return None
+    
+    # 生成输出文件名（保持与现有文件一致：每个音符1秒）
+    safe_note1 = note1_openear.replace('#', 'sharp')
+    safe_note2 = note2_openear.replace('#', 'sharp')
+    output_rel = f"interval/{safe_note1}_{safe_note2}_1sec.mp3"
+    
+    # 查询生成音频缓存清单（只查内存，输入变化时哈希不同会自动重新生成）
+    cache = get_render_cache()
+    cache_key = render_key('interval', [note1_openear, note2_openear],
+                           duration_ms=1000, normalize=normalize)
+    if not force and audio_profiles.lookup(cache, output_rel, cache_key):
+        return output_rel
+    
+    # 从采样库加载两个音符（已解码的音符直接复用）
+    sample1 = bank.get(note1_openear)
+    sample2 = bank.get(note2_openear)
+    
+    # 每个音符取1秒（1000毫秒），与现有文件保持一致
+    parts, frame_rate = audio_engine.conform([
+        (audio_engine.slice_ms(sample1.pcm, sample1.frame_rate, 0, 1000), sample1.frame_rate),
+        (audio_engine.slice_ms(sample2.pcm, sample2.frame_rate, 0, 1000), sample2.frame_rate),
+    ])
+    if normalize:
+        parts = [audio_engine.normalize(part) for part in parts]
+    
+    # 拼接两个音符（无缝衔接）
+    combined_audio = audio_engine.concat(parts)
+    if normalize:
+        combined_audio = audio_engine.normalize(combined_audio)
+    
+    # 导出为MP3及启用的编码档位（先写临时文件再原子替换，同一文件跨进程只渲染一次，见 audio_cache.py）
+    return audio_profiles.publish(cache, output_rel, cache_key, combined_audio, frame_rate, force=force)
+
+# 和弦叠加会削波时，峰值缩放到满刻度以下的分贝数（见 audio_engine.mix）
+CHORD_HEADROOM_DB = 1.0
+
+def generate_chord_audio(chord_notes, duration=2.0, force=False):
     """
     生成和弦音频文件（多个音符同时播放）
     
     参数:
         chord_notes: 音符名称列表，如 ['C4', 'E4', 'G4']
         duration: 音频时长（秒），默认2秒
+        force: 为 True 时忽略缓存清单重新生成（离线预渲染使用）
     
     返回:
         成功返回相对路径（如 'chords/C4_E4_G4_2sec.mp3'），失败返回 None
-        如果文件已存在，直接返回路径（复用）
+        如果缓存清单中已有相同输入生成的文件，直接返回路径（复用）
+        其他 worker 正在渲染同一文件且等待超时抛出 RenderTimeout
     """
     try:
         from pydub import AudioSegment
@@ -359,92 +520,105 @@ def generate_chord_audio(chord_notes, duration=2.0):
         safe_notes = [convert_note_name(note).replace('#', 's') for note in chord_notes]
         filename = '_'.join(safe_notes) + f'_{int(duration)}sec.mp3'
         
-        # 创建输出目录
-        chords_dir = os.path.join(basedir, 'static', 'audio', 'chords')
-        os.makedirs(chords_dir, exist_ok=True)
-        
-        # 输出文件路径
-        output_path = os.path.join(chords_dir, filename)
+        output_rel = f"chords/{filename}"
         
-        # 如果文件已存在，直接返回（复用）
-        if os.path.exists(output_path):
-            print(f"♻️ 复用已存在的和弦音频: {filename}")
-            return f"chords/{filename}"
+        # 查询生成音频缓存清单，输入未变化时直接复用
+        cache = get_render_cache()
+        cache_key = render_key('chord', [convert_note_name(note) for note in chord_notes],
+                               duration_ms=int(duration * 1000))
+        if not force and audio_profiles.lookup(cache, output_rel, cache_key):
+            logger.debug("♻️ 复用已存在的和弦音频: %s", filename)
+            return output_rel
         
-        # 检查音源文件是否存在
-        piano_samples_dir = os.path.join(basedir, 'static', 'audio', 'samples', 'piano')
+        # 检查音源文件是否存在（从进程级采样库读取，已解码的音符不再调用 ffmpeg）
+        bank = get_sample_bank('piano')
         
         # 加载所有音符音频
-        audio_segments = []
+        samples = []
         for note in chord_notes:
             note_openear = convert_note_name(note)
-            note_file = os.path.join(piano_samples_dir, f"{note_openear}.mp3")
+            note_file = bank.path(note_openear)
             
-            if not os.path.exists(note_file):
-                print(f"⚠️ 和弦音符文件不存在: {note} -> {note_openear} -> {note_file}")
+            if not bank.has(note_openear):
+                logger.warning("⚠️ 和弦音符文件不存在: %s -> %s -> %s", note, note_openear, note_file)
                 return None
             
             try:
-                # 使用 pydub 加载 MP3 文件
-                audio = AudioSegment.from_mp3(note_file)
-                # 裁剪到指定时长
-                audio = audio[:int(duration * 1000)]  # pydub 使用毫秒
-                audio_segments.append(audio)
+                sample = bank.get(note_openear)
+                # 裁剪到指定时长（毫秒）
+                samples.append((audio_engine.slice_ms(sample.pcm, sample.frame_rate, 0, int(duration * 1000)),
+                                sample.frame_rate))
             except Exception as e:
-                print(f"⚠️ 加载音符文件失败 {note_file}: {e}")
+                logger.warning("⚠️ 加载音符文件失败 %s: %s", note_file, e)
                 return None
         
-        if not audio_segments:
-            print("⚠️ 没有可用的音频片段")
+        if not samples:
+            logger.warning("⚠️ 没有可用的音频片段")
             return None
         
-        # 混合所有音频（同时播放）
-        # pydub 的 overlay 方法可以混合多个音频
-        mixed_audio = audio_segments[0]
-        for audio_seg in audio_segments[1:]:
-            mixed_audio = mixed_audio.overlay(audio_seg)
+        # 混合所有音频（同时播放），一次累加完成，结果与逐个 overlay 一致；
+        # 音符多的和弦叠加后会削波时改为按峰值留余量（不削波的和弦与已缓存文件一致）
+        tracks, frame_rate = audio_engine.conform(samples)
+        mixed_audio = audio_engine.mix(tracks, headroom_db=CHORD_HEADROOM_DB)
         
-        # 导出为 MP3
-        mixed_audio.export(output_path, format="mp3")
+        # 导出为 MP3 及启用的编码档位（先写临时文件再原子替换，同一文件跨进程只渲染一次）
+        audio_profiles.publish(cache, output_rel, cache_key, mixed_audio, frame_rate, force=force)
         
-        print(f"✅ 生成和弦音频: {filename}")
+        logger.info("✅ 生成和弦音频: %s", filename)
         # 返回相对路径
-        return f"chords/{filename}"
+        return output_rel
         
     except ImportError:
-        print("⚠️ pydub 未安装，无法生成和弦音频")
+        logger.warning("⚠️ pydub 未安装，无法生成和弦音频")
         return None
+    except RenderTimeout:
+        raise
     except Exception as e:
-        print(f"❌ 生成和弦音频失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ 生成和弦音频失败: %s", e)
         return None
 
 # 加载Tips和歌曲数据
+# 结果缓存在进程内，文件修改后自动重新加载（见 knowledge_cache.py）；返回的是共享对象，不要修改
+TIPS_FILE = os.path.join(basedir, '..', 'data', 'tips.json')
+SONGS_DIRS = [
+    os.path.join(basedir, 'data', 'songs'),
+    # 尝试另一个路径
+    os.path.join(os.path.dirname(basedir), 'openEar', 'data', 'songs'),
+]
+
+# 歌曲数据的预处理结果：data 为 {练习类型: {key: 歌曲列表}}，
+# payloads 为 {练习类型: KnowledgePayload}，即 /api/songs/<练习类型> 的响应（预先序列化）
+SongsIndex = namedtuple('SongsIndex', ['data', 'payloads'])
+# 知识库数据接口的响应体和 ETag（内容哈希，同时作为 URL 中的版本号）
+KnowledgePayload = namedtuple('KnowledgePayload', ['body', 'etag'])
+
+def _knowledge_payload(value):
+    body = app.json.dumps(value).encode('utf-8')
+    return KnowledgePayload(body, hashlib.sha1(body).hexdigest()[:16])
+
+def _read_tips_data():
+    if os.path.exists(TIPS_FILE):
+        with open(TIPS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f), [TIPS_FILE]
+    return {}, [TIPS_FILE]
+
 def load_tips_data():
     """从数据文件加载Tips"""
-    tips_file = os.path.join(basedir, '..', 'data', 'tips.json')
-    if os.path.exists(tips_file):
-        with open(tips_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    return get_knowledge_cache().get('tips', _read_tips_data)
 
-def load_songs_data():
-    """从data/songs目录加载歌曲数据"""
+def _read_songs_data():
     songs_data = {}
-    songs_dir = os.path.join(basedir, 'data', 'songs')
-    
-    if not os.path.exists(songs_dir):
-        # 尝试另一个路径
-        songs_dir = os.path.join(os.path.dirname(basedir), 'openEar', 'data', 'songs')
-        if not os.path.exists(songs_dir):
-            return {}
+    songs_dir = next((d for d in SONGS_DIRS if os.path.exists(d)), None)
+    if songs_dir is None:
+        return SongsIndex({}, {}), SONGS_DIRS
+    watched = [songs_dir]
     
     # 遍历songs目录下的所有子目录（interval, scale_degree, chord_quality等）
     for exercise_type_dir in os.listdir(songs_dir):
         exercise_type_path = os.path.join(songs_dir, exercise_type_dir)
         if not os.path.isdir(exercise_type_path):
             continue
+        watched.append(exercise_type_path)
         
         # 初始化该练习类型的数据结构
         if exercise_type_dir not in songs_data:
@@ -458,6 +632,7 @@ def load_songs_data():
             # 获取文件名（不含扩展名）作为key，如major_second
             key = json_file[:-5]  # 去掉.json后缀
             json_path = os.path.join(exercise_type_path, json_file)
+            watched.append(json_path)
             
             try:
                 with open(json_path, 'r', encoding='utf-8') as f:
@@ -468,29 +643,70 @@ def load_songs_data():
                     else:
                         songs_data[exercise_type_dir][key] = []
             except Exception as e:
-                print(f"加载歌曲文件失败 {json_path}: {e}")
+                logger.warning("加载歌曲文件失败 %s: %s", json_path, e)
                 continue
     
-    return songs_data
+    payloads = {exercise_type: _knowledge_payload({exercise_type: songs})
+                for exercise_type, songs in songs_data.items()}
+    return SongsIndex(songs_data, payloads), watched
+
+def load_songs_index():
+    """歌曲数据及各练习类型预先序列化的接口响应"""
+    return get_knowledge_cache().get('songs', _read_songs_data)
+
+def load_songs_data():
+    """从data/songs目录加载歌曲数据"""
+    return load_songs_index().data
 
 def load_intervals_scales_kb():
     """加载音程和音阶知识库（已废弃，改用Markdown笔记）"""
     return {'intervals': [], 'scales': []}
 
-def load_notes_markdown(note_type='intervals'):
-    """加载音程或音阶的Markdown笔记"""
-    notes_file = os.path.join(basedir, 'knowledge_base', 'videos', 'notes', f'{note_type}.md')
-    if not os.path.exists(notes_file):
-        notes_file = os.path.join(os.path.dirname(basedir), 'openEar', 'knowledge_base', 'videos', 'notes', f'{note_type}.md')
-    
-    if os.path.exists(notes_file):
+def _read_notes_markdown(note_type):
+    candidates = [
+        os.path.join(basedir, 'knowledge_base', 'videos', 'notes', f'{note_type}.md'),
+        os.path.join(os.path.dirname(basedir), 'openEar', 'knowledge_base', 'videos', 'notes', f'{note_type}.md'),
+    ]
+    notes_file = next((f for f in candidates if os.path.exists(f)), None)
+    if notes_file is not None:
         try:
             with open(notes_file, 'r', encoding='utf-8') as f:
-                return f.read()
+                return f.read(), candidates
         except Exception as e:
-            print(f"加载笔记文件失败: {e}")
-            return None
-    return None
+            logger.warning("加载笔记文件失败: %s", e)
+    return None, candidates
+
+def load_notes_markdown(note_type='intervals'):
+    """加载音程或音阶的Markdown笔记"""
+    return get_knowledge_cache().get(f'notes:{note_type}', lambda: _read_notes_markdown(note_type))
+
+def _read_notes_payload(note_type):
+    markdown, paths = _read_notes_markdown(note_type)
+    if markdown is None:
+        return None, paths
+    return _knowledge_payload({'note_type': note_type, 'markdown': markdown}), paths
+
+def load_notes_payload(note_type):
+    """/api/notes/<note_type> 的响应（笔记不存在时为 None）"""
+    return get_knowledge_cache().get(f'notes_payload:{note_type}', lambda: _read_notes_payload(note_type))
+
+def songs_payload(exercise_type):
+    """/api/songs/<exercise_type> 的响应（没有该练习类型的歌曲时为空对象）"""
+    return load_songs_index().payloads.get(exercise_type) or _knowledge_payload({})
+
+def knowledge_response(payload):
+    """带版本号的知识库数据响应
+
+    URL 中的 v 与当前内容的 ETag 相同时长期缓存（内容变化后页面会带上新的版本号）；
+    版本号过期或缺省时要求每次用 ETag 验证，If-None-Match 命中时返回 304。
+    """
+    response = Response(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    if request.args.get('v') == payload.etag:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 def match_interval_to_kb(interval_name, kb_data, direction='ascending'):
     """根据音程名称匹配知识库数据"""
@@ -619,14 +835,38 @@ def match_scale_to_kb(scale_name, kb_data):
     
     return None
 
-# 初始化数据库
-init_done = False
-@app.before_request
-def create_tables():
-    global init_done
-    if not init_done:
-        db.create_all()
-        init_done = True
+# 应用启动阶段：数据库结构准备和预热，由启动入口显式调用（gunicorn_config.py 的 post_fork、
+# run_production.py 和本文件的 __main__，以及需要数据库的脚本），不在导入 app 时执行，
+# 也不再由第一个请求的 before_request 触发
+STARTUP_LOCK_FILE = os.environ.get('STARTUP_LOCK_FILE') or os.path.join(basedir, 'logs', '.startup.lock')
+
+def initialize_app():
+    """建表、补列和索引、首次部署时重建汇总表，然后预热进程内缓存
+
+    多个 worker 同时启动时用文件锁串行执行：第一个完成建表和迁移后，其余的只做一次检查。
+    """
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(STARTUP_LOCK_FILE), exist_ok=True)
+    with open(STARTUP_LOCK_FILE, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            with app.app_context():
+                db.create_all()
+                # 为已有数据库补建索引
+                created = db_migrations.upgrade()
+                if created:
+                    logger.info("🔧 数据库结构已升级: %s", ', '.join(created))
+                # 首次部署汇总表时从已有记录重建
+                stats_rollup.backfill_if_empty()
+                db.session.remove()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    # 预热：知识库文件解析一次放进进程内缓存，第一个练习页请求不必再读文件
+    load_tips_data()
+    load_songs_data()
+    for note_type in ('intervals', 'scales'):
+        load_notes_payload(note_type)
+    logger.info("✅ 启动阶段完成，耗时 %.0f ms", (time.perf_counter() - start) * 1000)
 
 # 路由
 def get_accuracy_level(accuracy):
@@ -648,25 +888,23 @@ def index():
     # 获取用户统计数据
     exercise_stats = {}
     if current_user.is_authenticated:
+        # 一次查询读出该用户所有练习类型的汇总
+        totals = stats_rollup.exercise_totals(current_user.id)
         for exercise_type in EXERCISE_TYPES.keys():
-            # 查询该练习类型的所有会话
-            sessions = PracticeSession.query.filter_by(
-                user_id=current_user.id,
-                exercise_type=exercise_type
-            ).all()
+            row = totals.get(exercise_type)
             
             # 计算总时长（分钟）
-            total_duration_minutes = sum((s.duration or 0) for s in sessions) // 60
+            total_duration_minutes = (row.duration if row else 0) // 60
             
             # 计算总题数和正确数
-            total_questions = sum((s.total_questions or 0) for s in sessions)
-            total_correct = sum((s.correct_answers or 0) for s in sessions)
+            total_questions = row.total_questions if row else 0
+            total_correct = row.correct_answers if row else 0
             
             # 计算准确率
             accuracy = (total_correct / total_questions * 100) if total_questions > 0 else 0
             
             # 计算练习次数
-            practice_count = len(sessions)
+            practice_count = row.practice_count if row else 0
             
             # 获取等级
             level = get_accuracy_level(accuracy) if total_questions > 0 else 'E'
@@ -707,11 +945,8 @@ def practice(exercise_type):
         return redirect(url_for('index'))
     
     tips_data = load_tips_data()
-    songs_data = load_songs_data()
-    
-    # 加载Markdown笔记
-    intervals_notes = load_notes_markdown('intervals')
-    scales_notes = load_notes_markdown('scales')
+    # 参考歌曲和笔记不再嵌入页面，由前端按需从带版本号的接口加载（可长期缓存）
+    songs_url = url_for('get_songs', exercise_type=exercise_type, v=songs_payload(exercise_type).etag)
     
     # 为了向后兼容，保留空的kb字典
     intervals_kb = {}
@@ -725,15 +960,41 @@ def practice(exercise_type):
                          keys=KEYS,
                          chord_types=CHORD_TYPES,
                          tips=tips_data.get(exercise_type, {}),
-                         songs_data=songs_data,  # 传递完整的songs_data
-                         songs=songs_data.get(exercise_type, {}),  # 向后兼容
+                         songs_url=songs_url,
+                         song_segments_enabled=song_segments.segments_enabled(),
                          intervals_kb=intervals_kb,
                          scales_kb=scales_kb,
-                         intervals_notes=intervals_notes,
-                         scales_notes=scales_notes,
                          current_user=current_user)
 
-def generate_root_audio_4sec(key, octave, root_note_openear, piano_samples_dir):
+@app.route('/api/songs/<exercise_type>')
+def get_songs(exercise_type):
+    """练习类型的参考歌曲 {练习类型: {key: 歌曲列表}}"""
+    return knowledge_response(songs_payload(exercise_type))
+
+@app.route('/api/notes/<note_type>')
+def get_notes(note_type):
+    """音程或音阶的Markdown笔记"""
+    payload = load_notes_payload(note_type) if note_type in ('intervals', 'scales') else None
+    if payload is None:
+        return jsonify({'status': 'error', 'msg': '笔记不存在'}), 404
+    return knowledge_response(payload)
+
+def _debug_list_samples(piano_samples_dir, note_openear):
+    """DEBUG 级别：列出音源目录中与 note_openear 相近的文件（排查文件名不匹配）；其他级别不访问磁盘"""
+    if not logger.isEnabledFor(logging.DEBUG) or not os.path.exists(piano_samples_dir):
+        return
+    try:
+        files = os.listdir(piano_samples_dir)
+    except OSError as e:
+        logger.debug("   无法列出目录文件: %s", e)
+        return
+    similar_files = [f for f in files if note_openear.split('s')[0] in f]
+    if similar_files:
+        logger.debug("   目录 %s 中的文件数量: %d，相似文件: %s", piano_samples_dir, len(files), similar_files[:5])
+    else:
+        logger.debug("   目录 %s 中的文件数量: %d，前5个文件: %s", piano_samples_dir, len(files), files[:5])
+
+def generate_root_audio_4sec(key, octave, root_note_openear, piano_samples_dir, force=False):
     """生成4秒的根音音频文件
     
     Args:
@@ -741,6 +1002,7 @@ def generate_root_audio_4sec(key, octave, root_note_openear, piano_samples_dir):
         octave: 八度（如 4）
         root_note_openear: 根音名称（openEar格式，如 'C4'）
         piano_samples_dir: 钢琴样本目录
+        force: 为 True 时忽略缓存清单重新生成（离线预渲染使用）
     
     Returns:
         成功返回文件路径（相对于 static/audio/），失败返回 None
@@ -749,90 +1011,63 @@ def generate_root_audio_4sec(key, octave, root_note_openear, piano_samples_dir):
         from pydub import AudioSegment
     except ImportError as e:
         # 如果没有pydub，直接返回None
-        print(f"⚠️ pydub 未安装，无法生成缩短版根音音频: {e}")
+        logger.warning("⚠️ pydub 未安装，无法生成缩短版根音音频: %s", e)
         return None
     
     try:
         # 构建输出文件名
         safe_key = key.replace('#', 'sharp')
         scale_dir = os.path.join(basedir, 'static', 'audio', 'scale')
-        
-        # 确保目录存在（移动端可能需要）
-        try:
-            os.makedirs(scale_dir, exist_ok=True)
-        except Exception as e:
-            print(f"⚠️ 无法创建目录 {scale_dir}: {e}")
-            print(f"   错误类型: {type(e).__name__}")
-            return None
-        
         output_filename = f"{safe_key}_root_oct{octave}_4sec.mp3"
         output_path = os.path.join(scale_dir, output_filename)
+        output_rel = f"scale/{output_filename}"
         
-        # 如果文件已存在，直接返回
-        if os.path.exists(output_path):
-            print(f"✅ 使用已存在的缩短版根音音频: {output_path}")
-            return f"scale/{output_filename}"
+        # 查询生成音频缓存清单，输入未变化时直接返回
+        cache = get_render_cache()
+        cache_key = render_key('root', [root_note_openear], duration_ms=4000)
+        if not force and audio_profiles.lookup(cache, output_rel, cache_key):
+            logger.debug("✅ 使用已存在的缩短版根音音频: %s", output_path)
+            return output_rel
         
         # 读取根音MP3文件
+        bank = get_sample_bank('piano')
         root_file = os.path.join(piano_samples_dir, f"{root_note_openear}.mp3")
-        if not os.path.exists(root_file):
-            print(f"⚠️ 根音文件不存在: {root_file}")
-            print(f"   查找的文件名: {root_note_openear}.mp3")
-            print(f"   目录: {piano_samples_dir}")
-            print(f"   目录是否存在: {os.path.exists(piano_samples_dir)}")
+        if not bank.has(root_note_openear):
+            logger.warning("⚠️ 根音文件不存在: %s", root_file)
             # 列出目录中的文件（调试用）
-            if os.path.exists(piano_samples_dir):
-                try:
-                    files = os.listdir(piano_samples_dir)
-                    print(f"   目录中的文件数量: {len(files)}")
-                    similar_files = [f for f in files if root_note_openear.split('s')[0] in f]
-                    if similar_files:
-                        print(f"   相似文件: {similar_files[:5]}")
-                    else:
-                        # 列出前几个文件作为参考
-                        print(f"   目录中的前5个文件: {files[:5]}")
-                except Exception as e:
-                    print(f"   无法列出目录文件: {e}")
+            _debug_list_samples(piano_samples_dir, root_note_openear)
             return None
         
         # 加载MP3文件
         try:
-            print(f"📂 加载根音文件: {root_file}")
-            audio_segment = AudioSegment.from_mp3(root_file)
-            print(f"   文件时长: {len(audio_segment)/1000:.2f}秒")
+            sample = bank.get(root_note_openear)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("📂 根音文件 %s 时长: %.2f秒", root_file,
+                             audio_engine.duration_ms(sample.pcm, sample.frame_rate) / 1000)
         except Exception as e:
-            print(f"⚠️ 无法加载音频文件 {root_file}: {e}")
-            print(f"   错误类型: {type(e).__name__}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("⚠️ 无法加载音频文件 %s: %s", root_file, e)
             return None
         
         # 截取前4秒
-        audio_segment = audio_segment[:4000]  # 4秒 = 4000毫秒
+        root_pcm = audio_engine.slice_ms(sample.pcm, sample.frame_rate, 0, 4000)  # 4秒 = 4000毫秒
         
-        # 导出为MP3
+        # 导出为MP3及启用的编码档位
         try:
-            print(f"💾 导出缩短版根音音频: {output_path}")
-            audio_segment.export(output_path, format="mp3")
-            print(f"✅ 成功生成4秒根音音频: {output_path}")
-            return f"scale/{output_filename}"
+            audio_profiles.publish(cache, output_rel, cache_key, root_pcm, sample.frame_rate, force=force)
+            logger.info("✅ 成功生成4秒根音音频: %s", output_path)
+            return output_rel
+        except RenderTimeout as e:
+            # 其他 worker 正在生成同一文件：调用方回退到原始根音文件
+            logger.warning("⏳ %s", e)
+            return None
         except Exception as e:
-            print(f"⚠️ 无法导出音频文件 {output_path}: {e}")
-            print(f"   错误类型: {type(e).__name__}")
             # 检查目录权限
-            if not os.access(scale_dir, os.W_OK):
-                print(f"   目录无写权限: {scale_dir}")
-            else:
-                print(f"   目录有写权限，可能是其他问题")
-            import traceback
-            traceback.print_exc()
+            logger.exception("⚠️ 无法导出音频文件 %s: %s（%s）", output_path, e,
+                             '目录有写权限，可能是其他问题' if os.access(scale_dir, os.W_OK) else f'目录无写权限: {scale_dir}')
             return None
         
     except Exception as e:
-        print(f"❌ 生成根音音频失败: {e}")
-        print(f"   错误类型: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ 生成根音音频失败: %s", e)
         return None
 
 def generate_song_audio_1min(audio_path):
@@ -852,7 +1087,7 @@ def generate_song_audio_1min(audio_path):
         full_audio_path = os.path.join(basedir, 'static', 'audio', audio_path)
         
         if not os.path.exists(full_audio_path):
-            print(f"⚠️ 音频文件不存在: {full_audio_path}")
+            logger.warning("⚠️ 音频文件不存在: %s", full_audio_path)
             return None
         
         # 构建输出路径（在 songs_1min 目录下）
@@ -864,56 +1099,85 @@ def generate_song_audio_1min(audio_path):
         try:
             os.makedirs(output_dir, exist_ok=True)
         except Exception as e:
-            print(f"⚠️ 无法创建目录 {output_dir}: {e}")
+            logger.warning("⚠️ 无法创建目录 %s: %s", output_dir, e)
             return None
         
         output_path = os.path.join(output_dir, audio_filename)
+        output_rel = f"{audio_dir}_1min/{audio_filename}"
         
-        # 如果1分钟版本已存在，直接返回
+        # 如果1分钟版本已存在，直接返回（文件通过原子替换写入，存在即完整）
         if os.path.exists(output_path):
             return os.path.join(audio_dir + '_1min', audio_filename)
         
-        # 加载原始音频
+        # 同一首歌跨进程只截取一次：等其他 worker 生成完直接复用，等待超时则先用完整歌曲
+        cache = get_render_cache()
         try:
-            audio_segment = AudioSegment.from_mp3(full_audio_path)
-        except Exception as e:
-            print(f"⚠️ 无法加载音频文件 {full_audio_path}: {e}")
-            return None
-        
-        # 获取音频时长（毫秒）
-        duration_ms = len(audio_segment)
-        max_duration_ms = 60 * 1000  # 60秒 = 60000毫秒
-        
-        # 如果音频已经小于1分钟，直接返回原文件路径
-        if duration_ms <= max_duration_ms:
+            with cache.render_lock(output_rel):
+                if os.path.exists(output_path):
+                    return os.path.join(audio_dir + '_1min', audio_filename)
+                return _render_song_audio_1min(audio_path, full_audio_path, output_path, output_rel)
+        except RenderTimeout as e:
+            logger.warning("⏳ %s，暂时使用完整歌曲", e)
             return audio_path
         
-        # 截取前60秒
-        shortened_audio = audio_segment[:max_duration_ms]
-        
-        # 导出为MP3
-        try:
-            shortened_audio.export(output_path, format="mp3")
-            print(f"✅ 生成1分钟版本: {output_path} (原始: {duration_ms/1000:.1f}秒)")
-            return os.path.join(audio_dir + '_1min', audio_filename)
-        except Exception as e:
-            print(f"⚠️ 无法导出音频文件 {output_path}: {e}")
-            if not os.access(output_dir, os.W_OK):
-                print(f"   目录无写权限: {output_dir}")
-            return None
-        
     except ImportError as e:
         # 如果没有pydub，返回原文件路径
-        print(f"⚠️ pydub 未安装，无法生成缩短版本: {e}")
+        logger.warning("⚠️ pydub 未安装，无法生成缩短版本: %s", e)
         return audio_path
     except Exception as e:
-        print(f"❌ 生成1分钟音频失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ 生成1分钟音频失败: %s", e)
         # 失败时返回原文件路径，确保功能可用
         return audio_path
 
-def generate_scale_audio_from_mp3(key, scale_type, octave, scale_notes, piano_samples_dir, convert_note_name):
+def _render_song_audio_1min(audio_path, full_audio_path, output_path, output_rel):
+    """截取歌曲前 60 秒并导出（调用方持有渲染锁）；返回值约定同 generate_song_audio_1min"""
+    from pydub import AudioSegment
+    
+    audio_dir = os.path.dirname(audio_path)
+    audio_filename = os.path.basename(audio_path)
+    output_dir = os.path.dirname(output_path)
+    
+    # 加载原始音频
+    try:
+        audio_segment = AudioSegment.from_mp3(full_audio_path)
+        frame_rate = audio_segment.frame_rate
+        song_pcm = audio_engine.from_segment(audio_segment)
+    except Exception as e:
+        logger.warning("⚠️ 无法加载音频文件 %s: %s", full_audio_path, e)
+        return None
+    
+    # 获取音频时长（毫秒）
+    duration_ms = audio_engine.duration_ms(song_pcm, frame_rate)
+    max_duration_ms = 60 * 1000  # 60秒 = 60000毫秒
+    
+    # 如果音频已经小于1分钟，直接返回原文件路径（变体由 encode_audio_profiles.py 离线编码）
+    if duration_ms <= max_duration_ms:
+        if audio_profiles.encode_on_render():
+            audio_profiles.encode_variants(audio_path, song_pcm, frame_rate)
+        return audio_path
+    
+    # 截取前60秒
+    shortened_audio = audio_engine.slice_ms(song_pcm, frame_rate, 0, max_duration_ms)
+    
+    # 先导出到临时文件再原子替换（os.path.exists 为真即是完整文件）；encode_on_render 时再编码启用的档位（见 audio_profiles.py）
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        audio_engine.export(shortened_audio, frame_rate, tmp_path, format="mp3")
+        os.replace(tmp_path, output_path)
+        logger.info("✅ 生成1分钟版本: %s (原始: %.1f秒)", output_path, duration_ms / 1000)
+        if audio_profiles.encode_on_render():
+            audio_profiles.encode_variants(output_rel, shortened_audio, frame_rate)
+        return os.path.join(audio_dir + '_1min', audio_filename)
+    except Exception as e:
+        logger.warning("⚠️ 无法导出音频文件 %s: %s", output_path, e)
+        if not os.access(output_dir, os.W_OK):
+            logger.warning("   目录无写权限: %s", output_dir)
+        return None
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def generate_scale_audio_from_mp3(key, scale_type, octave, scale_notes, piano_samples_dir, convert_note_name, force=False):
     """从MP3文件拼接生成完整的音阶音频（8个音符，每个0.5秒）
     
     Args:
@@ -923,131 +1187,91 @@ def generate_scale_audio_from_mp3(key, scale_type, octave, scale_notes, piano_sa
         scale_notes: 音阶音符列表（8个音符）
         piano_samples_dir: 钢琴样本目录
         convert_note_name: 音符名称转换函数
+        force: 为 True 时忽略缓存清单重新生成（离线预渲染使用）
     """
-    print(f"🔧 generate_scale_audio_from_mp3 开始执行")
-    print(f"   参数: key={key}, scale_type={scale_type}, octave={octave}")
-    print(f"   scale_notes: {scale_notes}")
-    print(f"   piano_samples_dir: {piano_samples_dir}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🔧 generate_scale_audio_from_mp3: key=%s, scale_type=%s, octave=%s, scale_notes=%s",
+                     key, scale_type, octave, scale_notes)
     
     try:
         from pydub import AudioSegment
-        print(f"✅ pydub 导入成功")
         
         # 构建输出文件名
         safe_key = key.replace('#', 'sharp')
         safe_scale = scale_type.replace('_', '-')
         scale_dir = os.path.join(basedir, 'static', 'audio', 'scale')
-        
-        # 确保目录存在（移动端可能需要）
-        try:
-            os.makedirs(scale_dir, exist_ok=True)
-        except Exception as e:
-            print(f"⚠️ 无法创建目录 {scale_dir}: {e}")
-            return None
-        
         output_filename = f"{safe_key}_{safe_scale}_oct{octave}_full.mp3"
         output_path = os.path.join(scale_dir, output_filename)
+        output_rel = f"scale/{output_filename}"
         
-        # 如果文件已存在，直接返回
-        if os.path.exists(output_path):
-            return f"scale/{output_filename}"
+        # 查询生成音频缓存清单，输入未变化时直接返回
+        cache = get_render_cache()
+        cache_key = render_key('scale', [convert_note_name(note) for note in scale_notes],
+                               note_duration_ms=500)
+        if not force and audio_profiles.lookup(cache, output_rel, cache_key):
+            return output_rel
         
-        # 拼接所有音符（每个0.5秒）
-        combined_audio = None
+        # 拼接所有音符（每个0.5秒）：先收集片段视图，最后一次性拼接
+        note_parts = []
         note_duration_ms = 500  # 0.5秒 = 500毫秒
         
-        print(f"📝 开始拼接 {len(scale_notes)} 个音符")
+        bank = get_sample_bank('piano')
         
         for idx, note in enumerate(scale_notes, 1):
             note_openear = convert_note_name(note)
             note_file = os.path.join(piano_samples_dir, f"{note_openear}.mp3")
             
-            print(f"   [{idx}/{len(scale_notes)}] 处理音符: {note} -> {note_openear}")
-            print(f"      文件路径: {note_file}")
-            
-            if not os.path.exists(note_file):
-                print(f"⚠️ 音阶音符文件不存在: {note} -> {note_openear} -> {note_file}")
+            if not bank.has(note_openear):
+                logger.warning("⚠️ 音阶音符文件不存在: %s -> %s -> %s", note, note_openear, note_file)
                 # 列出目录中的文件（调试用）
-                if os.path.exists(piano_samples_dir):
-                    files = os.listdir(piano_samples_dir)
-                    print(f"      目录中的文件数量: {len(files)}")
-                    similar_files = [f for f in files if note_openear.split('s')[0] in f]
-                    if similar_files:
-                        print(f"      相似文件: {similar_files[:5]}")
-                    else:
-                        print(f"      目录中的前5个文件: {files[:5]}")
-                import sys
-                sys.stderr.write(f"⚠️ 音阶音符文件不存在: {note_file}\n")
+                _debug_list_samples(piano_samples_dir, note_openear)
                 return None
             
             # 加载MP3文件
             try:
-                print(f"      加载音频文件...")
-                audio_segment = AudioSegment.from_mp3(note_file)
-                print(f"      音频时长: {len(audio_segment)/1000:.2f}秒")
+                sample = bank.get(note_openear)
             except Exception as e:
-                print(f"⚠️ 无法加载音频文件 {note_file}: {e}")
-                import sys
-                sys.stderr.write(f"⚠️ 无法加载音频文件 {note_file}: {e}\n")
-                import traceback
-                traceback.print_exc()
+                logger.exception("⚠️ 无法加载音频文件 %s: %s", note_file, e)
                 return None
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("   [%d/%d] %s -> %s，音频时长: %.2f秒", idx, len(scale_notes), note, note_openear,
+                             audio_engine.duration_ms(sample.pcm, sample.frame_rate) / 1000)
             
             # 截取前0.5秒
-            audio_segment = audio_segment[:note_duration_ms]
-            
-            # 拼接
-            if combined_audio is None:
-                combined_audio = audio_segment
-                print(f"      初始化拼接音频")
-            else:
-                combined_audio = combined_audio + audio_segment
-                print(f"      拼接完成，当前总时长: {len(combined_audio)/1000:.2f}秒")
+            note_parts.append((audio_engine.slice_ms(sample.pcm, sample.frame_rate, 0, note_duration_ms),
+                               sample.frame_rate))
         
-        if combined_audio is None:
-            print(f"❌ 拼接音频为空")
-            import sys
-            sys.stderr.write("❌ 拼接音频为空\n")
+        if not note_parts:
+            logger.error("❌ 拼接音频为空")
             return None
         
-        print(f"✅ 所有音符拼接完成，总时长: {len(combined_audio)/1000:.2f}秒")
-        print(f"📁 准备导出到: {output_path}")
+        # 一次分配完成拼接（无缝衔接）
+        note_parts, frame_rate = audio_engine.conform(note_parts)
+        combined_audio = audio_engine.concat(note_parts)
         
-        # 导出为MP3
+        # 导出为MP3及启用的编码档位
         try:
-            print(f"💾 开始导出MP3文件...")
-            combined_audio.export(output_path, format="mp3")
-            print(f"✅ 生成完整音阶音频: {output_path} (总时长: {len(combined_audio)/1000:.2f}秒)")
-            import sys
-            sys.stdout.write(f"✅ 生成完整音阶音频: {output_path}\n")
+            audio_profiles.publish(cache, output_rel, cache_key, combined_audio, frame_rate, force=force)
+            logger.info("✅ 生成完整音阶音频: %s (总时长: %.2f秒)", output_path,
+                        audio_engine.duration_ms(combined_audio, frame_rate) / 1000)
+        except RenderTimeout:
+            raise
         except Exception as e:
-            print(f"⚠️ 无法导出音频文件 {output_path}: {e}")
-            import sys
-            sys.stderr.write(f"⚠️ 无法导出音频文件 {output_path}: {e}\n")
-            import traceback
-            traceback.print_exc()
             # 检查目录权限
-            if not os.access(scale_dir, os.W_OK):
-                print(f"   目录无写权限: {scale_dir}")
-                sys.stderr.write(f"   目录无写权限: {scale_dir}\n")
+            logger.exception("⚠️ 无法导出音频文件 %s: %s%s", output_path, e,
+                             '' if os.access(scale_dir, os.W_OK) else f'（目录无写权限: {scale_dir}）')
             return None
         
-        return f"scale/{output_filename}"
+        return output_rel
         
     except ImportError as e:
         # 如果没有pydub，直接返回None
-        error_msg = f"⚠️ pydub 未安装: {e}"
-        print(error_msg)
-        import sys
-        sys.stderr.write(f"{error_msg}\n")
+        logger.warning("⚠️ pydub 未安装: %s", e)
         return None
+    except RenderTimeout:
+        raise
     except Exception as e:
-        error_msg = f"❌ 生成音阶音频失败: {e}"
-        print(error_msg)
-        import sys
-        sys.stderr.write(f"{error_msg}\n")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ 生成音阶音频失败: %s", e)
         return None
 
 def generate_scale_audio(root_note, scale_type, octave=4, octave_range=1):
@@ -1060,7 +1284,6 @@ def generate_scale_audio(root_note, scale_type, octave=4, octave_range=1):
         octave_range: 八度范围（此参数保留用于兼容，但参考音频只生成一个八度）
     """
     try:
-        import numpy as np
         from scipy.io import wavfile
         
         if scale_type not in SCALES:
@@ -1102,17 +1325,12 @@ def generate_scale_audio(root_note, scale_type, octave=4, octave_range=1):
             if len(audio.shape) > 1:
                 audio = audio[:, 0]
             
-            # 取前0.5秒
+            # 取前0.5秒（不足用零填充）
             samples = int(sample_rate * 0.5)
-            audio_seg = audio[:min(samples, len(audio))]
-            if len(audio_seg) < samples:
-                padding = np.zeros(samples - len(audio_seg), dtype=audio_seg.dtype)
-                audio_seg = np.concatenate([audio_seg, padding])
-            
-            audio_segments.append(audio_seg)
+            audio_segments.append(audio_engine.fit_frames(audio, samples))
         
         # 拼接所有音符（从根音到根音）
-        combined_audio = np.concatenate(audio_segments)
+        combined_audio = audio_engine.concat(audio_segments)
         
         # 保存音频文件
         safe_root = root_note.replace('#', 'sharp')
@@ -1125,52 +1343,64 @@ def generate_scale_audio(root_note, scale_type, octave=4, octave_range=1):
         return True
         
     except Exception as e:
-        print(f"生成音阶音频失败: {e}")
+        logger.exception("生成音阶音频失败: %s", e)
         return False
 
-@app.route('/api/generate_question/<exercise_type>')
-def generate_question(exercise_type):
-    """生成题目"""
+def _attach_synth(question, synth):
+    """客户端合成模式：题目附带各音频字段的音符事件（synth，见 audio_sprites.py）"""
+    if synth:
+        question['synth'] = synth
+    return question
+
+def _interval_filters(args):
+    """音程题的过滤条件：(允许的音程英文名, 允许的方向)"""
+    intervals = args.get('intervals', '')
+    directions = args.get('directions', '')
+    
+    if intervals:
+        allowed_intervals = intervals.split(',')
+    else:
+        allowed_intervals = [v['name'] for v in INTERVALS.values() if v['name'] != 'unison']
+    
+    if directions:
+        allowed_directions = directions.split(',')
+    else:
+        allowed_directions = ['up', 'down']
+    return allowed_intervals, allowed_directions
+
+def build_question(exercise_type, args, interval_pick=None):
+    """生成一道题目
+    
+    参数:
+        exercise_type: 练习类型
+        args: 题目设置（request.args 形式的参数）
+        interval_pick: 音程题使用的候选（IntervalCandidate）；为 None 时随机抽取
+    返回:
+        题目数据字典，出错时为 (错误字典, 状态码)；与 Flask 视图的返回值约定一致
+    """
     try:
+        # 客户端合成模式：不在服务端混音，题目只带音符事件（见 audio_sprites.py）
+        client_synthesis = audio_sprites.synthesis_mode(args) == 'client'
+        synth = {}
+        
         if exercise_type == 'interval':
             # 获取前端传来的参数
-            intervals = request.args.get('intervals', '')
-            directions = request.args.get('directions', '')
-            
-            if intervals:
-                allowed_intervals = intervals.split(',')
-            else:
-                allowed_intervals = [v['name'] for v in INTERVALS.values() if v['name'] != 'unison']
-            
-            if directions:
-                allowed_directions = directions.split(',')
-            else:
-                allowed_directions = ['up', 'down']
-            
-            # 预先生成所有合法组合
-            valid_pairs = []
-            for note1_idx in range(len(NOTE_NAMES)):
-                for direction in allowed_directions:
-                    for semitones, interval in INTERVALS.items():
-                        if interval['name'] not in allowed_intervals:
-                            continue
-                        if direction == 'up':
-                            note2_idx = note1_idx + semitones
-                        else:
-                            note2_idx = note1_idx - semitones
-                        if 0 <= note2_idx < len(NOTE_NAMES) and semitones != 0:
-                            valid_pairs.append((note1_idx, note2_idx, semitones, interval, direction))
+            allowed_intervals, allowed_directions = _interval_filters(args)
             
-            if not valid_pairs:
-                return jsonify({'status': 'error', 'msg': '没有符合条件的题目，请调整选择'})
-            
-            # 随机抽取一个组合
-            note1_idx, note2_idx, semitones, interval_info, direction = random.choice(valid_pairs)
+            if interval_pick is None:
+                # 从预计算索引中取出所有合法组合
+                candidates = INTERVAL_INDEX.candidates(allowed_intervals, allowed_directions)
+                
+                if not candidates:
+                    return {'status': 'error', 'msg': '没有符合条件的题目，请调整选择'}
+                
+                # 随机抽取一个组合
+                interval_pick = candidates.sample()
+            note1_idx, note2_idx, semitones, direction = interval_pick
+            interval_info = INTERVALS[semitones]
             note1 = NOTE_NAMES[note1_idx]
             note2 = NOTE_NAMES[note2_idx]
             
-            # interval_info 已经从 valid_pairs 中获取，不需要重新计算
-            
             
             # 使用音源（MP3格式）
             # 将音符名称转换为格式（如 C4 -> C4, C#4 -> Cs4）
@@ -1187,65 +1417,44 @@ def generate_question(exercise_type):
             note2_openear = convert_note_name(note2)
             
             # 检查音源文件是否存在（使用 piano 音源）
-            piano_samples_dir = os.path.join(basedir, 'static', 'audio', 'samples', 'piano')
-            note1_file = os.path.join(piano_samples_dir, f"{note1_openear}.mp3")
-            note2_file = os.path.join(piano_samples_dir, f"{note2_openear}.mp3")
+            bank = get_sample_bank('piano')
+            piano_samples_dir = bank.samples_dir
+            note1_file = bank.path(note1_openear)
+            note2_file = bank.path(note2_openear)
             
-            if not os.path.exists(note1_file) or not os.path.exists(note2_file):
+            if not bank.has(note1_openear) or not bank.has(note2_openear):
                 # 如果文件不存在，尝试其他格式或返回错误
-                print(f"⚠️ 音源文件检查失败:")
-                print(f"  note1: {note1} -> {note1_openear} -> {note1_file} (exists: {os.path.exists(note1_file)})")
-                print(f"  note2: {note2} -> {note2_openear} -> {note2_file} (exists: {os.path.exists(note2_file)})")
-                print(f"  piano_dir: {piano_samples_dir} (exists: {os.path.exists(piano_samples_dir)})")
-                return jsonify({
+                logger.warning("⚠️ 音源文件检查失败: note1: %s -> %s -> %s, note2: %s -> %s -> %s",
+                               note1, note1_openear, note1_file, note2, note2_openear, note2_file)
+                return {
                     'status': 'error',
                     'msg': f'音源文件不存在: {note1} ({note1_openear}) 或 {note2} ({note2_openear})。请检查文件路径: {piano_samples_dir}'
-                })
+                }
             
-            # 生成拼接的音频文件（每个音符1秒，无缝衔接）
+            # 生成拼接的音频文件（每个音符1秒，无缝衔接）；客户端合成模式下只返回音符
             try:
-                from pydub import AudioSegment
-                
-                # 生成输出文件名（保持与现有文件一致：每个音符1秒）
-                safe_note1 = note1_openear.replace('#', 'sharp')
-                safe_note2 = note2_openear.replace('#', 'sharp')
-                interval_dir = os.path.join(basedir, 'static', 'audio', 'interval')
-                os.makedirs(interval_dir, exist_ok=True)
-                output_filename = f"{safe_note1}_{safe_note2}_1sec.mp3"
-                output_path = os.path.join(interval_dir, output_filename)
-                
-                # 检查是否已有 .wav 或 .mp3 文件（兼容旧格式）
-                wav_path = output_path.replace('.mp3', '.wav')
-                if os.path.exists(wav_path):
-                    # 如果已有 .wav 文件，使用它（兼容旧文件）
-                    audio_file = f"interval/{os.path.basename(wav_path)}"
-                elif os.path.exists(output_path):
-                    # 如果已有 .mp3 文件，直接使用
-                    audio_file = f"interval/{output_filename}"
+                if client_synthesis:
+                    audio_file = None
+                    synth['audio_file'] = audio_sprites.interval_spec(note1_openear, note2_openear,
+                                                                      normalize=INTERVAL_NORMALIZE)
                 else:
-                    # 加载两个音符文件
-                    audio1 = AudioSegment.from_mp3(note1_file)
-                    audio2 = AudioSegment.from_mp3(note2_file)
-                    
-                    # 每个音符取1秒（1000毫秒），与现有文件保持一致
-                    audio1_1sec = audio1[:1000]
-                    audio2_1sec = audio2[:1000]
-                    
-                    # 拼接两个音符（无缝衔接）
-                    combined_audio = audio1_1sec + audio2_1sec
-                    
-                    # 导出为MP3
-                    combined_audio.export(output_path, format="mp3")
-                    audio_file = f"interval/{output_filename}"
+                    audio_file = generate_interval_mp3(note1_openear, note2_openear)
+            except RenderTimeout as e:
+                # 其他 worker 正在渲染同一音程且等待超时：拼接包已就绪时本题改由客户端合成，否则让客户端稍后重试
+                if not _sprite_ready():
+                    logger.warning("⏳ %s，拼接包未就绪，请客户端重试", e)
+                    return RENDER_BUSY_ERROR, 503
+                logger.warning("⏳ %s，改用客户端合成", e)
+                audio_file = None
+                synth['audio_file'] = audio_sprites.interval_spec(note1_openear, note2_openear,
+                                                                  normalize=INTERVAL_NORMALIZE)
             except Exception as e:
                 # 如果拼接失败，返回错误
-                print(f"⚠️ 生成拼接音频失败: {e}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({
+                logger.exception("⚠️ 生成拼接音频失败: %s", e)
+                return {
                     'status': 'error',
                     'msg': f'生成音频失败: {str(e)}'
-                })
+                }
             
             # 准备选项
             all_intervals = list(INTERVALS.values())
@@ -1292,7 +1501,7 @@ def generate_question(exercise_type):
             
             
             try:
-                return jsonify({
+                return _attach_synth({
                     'status': 'ok',
                     'audio_file': audio_file,  # 拼接好的音频文件
                     'note1': note1,
@@ -1303,28 +1512,26 @@ def generate_question(exercise_type):
                     'correct_value': correct_answer,
                     'sub_item': correct_answer,  # 细分项：音程名称
                     'is_authenticated': current_user.is_authenticated if hasattr(current_user, 'is_authenticated') else False,
-                })
+                }, synth)
             except Exception as e:
-                print(f"❌ 返回JSON时出错: {e}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({
+                logger.exception("❌ 返回JSON时出错: %s", e)
+                return {
                     'status': 'error',
                     'msg': f'生成响应时出错: {str(e)}'
-                }), 500
+                }, 500
         
         elif exercise_type == 'scale_degree':
             # 获取前端传来的参数
-            scale_type = request.args.get('scale_type', 'major')
-            key = request.args.get('key', 'C')
-            octave = int(request.args.get('octave', '4'))
-            octave_range = int(request.args.get('octave_range', '1'))  # 1或2
+            scale_type = args.get('scale_type', 'major')
+            key = args.get('key', 'C')
+            octave = int(args.get('octave', '4'))
+            octave_range = int(args.get('octave_range', '1'))  # 1或2
             
             if scale_type not in SCALES:
-                return jsonify({'status': 'error', 'msg': '无效的音阶类型'})
+                return {'status': 'error', 'msg': '无效的音阶类型'}
             
             if key not in KEYS:
-                return jsonify({'status': 'error', 'msg': '无效的调性'})
+                return {'status': 'error', 'msg': '无效的调性'}
             
             if octave_range not in [1, 2]:
                 octave_range = 1
@@ -1381,7 +1588,7 @@ def generate_question(exercise_type):
                     scale_degree_indices.append(degree_index)
             
             if not scale_notes:
-                return jsonify({'status': 'error', 'msg': '无法构建音阶'})
+                return {'status': 'error', 'msg': '无法构建音阶'}
             
             # 随机选择一个音阶内的音作为题目
             question_idx = random.randint(0, len(scale_notes) - 1)
@@ -1403,58 +1610,66 @@ def generate_question(exercise_type):
             root_note_openear = convert_note_name(f"{key}{octave}")
             
             # 检查音源文件是否存在（使用 piano 音源）
-            piano_samples_dir = os.path.join(basedir, 'static', 'audio', 'samples', 'piano')
+            bank = get_sample_bank('piano')
+            piano_samples_dir = bank.samples_dir
             question_audio_file = f"samples/piano/{question_note_openear}.mp3"
-            question_audio_path = os.path.join(piano_samples_dir, f"{question_note_openear}.mp3")
-            root_audio_path = os.path.join(piano_samples_dir, f"{root_note_openear}.mp3")
+            question_audio_path = bank.path(question_note_openear)
+            root_audio_path = bank.path(root_note_openear)
             
-            if not os.path.exists(question_audio_path):
-                print(f"⚠️ 题目音频文件不存在: {question_note} -> {question_note_openear} -> {question_audio_path}")
-                return jsonify({'status': 'error', 'msg': f'音源文件不存在: {question_note} ({question_note_openear})'})
+            if not bank.has(question_note_openear):
+                logger.warning("⚠️ 题目音频文件不存在: %s -> %s -> %s", question_note, question_note_openear, question_audio_path)
+                return {'status': 'error', 'msg': f'音源文件不存在: {question_note} ({question_note_openear})'}
             
-            if not os.path.exists(root_audio_path):
-                print(f"⚠️ 根音文件不存在: {key}{octave} -> {root_note_openear} -> {root_audio_path}")
-                return jsonify({'status': 'error', 'msg': f'根音文件不存在: {key}{octave} ({root_note_openear})'})
+            if not bank.has(root_note_openear):
+                logger.warning("⚠️ 根音文件不存在: %s%s -> %s -> %s", key, octave, root_note_openear, root_audio_path)
+                return {'status': 'error', 'msg': f'根音文件不存在: {key}{octave} ({root_note_openear})'}
             
-            # 生成4秒的根音音频文件
-            root_audio_file = generate_root_audio_4sec(key, octave, root_note_openear, piano_samples_dir)
-            if not root_audio_file:
+            # 生成4秒的根音音频文件（客户端合成模式下只返回音符）
+            if client_synthesis:
+                root_audio_file = None
+                synth['root_audio_file'] = audio_sprites.root_spec(root_note_openear)
+            else:
+                root_audio_file = generate_root_audio_4sec(key, octave, root_note_openear, piano_samples_dir)
+            if not root_audio_file and not client_synthesis:
                 # 如果无法生成缩短版本，回退到使用原始根音文件
-                print(f"⚠️ 无法生成缩短版根音音频，使用原始文件: {root_note_openear}.mp3")
+                logger.warning("⚠️ 无法生成缩短版根音音频，使用原始文件: %s.mp3", root_note_openear)
                 # 使用原始根音文件路径
                 root_audio_file = f"samples/piano/{root_note_openear}.mp3"
                 # 验证原始文件是否存在
                 if not os.path.exists(root_audio_path):
                     error_msg = f'根音文件不存在: {key}{octave} ({root_note_openear})'
-                    print(f"❌ {error_msg}")
-                    return jsonify({'status': 'error', 'msg': error_msg})
-                print(f"✅ 使用原始根音文件: {root_audio_file}")
+                    logger.error("❌ %s", error_msg)
+                    return {'status': 'error', 'msg': error_msg}
             
             # 生成音阶音频（直接拼接成完整音频文件）
             # 构建一个八度的完整音阶（从根音到高八度根音，共8个音符）
-            first_octave_count = len(base_degrees)  # 通常是7个音符
-            
-            # 确保取第一个八度的所有音符
-            if octave_range == 1:
-                first_octave_notes = scale_notes[:first_octave_count]
-            else:
-                first_octave_notes = scale_notes[:first_octave_count]
+            scale_notes_for_audio = build_scale_audio_notes(key, scale_type, octave)
             
-            # 添加高八度根音
-            root_note_high = f"{key}{octave + 1}"
-            scale_notes_for_audio = first_octave_notes + [root_note_high]
-            
-            print(f"🎵 准备生成音阶音频:")
-            print(f"   调性: {key}, 音阶类型: {scale_type}, 八度: {octave}")
-            print(f"   音阶音符: {scale_notes_for_audio}")
-            print(f"   音符数量: {len(scale_notes_for_audio)}")
+            logger.debug("🎵 准备生成音阶音频: 调性: %s, 音阶类型: %s, 八度: %s, 音阶音符: %s",
+                         key, scale_type, octave, scale_notes_for_audio)
             
             # 生成完整的音阶音频文件（拼接8个音符，每个0.5秒）
-            scale_audio_file = generate_scale_audio_from_mp3(key, scale_type, octave, scale_notes_for_audio, piano_samples_dir, convert_note_name)
+            if client_synthesis:
+                scale_audio_file = None
+                synth['scale_audio_file'] = audio_sprites.scale_spec(
+                    [convert_note_name(note) for note in scale_notes_for_audio if bank.has(convert_note_name(note))])
+            else:
+                try:
+                    scale_audio_file = generate_scale_audio_from_mp3(key, scale_type, octave, scale_notes_for_audio, piano_samples_dir, convert_note_name)
+                except RenderTimeout as e:
+                    # 其他 worker 正在渲染同一音阶且等待超时：拼接包已就绪时本题改由客户端合成，
+                    # 否则本题不提供完整音阶音频（与生成失败时相同）
+                    scale_audio_file = None
+                    if _sprite_ready():
+                        logger.warning("⏳ %s，改用客户端合成", e)
+                        synth['scale_audio_file'] = audio_sprites.scale_spec(
+                            [convert_note_name(note) for note in scale_notes_for_audio if bank.has(convert_note_name(note))])
+                    else:
+                        logger.warning("⏳ %s，拼接包未就绪，本题不提供音阶音频", e)
             
             # 如果生成失败，不阻止练习继续，只是不提供完整音阶音频
-            if not scale_audio_file:
-                print(f"⚠️ 音阶音频生成失败，但继续提供练习功能（仅提供根音和题目音频）")
+            if not scale_audio_file and 'scale_audio_file' not in synth:
+                logger.warning("⚠️ 音阶音频生成失败，但继续提供练习功能（仅提供根音和题目音频）")
                 # 不返回错误，让练习可以继续进行
             
             # 准备选项（音阶内的所有音级）
@@ -1468,16 +1683,14 @@ def generate_question(exercise_type):
             
             try:
                 # 确保 root_audio_file 不为空
-                if not root_audio_file:
-                    print(f"⚠️ 警告：root_audio_file 为空，使用默认值")
+                if not root_audio_file and not client_synthesis:
+                    logger.warning("⚠️ 警告：root_audio_file 为空，使用默认值")
                     root_audio_file = f"samples/piano/{root_note_openear}.mp3"
                 
-                print(f"✅ 返回音阶练习题目:")
-                print(f"   root_audio_file: {root_audio_file}")
-                print(f"   scale_audio_file: {scale_audio_file}")
-                print(f"   question_audio_file: {question_audio_file}")
+                logger.debug("✅ 返回音阶练习题目: root_audio_file=%s, scale_audio_file=%s, question_audio_file=%s",
+                             root_audio_file, scale_audio_file, question_audio_file)
                 
-                return jsonify({
+                return _attach_synth({
                     'status': 'ok',
                     'audio_file': question_audio_file,  # 题目音频（单个音符）
                     'root_audio_file': root_audio_file,  # 根音音频
@@ -1488,20 +1701,18 @@ def generate_question(exercise_type):
                     'sub_item': correct_degree,  # 细分项：音级（如"1", "2", "b3"等）
                     'scale_name': scale_name,
                     'is_authenticated': current_user.is_authenticated if hasattr(current_user, 'is_authenticated') else False,
-                })
+                }, synth)
             except Exception as e:
-                print(f"❌ 返回JSON时出错: {e}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({
+                logger.exception("❌ 返回JSON时出错: %s", e)
+                return {
                     'status': 'error',
                     'msg': f'生成响应时出错: {str(e)}'
-                }), 500
+                }, 500
         
         elif exercise_type == 'chord_quality':
             # 获取前端传来的参数
             # 根音可以多选
-            selected_roots = request.args.get('roots', 'C').split(',')
+            selected_roots = args.get('roots', 'C').split(',')
             # 过滤有效的根音
             valid_roots = [root for root in selected_roots if root in KEYS]
             if not valid_roots:
@@ -1514,7 +1725,7 @@ def generate_question(exercise_type):
             all_chord_types = list(CHORD_TYPES.keys())
             # 默认包含：major, minor
             default_included = ['major', 'minor']
-            included_types = request.args.get('chord_types', ','.join(default_included)).split(',')
+            included_types = args.get('chord_types', ','.join(default_included)).split(',')
             included_types = [ct for ct in included_types if ct in all_chord_types]
             if not included_types:
                 included_types = default_included
@@ -1522,25 +1733,12 @@ def generate_question(exercise_type):
             # 从用户选择的 chord_types 中随机选择一个和弦类型
             chord_type = random.choice(included_types)
             
-            # 计算根音索引
-            root_idx = KEYS.index(root_note_letter)
-            
             # 选择八度（使用中间八度）
             octave = 4
             root_note = f"{root_note_letter}{octave}"
             
-            # 获取和弦类型信息
-            chord_pattern = CHORD_TYPES[chord_type]['pattern']
-            
             # 计算和弦中的所有音符
-            chord_notes = []
-            for semitone_offset in chord_pattern:
-                note_idx_in_octave = (root_idx + semitone_offset) % 12
-                note_letter = note_letters[note_idx_in_octave]
-                # 计算实际八度（考虑跨八度的情况）
-                actual_octave = octave + (semitone_offset // 12)
-                note_name = f"{note_letter}{actual_octave}"
-                chord_notes.append(note_name)
+            chord_notes = build_chord_notes(root_note_letter, chord_type, octave)
             
             # 转换音符名称格式（用于音源文件）
             def convert_note_name(note_name):
@@ -1551,24 +1749,45 @@ def generate_question(exercise_type):
                         return f"{note_letter}s{octave}"
                 return note_name
             
-            # 生成和弦音频文件（如果不存在则生成，存在则复用）
-            chord_audio_file = generate_chord_audio(chord_notes, duration=2.0)
-            
-            if not chord_audio_file:
-                return jsonify({'status': 'error', 'msg': '无法生成和弦音频文件'})
+            # 生成和弦音频文件（如果不存在则生成，存在则复用）；客户端合成模式下只返回音符
+            if client_synthesis:
+                bank = get_sample_bank('piano')
+                chord_notes_openear = [convert_note_name(note) for note in chord_notes]
+                if not all(bank.has(note) for note in chord_notes_openear):
+                    return {'status': 'error', 'msg': '无法生成和弦音频文件'}
+                chord_audio_file = None
+                synth['chord_audio_file'] = audio_sprites.chord_spec(chord_notes_openear, duration_ms=2000)
+            else:
+                try:
+                    chord_audio_file = generate_chord_audio(chord_notes, duration=2.0)
+                except RenderTimeout as e:
+                    # 其他 worker 正在渲染同一和弦且等待超时：拼接包已就绪时本题改由客户端合成，否则让客户端稍后重试
+                    if not _sprite_ready():
+                        logger.warning("⏳ %s，拼接包未就绪，请客户端重试", e)
+                        return RENDER_BUSY_ERROR, 503
+                    logger.warning("⏳ %s，改用客户端合成", e)
+                    chord_audio_file = None
+                    synth['chord_audio_file'] = audio_sprites.chord_spec(
+                        [convert_note_name(note) for note in chord_notes], duration_ms=2000)
+                if not chord_audio_file and 'chord_audio_file' not in synth:
+                    return {'status': 'error', 'msg': '无法生成和弦音频文件'}
             
             # 生成根音音频文件路径（用于参考）- 使用4秒版本
             root_note_openear = convert_note_name(root_note)
             piano_samples_dir = os.path.join(basedir, 'static', 'audio', 'samples', 'piano')
-            root_audio_file = generate_root_audio_4sec(root_note_letter, octave, root_note_openear, piano_samples_dir)
-            if not root_audio_file:
+            if client_synthesis and get_sample_bank('piano').has(root_note_openear):
+                root_audio_file = None
+                synth['root_audio_file'] = audio_sprites.root_spec(root_note_openear)
+            else:
+                root_audio_file = generate_root_audio_4sec(root_note_letter, octave, root_note_openear, piano_samples_dir)
+            if not root_audio_file and 'root_audio_file' not in synth:
                 # 如果无法生成4秒版本，回退到原始文件
                 root_audio_file_path = os.path.join(piano_samples_dir, f"{root_note_openear}.mp3")
                 if os.path.exists(root_audio_file_path):
                     root_audio_file = f"samples/piano/{root_note_openear}.mp3"
-                    print(f"⚠️ 无法生成缩短版根音音频，使用原始文件: {root_note_openear}.mp3")
+                    logger.warning("⚠️ 无法生成缩短版根音音频，使用原始文件: %s.mp3", root_note_openear)
                 else:
-                    print(f"⚠️ 根音文件不存在: {root_note} -> {root_note_openear} -> {root_audio_file_path}")
+                    logger.warning("⚠️ 根音文件不存在: %s -> %s -> %s", root_note, root_note_openear, root_audio_file_path)
             
             # included_types 已经在上面定义过了，这里不需要重新定义
             # 确保正确答案在选项中（应该已经在included_types中了，因为chord_type是从included_types中随机选择的）
@@ -1600,7 +1819,7 @@ def generate_question(exercise_type):
             
             
             try:
-                return jsonify({
+                return _attach_synth({
                     'status': 'ok',
                     'chord_audio_file': chord_audio_file,  # 和弦音频文件（单个文件，已混合）
                     'root_audio_file': root_audio_file,  # 根音音频文件（用于参考）
@@ -1612,26 +1831,123 @@ def generate_question(exercise_type):
                     'correct_value': chord_type,  # 正确答案值（英文）
                     'sub_item': chord_type,  # 细分项：和弦类型（如"major", "minor"等）
                     'is_authenticated': current_user.is_authenticated if hasattr(current_user, 'is_authenticated') else False,
-                })
+                }, synth)
             except Exception as e:
-                print(f"❌ 返回JSON时出错: {e}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({
+                logger.exception("❌ 返回JSON时出错: %s", e)
+                return {
                     'status': 'error',
                     'msg': f'生成响应时出错: {str(e)}'
-                }), 500
+                }, 500
         
         else:
-            return jsonify({'status': 'error', 'message': '该练习类型暂未实现'})
+            return {'status': 'error', 'message': '该练习类型暂未实现'}
     except Exception as e:
-        print(f"❌ 生成题目时出错: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({
+        logger.exception("❌ 生成题目时出错: %s", e)
+        return {
             'status': 'error',
             'msg': f'服务器错误: {str(e)}'
-        }), 500
+        }, 500
+
+@app.route('/api/generate_question/<exercise_type>')
+def generate_question(exercise_type):
+    """生成题目"""
+    result = build_question(exercise_type, request.args)
+    question = result[0] if isinstance(result, tuple) else result
+    if question.get('status') == 'ok':
+        _version_question_audio(question, audio_profiles.negotiate(request))
+    return result
+
+# 批量出题的最大题数：缓存未命中时每题都要同步渲染，题数多了单个请求会占住 worker 很久；
+# 练习页题目队列用完后会再请求剩余的题目
+MAX_BATCH_QUESTIONS = 10
+
+# 题目中的音频字段（static/audio 下的相对路径）
+QUESTION_AUDIO_FIELDS = ('audio_file', 'root_audio_file', 'scale_audio_file', 'chord_audio_file')
+
+def _question_audio_files(question):
+    """题目用到的全部音频（static/audio 下的相对路径）"""
+    return [question[field] for field in QUESTION_AUDIO_FIELDS if question.get(field)]
+
+# 客户端合成模式的音色拼接包覆盖的音符（NOTE_NAMES 范围内的钢琴音，见 audio_sprites.py）
+SPRITE_INSTRUMENT = 'piano'
+SPRITE_NOTES = [sample_note_name(note) for note in NOTE_NAMES]
+
+# 渲染等锁超时且无法改用客户端合成时的错误（可重试）
+RENDER_BUSY_ERROR = {'status': 'error', 'msg': '音频正在生成，请稍后重试', 'retry': True}
+
+def _sprite_ready():
+    """音色拼接包是否已是最新（不生成、不等锁）"""
+    return audio_sprites.get_sprite_builder().ready(SPRITE_INSTRUMENT, SPRITE_NOTES) is not None
+
+def _version_question_audio(question, profile=audio_profiles.ORIGINAL):
+    """音频路径换成所选编码档位的变体（见 audio_profiles.py），并带上版本号（?v=<渲染输入哈希>），浏览器可长期缓存
+    
+    客户端合成模式的题目另外带上音色拼接包的地址（sprite）
+    """
+    for field in QUESTION_AUDIO_FIELDS:
+        if question.get(field):
+            question[field] = static_assets.versioned_audio(audio_profiles.select(question[field], profile))
+    if question.get('synth'):
+        # 渲染超时回退的题目只在拼接包就绪时带 synth，这里不会生成；客户端合成模式下拼接包缺失时才生成
+        if not _sprite_ready():
+            audio_sprites.get_sprite_builder().get(SPRITE_INSTRUMENT, SPRITE_NOTES)
+        question['sprite'] = {
+            'manifest': static_assets.versioned_audio(audio_sprites.manifest_path(SPRITE_INSTRUMENT)),
+            'audio': static_assets.versioned_audio(
+                audio_profiles.select(audio_sprites.audio_path(SPRITE_INSTRUMENT), profile)),
+        }
+
+@app.route('/api/generate_questions/<exercise_type>')
+def generate_questions(exercise_type):
+    """批量生成题目（如整个练习会话的 20 题），同时返回所有题目的音频列表供客户端预取"""
+    try:
+        count = int(request.args.get('count', '20'))
+    except ValueError:
+        return jsonify({'status': 'error', 'msg': '无效的题目数量'}), 400
+    count = max(1, min(count, MAX_BATCH_QUESTIONS))
+    
+    profile = audio_profiles.negotiate(request)
+    questions = []
+    seen = set()
+    if exercise_type == 'interval':
+        # 音程题直接从索引中一次抽出互不相同的组合，不必反复出题再去重
+        candidates = INTERVAL_INDEX.candidates(*_interval_filters(request.args))
+        if not candidates:
+            return {'status': 'error', 'msg': '没有符合条件的题目，请调整选择'}
+        picks = candidates.sample_distinct(count)
+        # 组合不足 count 个时允许重复
+        picks += [candidates.sample() for _ in range(count - len(picks))]
+    else:
+        picks = [None] * (count * 3)
+    # 其他题型尽量避免重复题目；可选组合太少时允许重复
+    for attempt, pick in enumerate(picks):
+        if len(questions) >= count:
+            break
+        result = build_question(exercise_type, request.args, interval_pick=pick)
+        question = result[0] if isinstance(result, tuple) else result
+        if question.get('status') != 'ok':
+            if questions:
+                break
+            return result
+        identity = (tuple(_question_audio_files(question)), json.dumps(question.get('synth'), sort_keys=True),
+                    question.get('correct_value'))
+        if pick is None and identity in seen and attempt < count * 2:
+            continue
+        seen.add(identity)
+        _version_question_audio(question, profile)
+        questions.append(question)
+    
+    audio_files = []
+    for question in questions:
+        for audio_file in _question_audio_files(question):
+            if audio_file not in audio_files:
+                audio_files.append(audio_file)
+    
+    return jsonify({
+        'status': 'ok',
+        'questions': questions,
+        'audio_files': audio_files,  # 所有题目的音频（去重，按出题顺序）
+    })
 
 @app.route('/api/start_session', methods=['POST'])
 def start_session():
@@ -1653,6 +1969,8 @@ def start_session():
         settings=json.dumps(settings) if settings else None
     )
     db.session.add(session)
+    db.session.flush()  # 获取 session.id 和 start_time
+    stats_rollup.record_session_start(session)
     db.session.commit()
     
     return jsonify({
@@ -1684,10 +2002,12 @@ def end_session():
     if not session:
         return jsonify({'status': 'error', 'msg': '会话不存在'}), 404
     
+    before = stats_rollup.snapshot(session)
     session.end_time = datetime.utcnow()
     session.duration = duration
     session.total_questions = total_questions
     session.correct_answers = correct_answers
+    stats_rollup.record_session_update(session, before)
     db.session.commit()
     
     return jsonify({'status': 'ok'})
@@ -1695,186 +2015,64 @@ def end_session():
 @app.route('/api/statistics', methods=['GET'])
 @login_required
 def get_statistics():
-    """获取用户统计数据"""
+    """获取用户统计数据（读取 stats_rollup 维护的汇总表，与历史记录数量无关）"""
     try:
-        # 1. 用户总练习时长和题目总数
-        all_sessions = PracticeSession.query.filter_by(user_id=current_user.id).all()
-        total_duration = sum((s.duration or 0) for s in all_sessions)  # 秒
-        total_questions = sum((s.total_questions or 0) for s in all_sessions)
+        user_id = current_user.id
+        
+        # 1. 按练习类型汇总：次数、时长、题目数、正确数
+        totals = stats_rollup.exercise_totals(user_id)
+        total_duration = sum(row.duration for row in totals.values())  # 秒
+        total_questions = sum(row.total_questions for row in totals.values())
+        total_correct = sum(row.correct_answers for row in totals.values())
+        
+        # 2. 各练习卡片里细分项的统计数据
+        sub_item_stats_by_type = {}
+        for row in stats_rollup.sub_item_totals(user_id):
+            sub_item_stats_by_type.setdefault(row.exercise_type, {})[row.sub_item] = {
+                'duration': row.duration,
+                'total_questions': row.total_questions,
+                'correct_answers': row.correct_answers,
+                'accuracy': (row.correct_answers / row.total_questions * 100) if row.total_questions > 0 else 0,
+            }
         
-        # 2. 各练习卡片的统计数据
+        # 3. 各练习卡片的统计数据
         exercise_stats = {}
         for exercise_type in EXERCISE_TYPES.keys():
-            sessions = PracticeSession.query.filter_by(
-                user_id=current_user.id,
-                exercise_type=exercise_type
-            ).all()
-            
-            exercise_duration = sum((s.duration or 0) for s in sessions)
-            exercise_questions = sum((s.total_questions or 0) for s in sessions)
-            exercise_correct = sum((s.correct_answers or 0) for s in sessions)
+            row = totals.get(exercise_type)
+            exercise_questions = row.total_questions if row else 0
+            exercise_correct = row.correct_answers if row else 0
             exercise_accuracy = (exercise_correct / exercise_questions * 100) if exercise_questions > 0 else 0
-            
-            # 3. 各练习卡片里细分项的统计数据
-            sub_item_stats = {}
-            if exercise_type == 'interval':
-                # 查询该练习类型的所有题目
-                session_ids = [s.id for s in sessions]
-                if session_ids:
-                    questions = Question.query.filter(
-                        Question.session_id.in_(session_ids),
-                        Question.exercise_type == exercise_type
-                    ).all()
-                    
-                    # 按细分项统计
-                    for question in questions:
-                        sub_item = question.sub_item or ''
-                        if sub_item:
-                            if sub_item not in sub_item_stats:
-                                sub_item_stats[sub_item] = {
-                                    'duration': 0,
-                                    'total_questions': 0,
-                                    'correct_answers': 0
-                                }
-                            # 获取该题目的答案
-                            answer = UserAnswer.query.filter_by(
-                                question_id=question.id,
-                                user_id=current_user.id
-                            ).first()
-                            if answer:
-                                sub_item_stats[sub_item]['total_questions'] += 1
-                                if answer.is_correct:
-                                    sub_item_stats[sub_item]['correct_answers'] += 1
-                                # 使用响应时间累加作为时长估算
-                                if answer.response_time:
-                                    sub_item_stats[sub_item]['duration'] += int(answer.response_time)
-                    
-                    # 计算细分项的正确率
-                    for sub_item, stats in sub_item_stats.items():
-                        stats['accuracy'] = (stats['correct_answers'] / stats['total_questions'] * 100) if stats['total_questions'] > 0 else 0
-            elif exercise_type == 'scale_degree':
-                # 音阶练习的细分项是音级（如"1", "2", "b3"等）
-                session_ids = [s.id for s in sessions]
-                if session_ids:
-                    questions = Question.query.filter(
-                        Question.session_id.in_(session_ids),
-                        Question.exercise_type == exercise_type
-                    ).all()
-                    
-                    for question in questions:
-                        sub_item = question.sub_item or question.correct_answer or ''
-                        if sub_item:
-                            if sub_item not in sub_item_stats:
-                                sub_item_stats[sub_item] = {
-                                    'duration': 0,
-                                    'total_questions': 0,
-                                    'correct_answers': 0
-                                }
-                            answer = UserAnswer.query.filter_by(
-                                question_id=question.id,
-                                user_id=current_user.id
-                            ).first()
-                            if answer:
-                                sub_item_stats[sub_item]['total_questions'] += 1
-                                if answer.is_correct:
-                                    sub_item_stats[sub_item]['correct_answers'] += 1
-                                if answer.response_time:
-                                    sub_item_stats[sub_item]['duration'] += int(answer.response_time)
-                    
-                    for sub_item, stats in sub_item_stats.items():
-                        stats['accuracy'] = (stats['correct_answers'] / stats['total_questions'] * 100) if stats['total_questions'] > 0 else 0
-            elif exercise_type == 'chord_quality':
-                # 和弦练习的细分项是和弦类型（如"major", "minor"等）
-                session_ids = [s.id for s in sessions]
-                if session_ids:
-                    questions = Question.query.filter(
-                        Question.session_id.in_(session_ids),
-                        Question.exercise_type == exercise_type
-                    ).all()
-                    
-                    for question in questions:
-                        sub_item = question.sub_item or question.correct_answer or ''
-                        if sub_item:
-                            if sub_item not in sub_item_stats:
-                                sub_item_stats[sub_item] = {
-                                    'duration': 0,
-                                    'total_questions': 0,
-                                    'correct_answers': 0
-                                }
-                            answer = UserAnswer.query.filter_by(
-                                question_id=question.id,
-                                user_id=current_user.id
-                            ).first()
-                            if answer:
-                                sub_item_stats[sub_item]['total_questions'] += 1
-                                if answer.is_correct:
-                                    sub_item_stats[sub_item]['correct_answers'] += 1
-                                if answer.response_time:
-                                    sub_item_stats[sub_item]['duration'] += int(answer.response_time)
-                    
-                    for sub_item, stats in sub_item_stats.items():
-                        stats['accuracy'] = (stats['correct_answers'] / stats['total_questions'] * 100) if stats['total_questions'] > 0 else 0
-            
-            # 计算练习次数
-            practice_count = len(sessions)
-            
             exercise_stats[exercise_type] = {
-                'duration': exercise_duration,
+                'duration': row.duration if row else 0,
                 'total_questions': exercise_questions,
                 'accuracy': round(exercise_accuracy, 2),
-                'practice_count': practice_count,
-                'sub_items': sub_item_stats
+                'practice_count': row.practice_count if row else 0,
+                'sub_items': sub_item_stats_by_type.get(exercise_type, {})
             }
         
         # 4. 用户每天活跃日期和时长
-        daily_stats = {}
-        for session in all_sessions:
-            if session.start_time:
-                date_key = session.start_time.date().isoformat()
-                if date_key not in daily_stats:
-                    daily_stats[date_key] = {
-                        'date': date_key,
-                        'duration': 0,
-                        'sessions': 0
-                    }
-                daily_stats[date_key]['duration'] += (session.duration or 0)
-                daily_stats[date_key]['sessions'] += 1
-        
-        # 转换为列表并按日期排序
-        daily_stats_list = sorted(daily_stats.values(), key=lambda x: x['date'], reverse=True)
-        
-        # 5. 计算总正确数和练习天数
-        total_correct = sum((s.correct_answers or 0) for s in all_sessions)
-        practice_days = len(set(s.start_time.date() for s in all_sessions if s.start_time))
-        
-        # 6. 按周/月/年分组的时长分布
+        daily_rows = stats_rollup.daily_totals(user_id)
+        daily_stats_list = sorted(
+            [{'date': row.day.isoformat(), 'duration': row.duration, 'sessions': row.sessions}
+             for row in daily_rows],
+            key=lambda x: x['date'], reverse=True)
+        practice_days = len(daily_rows)
+        
+        # 5. 按周/月/年分组的时长分布：由按天的汇总再合并（只统计有时长记录的会话）
         weekly_stats = {}  # {year-week: duration}
         monthly_stats = {}  # {year-month: duration}
         yearly_stats = {}  # {year: duration}
-        
-        for session in all_sessions:
-            if session.start_time and session.duration:
-                dt = session.start_time
-                duration = session.duration or 0
-                
-                # 按周统计（ISO周）
-                year, week, _ = dt.isocalendar()
-                week_key = f"{year}-W{week:02d}"
-                if week_key not in weekly_stats:
-                    weekly_stats[week_key] = 0
-                weekly_stats[week_key] += duration
-                
-                # 按月统计
-                month_key = f"{dt.year}-{dt.month:02d}"
-                if month_key not in monthly_stats:
-                    monthly_stats[month_key] = 0
-                monthly_stats[month_key] += duration
-                
-                # 按年统计
-                year_key = str(dt.year)
-                if year_key not in yearly_stats:
-                    yearly_stats[year_key] = 0
-                yearly_stats[year_key] += duration
+        for row in daily_rows:
+            if not row.timed_sessions:
+                continue
+            d = row.day
+            year, week, _ = d.isocalendar()
+            week_key = f"{year}-W{week:02d}"
+            month_key = f"{d.year}-{d.month:02d}"
+            year_key = str(d.year)
+            weekly_stats[week_key] = weekly_stats.get(week_key, 0) + row.duration
+            monthly_stats[month_key] = monthly_stats.get(month_key, 0) + row.duration
+            yearly_stats[year_key] = yearly_stats.get(year_key, 0) + row.duration
         
         # 转换为列表并排序
         weekly_list = sorted([{'period': k, 'duration': v} for k, v in weekly_stats.items()], 
@@ -1897,9 +2095,7 @@ def get_statistics():
             'yearly_stats': yearly_list
         })
     except Exception as e:
-        print(f"获取统计数据失败: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("获取统计数据失败: %s", e)
         return jsonify({
             'status': 'error',
             'msg': f'获取统计数据失败: {str(e)}'
@@ -1921,31 +2117,15 @@ def submit_answer():
     # 如果用户已登录，保存到数据库
     if current_user.is_authenticated and session_id:
         try:
-            # 创建题目记录
-            question = Question(
-                session_id=session_id,
-                exercise_type=question_data.get('exercise_type', ''),
-                question_data=json.dumps(question_data),
-                correct_answer=correct_value,
-                sub_item=sub_item
-            )
-            db.session.add(question)
-            db.session.flush()  # 获取question.id
-            
-            # 创建用户答案记录
-            user_answer_record = UserAnswer(
-                user_id=current_user.id,
-                question_id=question.id,
-                user_answer=user_answer,
-                is_correct=is_correct,
-                response_time=response_time
-            )
-            db.session.add(user_answer_record)
-            db.session.commit()
+            record = answer_buffer.make_answer_record(
+                current_user.id, session_id, question_data, correct_value, sub_item,
+                user_answer, is_correct, response_time)
+            # write-behind 模式下交给后台线程批量写入；未开启或队列已满时同步写入
+            if answer_writer is None or not answer_writer.submit(record):
+                answer_buffer.write_answers([record])
+                db.session.commit()
         except Exception as e:
-            print(f"保存答案失败: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("保存答案失败: %s", e)
             db.session.rollback()
     
     # 获取用户答案的中文名称
@@ -2003,6 +2183,7 @@ def login():
             flash('密码错误')
             return redirect(url_for('login'))
         login_user(user)
+        identity_cache.get_identity_cache().put(user)
         flash('登录成功')
         return redirect(url_for('index'))
     return render_template('login.html')
@@ -2010,6 +2191,7 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
+    identity_cache.get_identity_cache().invalidate(current_user.id)
     logout_user()
     flash('已登出')
     return redirect(url_for('index'))
@@ -2022,55 +2204,171 @@ def statistics():
                          exercise_types=EXERCISE_TYPES,
                          current_user=current_user)
 
+# 日志查看：从文件末尾按块向前读取（开销与行数成正比，见 log_tail.py）
+LOG_VIEW_LINES = 1000
+LOG_RECENT_LINES = 200
+# /logs 页面实时模式的刷新间隔（毫秒）：每次是一个立即返回的短请求（/api/logs/recent?offset=）
+LOG_POLL_INTERVAL_MS = int(os.environ.get('LOG_POLL_INTERVAL_MS', '3000'))
+# 事件流（/api/logs/stream，供 curl -N 等工具使用）每个连接的最长时间（秒），到时客户端带上最后的偏移重连
+LOG_STREAM_MAX_SECONDS = float(os.environ.get('LOG_STREAM_MAX_SECONDS', '25'))
+# 可以检索 gunicorn 的 access.log / error.log（含访客 IP、请求路径和 traceback）的用户 id，逗号分隔；
+# 未设置时只能检索 app.log
+LOG_VIEWERS = {int(user_id) for user_id in os.environ.get('LOG_VIEWERS', '').split(',') if user_id.strip().isdigit()}
+# 长连接（事件流、日志检索）整个实例同时最多几个：每个连接都会占住一个 sync worker，
+# 名额用 logs/.streams 下的文件锁表示（所有 worker 共享），用完时拒绝新连接
+LOG_STREAM_SLOTS = int(os.environ.get('LOG_STREAM_SLOTS', '1'))
+# 名额用完时让客户端多久之后重试（秒）
+LOG_STREAM_RETRY_SECONDS = 30
+log_stream_slots = log_tail.StreamSlots(os.path.join(basedir, 'logs', '.streams'), LOG_STREAM_SLOTS)
+
+def _log_files_for(user):
+    """用户可以检索的日志文件（log_archive.KINDS 中的名称）"""
+    if user.is_authenticated and user.id in LOG_VIEWERS:
+        return log_archive.KINDS
+    return ('app',)
+
 @app.route('/logs')
 @login_required
 def view_logs():
     """查看服务器日志（需要登录）"""
     try:
-        # 尝试读取日志文件
-        log_file = os.path.join(basedir, '..', 'logs', 'app.log')
+        log_file = log_tail.default_log_file()
         if not os.path.exists(log_file):
-            # 尝试其他可能的日志位置
-            log_file = os.path.join(basedir, 'logs', 'app.log')
-            if not os.path.exists(log_file):
-                # 如果没有日志文件，返回最近的print输出
-                return render_template('logs.html', 
-                                     logs="暂无日志文件。日志会显示在服务器控制台。\n\n提示：如果使用 gunicorn，日志通常在 logs/app.log",
-                                     error="未找到日志文件")
+            # 如果没有日志文件，返回提示
+            return render_template('logs.html', 
+                                 logs="暂无日志文件。\n\n提示：日志写在 logs/app.log（见 structured_logging.py）",
+                                 error="未找到日志文件", offset=0)
         
         # 读取最后1000行日志
-        with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-            # 取最后1000行
-            recent_logs = ''.join(lines[-1000:]) if len(lines) > 1000 else ''.join(lines)
-        
-        return render_template('logs.html', logs=recent_logs, error=None)
+        entries, offset = log_tail.tail(log_file, LOG_VIEW_LINES)
+        recent_logs = '\n'.join(log_tail.format_entry(entry) for entry in entries)
+        return render_template('logs.html', logs=recent_logs, error=None, offset=offset,
+                               file_id=os.stat(log_file).st_ino, poll_interval=LOG_POLL_INTERVAL_MS,
+                               log_files=_log_files_for(current_user))
     except Exception as e:
         return render_template('logs.html', 
                              logs=f"读取日志时出错: {str(e)}", 
-                             error=str(e))
+                             error=str(e), offset=0)
 
 @app.route('/api/logs/recent')
 @login_required
 def get_recent_logs():
-    """获取最近的日志（API，用于实时刷新）"""
+    """获取最近的日志（API）；可选参数 level（最低级别）、since / until（ISO 时间）、lines
+
+    带 offset（以及上次返回的 file_id）时只返回该偏移之后新追加的行（实时模式定时调用），立即返回
+    """
     try:
-        log_file = os.path.join(basedir, '..', 'logs', 'app.log')
+        log_file = log_tail.default_log_file()
         if not os.path.exists(log_file):
-            log_file = os.path.join(basedir, 'logs', 'app.log')
-            if not os.path.exists(log_file):
-                return jsonify({'status': 'error', 'msg': '未找到日志文件'})
-        
-        # 读取最后200行
-        with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-            recent_logs = ''.join(lines[-200:]) if len(lines) > 200 else ''.join(lines)
-        
-        return jsonify({'status': 'ok', 'logs': recent_logs})
+            return jsonify({'status': 'error', 'msg': '未找到日志文件'})
+        try:
+            lines = max(1, min(int(request.args.get('lines', LOG_RECENT_LINES)), LOG_VIEW_LINES))
+            offset = request.args.get('offset')
+            offset = int(offset) if offset not in (None, '') else None
+            file_id = request.args.get('file_id')
+            file_id = int(file_id) if file_id not in (None, '') else None
+        except ValueError:
+            return jsonify({'status': 'error', 'msg': '无效的行数或偏移'}), 400
+        
+        log_filter = log_tail.LogFilter.from_args(request.args)
+        if offset is not None:
+            entries, offset, file_id = log_tail.read_new(log_file, offset, file_id, log_filter, max_lines=lines)
+        else:
+            entries, offset = log_tail.tail(log_file, lines, log_filter)
+            file_id = os.stat(log_file).st_ino
+        recent_logs = '\n'.join(log_tail.format_entry(entry) for entry in entries)
+        return jsonify({'status': 'ok', 'logs': recent_logs, 'offset': offset, 'file_id': file_id})
     except Exception as e:
         return jsonify({'status': 'error', 'msg': str(e)})
 
+@app.route('/api/logs/stream')
+@login_required
+def stream_logs():
+    """实时日志（Server-Sent Events）：推送 offset 之后新追加的日志行
+
+    起点取 Last-Event-ID（浏览器重连时自动带上）或 ?offset=，都没有时从文件末尾开始；
+    可选参数 level、since、until 同 /api/logs/recent。每个事件的 id 是该行之后的字节偏移。
+    每个连接占住一个 worker，受 LOG_STREAM_SLOTS 限制；名额用完时只发送 retry: 让客户端稍后重连。
+    /logs 页面不使用这个接口（定时调用 /api/logs/recent?offset=）。
+    """
+    slot = log_stream_slots.acquire()
+    if slot is None:
+        response = Response(f'retry: {LOG_STREAM_RETRY_SECONDS * 1000}\n: busy\n\n', mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    log_file = log_tail.default_log_file()
+    try:
+        offset = request.headers.get('Last-Event-ID') or request.args.get('offset')
+        offset = int(offset) if offset not in (None, '') else None
+    except ValueError:
+        offset = None
+    log_filter = log_tail.LogFilter.from_args(request.args)
+    
+    def events():
+        # 连接断开后约 3 秒重连
+        yield 'retry: 3000\n\n'
+        for line_offset, entry in log_tail.follow(log_file, offset, log_filter, max_seconds=LOG_STREAM_MAX_SECONDS):
+            if entry is None:
+                # 偏移更新 / 心跳：只有 id 没有 data 的事件不会触发 onmessage，但会更新重连时的 Last-Event-ID
+                yield f'id: {line_offset}\n: keepalive\n\n'
+                continue
+            data = ''.join(f'data: {text}\n' for text in log_tail.format_entry(entry).split('\n'))
+            yield f'id: {line_offset}\n{data}\n'
+    
+    response = Response(events(), mimetype='text/event-stream')
+    # 连接结束（包括客户端断开）时释放名额
+    response.call_on_close(slot.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    # 反向代理（nginx）不要缓冲事件流
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/logs/search')
+@login_required
+def search_logs():
+    """按时间范围检索日志（包括已轮转压缩的归档，见 log_archive.py），结果逐行流式返回（纯文本）
+
+    参数：file（app / access / error）、since（必填）、until（默认现在）、level、q（关键字）
+    access / error 只有 LOG_VIEWERS 中的用户可以检索；检索与事件流共用 LOG_STREAM_SLOTS 名额
+    """
+    kind = request.args.get('file', 'app')
+    if kind not in log_archive.KINDS:
+        return jsonify({'status': 'error', 'msg': '未知的日志文件'}), 400
+    if kind not in _log_files_for(current_user):
+        return jsonify({'status': 'error', 'msg': '没有查看该日志的权限'}), 403
+    since = log_tail.parse_time(request.args.get('since'))
+    until = log_tail.parse_time(request.args.get('until')) if request.args.get('until') else None
+    if since is None or (request.args.get('until') and until is None):
+        return jsonify({'status': 'error', 'msg': '请提供有效的开始时间（since）'}), 400
+    level = request.args.get('level')
+    query = request.args.get('q') or None
+    slot = log_stream_slots.acquire()
+    if slot is None:
+        response = jsonify({'status': 'error', 'msg': f'其他人正在检索日志，请 {LOG_STREAM_RETRY_SECONDS} 秒后重试'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(LOG_STREAM_RETRY_SECONDS)
+        return response
+    
+    def lines():
+        count = 0
+        for text in log_archive.search(kind, since, until, level=level, query=query):
+            if text is None:
+                yield f'… 已达到 {log_archive.SEARCH_MAX_LINES} 行上限，请缩小时间范围\n'
+                return
+            count += 1
+            yield text + '\n'
+        if count == 0:
+            yield '（该时间范围内没有日志）\n'
+    
+    response = Response(lines(), mimetype='text/plain')
+    # 检索结束（包括客户端断开）时释放名额
+    response.call_on_close(slot.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 if __name__ == '__main__':
+    initialize_app()
     # 开发环境：允许局域网访问
     # 访问地址：http://你的IP地址:5001
     app.run(host='0.0.0.0', port=5001, debug=True)
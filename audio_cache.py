@@ -0,0 +1,402 @@
+"""生成音频的内容寻址缓存
+
+每个生成的音频文件（static/audio 下的相对路径，如 chords/C4_E4_G4_2sec.mp3）
+对应一个输入哈希：音符、乐器、时长、归一化参数以及所用音源文件内容。
+清单（static/audio/.render_manifest.json）在每个 worker 中只加载一次，
+请求路径上的缓存查询只查内存字典，不再对每个文件调用 os.path.exists；
+音源文件或渲染参数变化会使哈希改变，从而自动重新生成。
+
+写入流程：先渲染到同目录的临时文件，再 os.replace 原子替换，
+并发的 worker 永远不会读到写了一半的 MP3。清单的读-合并-写用文件锁串行化。
+
+清单里的文件可能被运维删除、git clean 或被其他 worker 淘汰：命中时若距该文件上次确认存在已超过
+refresh_interval，会 stat 一次，文件不存在则从清单删除并按未命中处理（调用方重新渲染）。
+各 worker 记录的最近访问时间在重新加载清单时保留，并在下次写清单时合并写入，淘汰按真正的 LRU 进行。
+
+同一文件的渲染跨进程只做一次（single-flight）：publish 先取该文件的渲染锁
+（static/audio/.render_locks/<路径哈希>.lock，fcntl.flock），拿到锁后重新读取磁盘清单，
+其他 worker 已经用相同输入发布过就直接复用，不再重复调用 ffmpeg。等锁超过
+AUDIO_RENDER_LOCK_TIMEOUT 秒时抛出 RenderTimeout，由调用方改用原始音源。
+
+配置（环境变量）：
+    AUDIO_CACHE_INTERVAL_MAX_MB  static/audio/interval 目录（以及各编码档位的音程变体目录）的
+                                 容量上限（MB），默认 256，超出后按最近使用时间淘汰
+    AUDIO_RENDER_LOCK_TIMEOUT    等待其他 worker 渲染同一文件的最长时间（秒），默认 10
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境没有 fcntl，退化为无锁
+    fcntl = None
+
+import audio_profiles
+import request_timing
+from sample_bank import get_sample_bank
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+AUDIO_ROOT = os.path.join(basedir, 'static', 'audio')
+MANIFEST_PATH = os.path.join(AUDIO_ROOT, '.render_manifest.json')
+LOCKS_DIR = '.render_locks'
+RENDER_LOCK_TIMEOUT = float(os.environ.get('AUDIO_RENDER_LOCK_TIMEOUT', '10'))
+
+# 渲染逻辑有不兼容修改时递增，使所有已有输出失效
+RENDER_VERSION = 1
+
+# 各目录的容量上限（字节），未列出的目录不做淘汰；音程各编码档位的变体目录使用相同的上限
+DEFAULT_DIR_LIMITS = {
+    'interval': int(float(os.environ.get('AUDIO_CACHE_INTERVAL_MAX_MB', '256')) * 1024 * 1024),
+}
+for _name in audio_profiles.PROFILES:
+    if _name != audio_profiles.ORIGINAL:
+        DEFAULT_DIR_LIMITS[f'{audio_profiles.VARIANTS_DIR}/{_name}/interval'] = DEFAULT_DIR_LIMITS['interval']
+
+
+class RenderTimeout(Exception):
+    """等待其他 worker 渲染同一文件超时"""
+
+
+def render_key(kind, notes, instrument='piano', **params):
+    """计算渲染输入的哈希
+
+    参数:
+        kind: 音频类型（interval / chord / scale / root）
+        notes: 音源格式的音符列表（如 ['C4', 'Cs4']）
+        instrument: 乐器（对应 static/audio/samples/<instrument>）
+        params: 其他影响输出的参数（时长、归一化等）
+    """
+    bank = get_sample_bank(instrument)
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        'v': RENDER_VERSION,
+        'kind': kind,
+        'notes': list(notes),
+        'instrument': instrument,
+        'params': params,
+    }, sort_keys=True).encode('utf-8'))
+    for note in notes:
+        h.update(bank.source_digest(note).encode('ascii'))
+    return h.hexdigest()
+
+
+class RenderCache:
+    """生成音频的清单 + 原子发布 + 容量淘汰"""
+
+    def __init__(self, audio_root=AUDIO_ROOT, manifest_path=MANIFEST_PATH, dir_limits=None,
+                 refresh_interval=1.0, lock_timeout=None):
+        self.audio_root = audio_root
+        self.manifest_path = manifest_path
+        self.lock_path = manifest_path + '.lock'
+        self.lock_timeout = RENDER_LOCK_TIMEOUT if lock_timeout is None else lock_timeout
+        self.dir_limits = DEFAULT_DIR_LIMITS if dir_limits is None else dir_limits
+        self.refresh_interval = refresh_interval
+        self._entries = None
+        self._manifest_mtime = None
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._defer_depth = 0
+        self._pending = {}
+        # 相对路径 -> 上次确认文件存在的时间（monotonic）
+        self._verified = {}
+        self.hits = 0
+        self.misses = 0
+        self.published = 0
+        self.evicted = 0
+        self.coalesced = 0
+        self.lock_timeouts = 0
+        self.missing = 0
+
+    @request_timing.timed('cache')
+    def lookup(self, rel_path, key):
+        """清单中记录的文件与输入哈希一致（且文件仍存在）时返回相对路径，否则返回 None"""
+        entries = self._current_entries()
+        entry = entries.get(rel_path)
+        if entry is not None and entry.get('key') == key and self._exists(rel_path):
+            entry['atime'] = time.time()
+            self.hits += 1
+            return rel_path
+        self.misses += 1
+        return None
+
+    def _exists(self, rel_path):
+        """距上次确认超过 refresh_interval 时 stat 一次；文件已不存在时从清单删除"""
+        now = time.monotonic()
+        if now - self._verified.get(rel_path, float('-inf')) < self.refresh_interval:
+            return True
+        if os.path.exists(os.path.join(self.audio_root, rel_path)):
+            self._verified[rel_path] = now
+            return True
+        self._verified.pop(rel_path, None)
+        self.missing += 1
+        self.forget(rel_path)
+        return False
+
+    def publish(self, rel_path, key, render, force=False, timeout=None):
+        """渲染并原子发布文件（同一文件跨进程只渲染一次）
+
+        render(tmp_path) 负责把音频写到临时路径；写完后原子替换到最终位置，
+        再把条目合并写入磁盘清单。拿到渲染锁时其他 worker 已发布相同输入
+        （force 为 False）则跳过渲染。等锁超过 timeout 秒（默认 lock_timeout）
+        抛出 RenderTimeout。返回相对路径。
+        """
+        with self.render_lock(rel_path, timeout):
+            if not force and self._is_published(rel_path, key):
+                self.coalesced += 1
+                return rel_path
+
+            final_path = os.path.join(self.audio_root, rel_path)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            tmp_path = f"{final_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                render(tmp_path)
+                os.replace(tmp_path, final_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            now = time.time()
+            entry = {'key': key, 'size': os.path.getsize(final_path), 'mtime': now, 'atime': now}
+            self.published += 1
+            if self._defer_depth:
+                # 批量模式：先记在内存里，退出 deferred() 时一次性写入清单
+                self._pending[rel_path] = entry
+                self._current_entries()[rel_path] = entry
+                return rel_path
+            # 清单写入完成后才释放渲染锁，等待者拿到锁时一定能看到新条目
+            self._commit({rel_path: entry})
+            return rel_path
+
+    def render_lock(self, rel_path, timeout=None):
+        """rel_path 的跨进程渲染锁（不经过清单的文件也可直接使用，如 songs_1min）"""
+        digest = hashlib.sha1(rel_path.encode('utf-8')).hexdigest()[:20]
+        return _RenderLock(os.path.join(self.audio_root, LOCKS_DIR, f'{digest}.lock'),
+                           self.lock_timeout if timeout is None else timeout, self)
+
+    def _is_published(self, rel_path, key):
+        """强制重新读取磁盘清单，判断 rel_path 是否已用相同输入发布"""
+        if self._pending.get(rel_path, {}).get('key') == key:
+            return True
+        entry = self._current_entries(refresh=True).get(rel_path)
+        return entry is not None and entry.get('key') == key
+
+    @contextlib.contextmanager
+    def deferred(self):
+        """批量发布：期间的清单更新合并成一次写入（离线预渲染使用）"""
+        self._defer_depth += 1
+        try:
+            yield self
+        finally:
+            self._defer_depth -= 1
+            if not self._defer_depth and self._pending:
+                pending, self._pending = self._pending, {}
+                self._commit(pending)
+
+    def _commit(self, new_entries):
+        """把新条目合并写入磁盘清单，并按容量上限淘汰"""
+        with self._manifest_lock():
+            entries = self._read_manifest()
+            # 保留本 worker 记录的最近访问时间，供淘汰参考
+            self._merge_atimes(entries)
+            entries.update(new_entries)
+            self._evict(entries, set(new_entries))
+            self._write_manifest(entries)
+        with self._lock:
+            self._entries = entries
+
+    def forget(self, rel_path):
+        """从清单中删除条目（文件保留）"""
+        with self._manifest_lock():
+            entries = self._read_manifest()
+            self._merge_atimes(entries)
+            entries.pop(rel_path, None)
+            self._write_manifest(entries)
+        with self._lock:
+            self._entries = entries
+
+    def _merge_atimes(self, entries):
+        """把内存中（本 worker 记录的）更新的访问时间合并到刚读出的清单条目"""
+        for path, local in (self._entries or {}).items():
+            entry = entries.get(path)
+            if entry is not None and local.get('atime', 0) > entry.get('atime', 0):
+                entry['atime'] = local['atime']
+
+    def entries(self):
+        return dict(self._current_entries())
+
+    def entry(self, rel_path, verify=False):
+        """清单中 rel_path 的条目（不存在时返回 None），不更新访问时间
+
+        verify 为 True 时同 lookup 确认文件仍存在（要把地址交给客户端时使用）
+        """
+        entry = self._current_entries().get(rel_path)
+        if entry is not None and verify and not self._exists(rel_path):
+            return None
+        return entry
+
+    def stats(self):
+        entries = self._current_entries()
+        dir_bytes = {}
+        for path, entry in entries.items():
+            top = path.split('/', 1)[0]
+            dir_bytes[top] = dir_bytes.get(top, 0) + entry.get('size', 0)
+        return {
+            'entries': len(entries),
+            'dir_bytes': dir_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'published': self.published,
+            'evicted': self.evicted,
+            'coalesced': self.coalesced,
+            'lock_timeouts': self.lock_timeouts,
+            'missing': self.missing,
+        }
+
+    def _current_entries(self, refresh=False):
+        """内存中的清单；最多每 refresh_interval 秒（refresh 为 True 时立即）检查一次磁盘清单是否被其他 worker 更新"""
+        now = time.monotonic()
+        if not refresh and self._entries is not None and now - self._last_refresh < self.refresh_interval:
+            return self._entries
+        with self._lock:
+            self._last_refresh = now
+            try:
+                mtime = os.stat(self.manifest_path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if self._entries is None or mtime != self._manifest_mtime:
+                entries = self._read_manifest()
+                # 其他 worker 更新了清单：保留本 worker 尚未写入的访问时间（下次 _commit 时写入）
+                self._merge_atimes(entries)
+                self._entries = entries
+                self._manifest_mtime = mtime
+            return self._entries
+
+    def _evict(self, entries, keep):
+        """按目录容量上限淘汰最久未使用的文件（keep 中刚发布的文件不淘汰）"""
+        for directory, limit in self.dir_limits.items():
+            prefix = directory + '/'
+            in_dir = [(path, entry) for path, entry in entries.items() if path.startswith(prefix)]
+            total = sum(entry.get('size', 0) for _, entry in in_dir)
+            if total <= limit:
+                continue
+            in_dir.sort(key=lambda item: item[1].get('atime', item[1].get('mtime', 0)))
+            for path, entry in in_dir:
+                if total <= limit:
+                    break
+                if path in keep:
+                    continue
+                try:
+                    os.remove(os.path.join(self.audio_root, path))
+                except OSError:
+                    pass
+                del entries[path]
+                total -= entry.get('size', 0)
+                self.evicted += 1
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data.get('entries', {}) if data.get('version') == RENDER_VERSION else {}
+
+    def _write_manifest(self, entries):
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': RENDER_VERSION, 'entries': entries}, f, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+        try:
+            self._manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            self._manifest_mtime = None
+
+    def _manifest_lock(self):
+        return _FileLock(self.lock_path)
+
+
+class _FileLock:
+    """跨进程互斥（fcntl.flock），同时用线程锁保护本进程内的并发"""
+
+    _thread_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+
+class _RenderLock:
+    """单个文件的跨进程渲染锁（fcntl.flock，非阻塞轮询直到超时）
+
+    flock 锁的是打开的文件描述，同一进程内的不同线程各自 open 也会互斥。
+    锁文件不删除（删除会与正在等锁的进程竞争），数量与生成文件数相同，均为空文件。
+    """
+
+    POLL_INTERVAL = 0.02
+
+    def __init__(self, path, timeout, cache=None):
+        self.path = path
+        self.timeout = timeout
+        self.cache = cache
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        with request_timing.phase('lock'):
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        os.close(fd)
+                        if self.cache is not None:
+                            self.cache.lock_timeouts += 1
+                        raise RenderTimeout(f'等待渲染锁超过 {self.timeout:g} 秒: {self.path}')
+                    time.sleep(self.POLL_INTERVAL)
+        self._fd = fd
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    """获取进程级的生成音频缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RenderCache()
+    return _cache
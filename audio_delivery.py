@@ -0,0 +1,97 @@
+"""音频文件的发送方式
+
+gunicorn 的 sync worker 同一时刻只能处理一个请求，由它传输 MP3 时整个进程都被占住。
+AUDIO_DELIVERY 选择音频的访问地址和发送方式：
+
+- static      （默认）前端访问 /static/audio/...，由 Flask 静态路由或 nginx 的 /static 直接发送
+- flask       前端访问 /audio/...，Flask 校验路径后自己发送（支持 Range；没有反向代理时使用）
+- x-accel     前端访问 /audio/...，Flask 只校验路径，返回 X-Accel-Redirect，由 nginx 发送文件内容
+- x-sendfile  同上，返回 X-Sendfile（Apache mod_xsendfile / lighttpd）
+
+/audio/ 只允许访问 ALLOWED_DIRS 下的音频文件（以及分段索引），不允许跳出 static/audio、
+访问隐藏文件（如渲染清单）。启用了多个编码档位（AUDIO_PROFILES，见 audio_profiles.py）时，
+原始地址按请求协商，发送所选档位的变体。
+
+nginx 配置（x-accel）：
+    location /_audio_internal/ {
+        internal;
+        alias /path/to/openEar/static/audio/;
+    }
+
+配置（环境变量）：
+    AUDIO_DELIVERY        static / flask / x-accel / x-sendfile，默认 static
+    AUDIO_ACCEL_PREFIX    X-Accel-Redirect 的内部路径前缀，默认 /_audio_internal/
+"""
+
+import mimetypes
+import os
+from urllib.parse import quote
+
+from flask import Response, abort, request, send_from_directory
+from werkzeug.security import safe_join
+
+import audio_profiles
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+AUDIO_ROOT = os.path.join(basedir, 'static', 'audio')
+
+MODES = ('static', 'flask', 'x-accel', 'x-sendfile')
+# 可以通过 /audio/ 访问的目录（static/audio 下的第一级）
+ALLOWED_DIRS = ('interval', 'chords', 'scale', 'notes', 'samples', 'songs', 'songs_1min', 'songs_segments',
+                'sprites', audio_profiles.VARIANTS_DIR)
+ALLOWED_EXTENSIONS = ('.mp3', '.wav', '.json', '.webm', '.m4a')
+
+
+def current_mode():
+    mode = os.environ.get('AUDIO_DELIVERY', 'static')
+    return mode if mode in MODES else 'static'
+
+
+def accel_prefix():
+    prefix = os.environ.get('AUDIO_ACCEL_PREFIX', '/_audio_internal/')
+    return prefix if prefix.endswith('/') else prefix + '/'
+
+
+def base_url(mode=None):
+    """前端拼接音频地址用的前缀（后接 static/audio 下的相对路径）"""
+    return '/static/audio/' if (mode or current_mode()) == 'static' else '/audio/'
+
+
+def resolve(filename, audio_root=AUDIO_ROOT):
+    """校验并返回文件的绝对路径；不允许访问时返回 None"""
+    parts = filename.split('/')
+    if len(parts) < 2 or parts[0] not in ALLOWED_DIRS or any(part.startswith('.') for part in parts):
+        return None
+    if not filename.lower().endswith(ALLOWED_EXTENSIONS):
+        return None
+    path = safe_join(audio_root, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+
+def deliver(filename, mode=None, audio_root=AUDIO_ROOT):
+    """/audio/<filename> 的响应"""
+    mode = mode or current_mode()
+    if resolve(filename, audio_root) is None:
+        abort(404)
+    names = audio_profiles.enabled_profiles()
+    requested = filename
+    if len(names) > 1:
+        filename = audio_profiles.select(filename, audio_profiles.negotiate(request, names))
+    path = resolve(filename, audio_root)
+    if path is None:
+        abort(404)
+    mimetype = audio_profiles.mimetype_for(filename) or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if mode == 'x-accel':
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = accel_prefix() + quote(filename)
+    elif mode == 'x-sendfile':
+        response = Response(mimetype=mimetype)
+        response.headers['X-Sendfile'] = path
+    else:
+        # static / flask：由 Flask 发送（conditional=True 支持 Range 和 304）
+        response = send_from_directory(audio_root, filename, mimetype=mimetype, conditional=True)
+    if len(names) > 1 and not requested.startswith(audio_profiles.VARIANTS_DIR + '/'):
+        response.vary.update(audio_profiles.VARY_HEADERS)
+    return response
@@ -0,0 +1,229 @@
+"""纯 NumPy 音频合成引擎
+
+所有函数都作用于形状为 (帧数, 声道数) 的 PCM 数组（int16 或 float32），
+用来替代 pydub 的 overlay / append：
+
+- slice_ms:          按毫秒截取（与 AudioSegment[start:end] 的取整规则一致）
+- conform:           统一多段音频的声道数和采样率（与 pydub 的 _sync 一致：取最大值）
+- concat:            一次分配完成多段拼接（替代反复的 a + b）
+- mix:               逐轨饱和叠加（与 AudioSegment.overlay 逐个折叠的结果逐字节一致）；
+                     指定 headroom_db 时，会削波的混音改为按峰值缩放并留出余量（多音和弦）
+- crossfade:         两段之间线性交叉淡化
+- normalize:         峰值归一化（与 AudioSegment.normalize 一致）
+
+数组本身不带采样率：来自不同采样率音源的片段，先用 conform 统一后再 concat / mix。
+
+只有 export / to_segment 需要 pydub（用于编码 MP3）。
+拼接 / 混音 / 归一化计入请求计时的 mix 阶段，export 计入 encode 阶段（见 request_timing.py）。
+"""
+
+import math
+
+import numpy as np
+
+from request_timing import timed
+
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+
+def ms_to_frames(ms, frame_rate):
+    """毫秒转帧数（与 pydub 的 frame_count 取整方式一致）"""
+    return int(ms * (frame_rate / 1000.0))
+
+
+def duration_ms(pcm, frame_rate):
+    """PCM 时长（毫秒，与 len(AudioSegment) 一致）"""
+    return round(1000 * len(pcm) / frame_rate)
+
+
+def as_frames(pcm):
+    """保证数组为 (帧数, 声道数) 形状"""
+    pcm = np.asarray(pcm)
+    if pcm.ndim == 1:
+        pcm = pcm.reshape(-1, 1)
+    return pcm
+
+
+def fit_frames(pcm, frames):
+    """截断或以静音补齐到指定帧数"""
+    pcm = as_frames(pcm)
+    if len(pcm) >= frames:
+        return pcm[:frames]
+    out = np.zeros((frames, pcm.shape[1]), dtype=pcm.dtype)
+    out[:len(pcm)] = pcm
+    return out
+
+
+def slice_ms(pcm, frame_rate, start_ms=0, end_ms=None):
+    """按毫秒截取片段，返回视图（不复制数据）"""
+    pcm = as_frames(pcm)
+    total_ms = duration_ms(pcm, frame_rate)
+    end_ms = total_ms if end_ms is None else min(end_ms, total_ms)
+    start_ms = min(start_ms, total_ms)
+    start = ms_to_frames(start_ms, frame_rate)
+    end = ms_to_frames(end_ms, frame_rate)
+    if end > len(pcm):
+        # 与 pydub 相同：取整误差导致的缺帧用静音补齐
+        return fit_frames(pcm[start:], end - start)
+    return pcm[start:end]
+
+
+def _match_channels(parts):
+    """单声道与立体声混用时，把单声道复制到多声道（与 pydub 的 _sync 一致）"""
+    channels = max(p.shape[1] for p in parts)
+    for p in parts:
+        if p.shape[1] not in (1, channels):
+            raise ValueError(f"无法混合 {p.shape[1]} 声道与 {channels} 声道的音频")
+    return [p if p.shape[1] == channels else np.repeat(p, channels, axis=1) for p in parts], channels
+
+
+def resample(pcm, src_rate, dst_rate):
+    """线性插值重采样（保持 dtype）"""
+    pcm = as_frames(pcm)
+    if src_rate == dst_rate or not len(pcm):
+        return pcm
+    frames = int(len(pcm) * dst_rate / src_rate)
+    positions = np.arange(frames, dtype=np.float64) * (src_rate / dst_rate)
+    source = np.arange(len(pcm), dtype=np.float64)
+    out = np.column_stack([np.interp(positions, source, pcm[:, c].astype(np.float64))
+                           for c in range(pcm.shape[1])])
+    if pcm.dtype == np.int16:
+        return np.clip(np.rint(out), INT16_MIN, INT16_MAX).astype(np.int16)
+    return out.astype(pcm.dtype)
+
+
+def conform(samples):
+    """[(pcm, 采样率), ...] -> ([pcm, ...], 采样率)：统一到最高的采样率和最多的声道数"""
+    if not samples:
+        raise ValueError("conform 至少需要一段音频")
+    frame_rate = max(rate for _, rate in samples)
+    parts = [resample(pcm, rate, frame_rate) for pcm, rate in samples]
+    parts, _ = _match_channels(parts)
+    return parts, frame_rate
+
+
+@timed('mix')
+def concat(parts, dtype=None):
+    """拼接多段 PCM（采样率须相同，见 conform），只分配一次输出缓冲区"""
+    parts = [as_frames(p) for p in parts]
+    if not parts:
+        raise ValueError("concat 至少需要一段音频")
+    parts, channels = _match_channels(parts)
+    dtype = dtype or parts[0].dtype
+    out = np.empty((sum(len(p) for p in parts), channels), dtype=dtype)
+    pos = 0
+    for p in parts:
+        out[pos:pos + len(p)] = p
+        pos += len(p)
+    return out
+
+
+@timed('mix')
+def mix(tracks, headroom_db=None):
+    """同时播放多轨 int16 PCM（采样率须相同，见 conform）
+
+    输出长度与第一轨相同，其余轨道依次饱和叠加，
+    结果与 pydub 中 a.overlay(b).overlay(c)... 的 PCM 完全一致，
+    但只使用一个 int32 累加缓冲区，不再为每一步复制整段音频。
+
+    headroom_db: 叠加过程中发生削波时（如 7 个音的 dominant13th），改为直接求和后按峰值缩放，
+    峰值低于满刻度 headroom_db 分贝；不削波时结果不变（已缓存的文件保持逐字节一致）。
+    """
+    tracks = [as_frames(t) for t in tracks]
+    if not tracks:
+        raise ValueError("mix 至少需要一轨音频")
+    tracks, _ = _match_channels(tracks)
+    acc = tracks[0].astype(np.int32)
+    clipped = False
+    for track in tracks[1:]:
+        n = min(len(acc), len(track))
+        acc[:n] += track[:n]
+        if headroom_db is not None and not clipped:
+            clipped = bool((acc[:n] > INT16_MAX).any() or (acc[:n] < INT16_MIN).any())
+        np.clip(acc[:n], INT16_MIN, INT16_MAX, out=acc[:n])
+    if clipped:
+        total = tracks[0].astype(np.float32)
+        for track in tracks[1:]:
+            n = min(len(total), len(track))
+            total[:n] += track[:n]
+        peak = float(np.abs(total).max())
+        total *= INT16_MAX * (10 ** (-headroom_db / 20.0)) / peak
+        return to_int16(total)
+    return acc.astype(np.int16)
+
+
+def crossfade(a, b, frame_rate, fade_ms):
+    """a 的结尾与 b 的开头线性交叉淡化后拼接"""
+    a, b = as_frames(a), as_frames(b)
+    (a, b), channels = _match_channels([a, b])
+    n = min(ms_to_frames(fade_ms, frame_rate), len(a), len(b))
+    out = np.empty((len(a) + len(b) - n, channels), dtype=np.float32)
+    out[:len(a) - n] = a[:len(a) - n]
+    ramp = np.linspace(0.0, 1.0, n, dtype=np.float32).reshape(-1, 1)
+    out[len(a) - n:len(a)] = a[len(a) - n:] * (1.0 - ramp) + b[:n] * ramp
+    out[len(a):] = b[n:]
+    return to_int16(out) if a.dtype == np.int16 else out
+
+
+@timed('mix')
+def normalize(pcm, headroom=0.1):
+    """峰值归一化到满刻度以下 headroom 分贝（与 AudioSegment.normalize 逐字节一致）"""
+    pcm = as_frames(pcm)
+    peak = int(np.abs(pcm.astype(np.int32)).max()) if pcm.size else 0
+    if peak == 0:
+        return pcm
+    target_peak = 32768 * (10 ** (-headroom / 20))
+    factor = 10 ** ((20 * math.log(target_peak / peak, 10)) / 20)
+    scaled = pcm.astype(np.float64) * factor
+    return np.floor(np.clip(scaled, INT16_MIN, INT16_MAX)).astype(np.int16)
+
+
+def to_float32(pcm):
+    """int16 -> [-1, 1) float32"""
+    return as_frames(pcm).astype(np.float32) / 32768.0
+
+
+def to_int16(pcm, normalized=False):
+    """float32 -> int16（normalized=True 表示输入为 [-1, 1) 的归一化采样）"""
+    pcm = as_frames(pcm)
+    if pcm.dtype == np.int16:
+        return pcm
+    data = np.asarray(pcm, dtype=np.float32)
+    if normalized:
+        data = data * 32768.0
+    return np.clip(np.rint(data), INT16_MIN, INT16_MAX).astype(np.int16)
+
+
+def to_mono(pcm):
+    """多声道取平均混成单声道 int16"""
+    pcm = as_frames(pcm)
+    if pcm.shape[1] == 1:
+        return pcm
+    return to_int16(pcm.astype(np.float32).mean(axis=1, keepdims=True))
+
+
+def from_segment(segment):
+    """pydub AudioSegment -> int16 PCM"""
+    segment = segment.set_sample_width(2)
+    return np.frombuffer(segment.raw_data, dtype=np.int16).reshape(-1, segment.channels)
+
+
+def to_segment(pcm, frame_rate):
+    """int16 PCM -> pydub AudioSegment"""
+    from pydub import AudioSegment
+
+    pcm = to_int16(pcm)
+    return AudioSegment(
+        data=np.ascontiguousarray(pcm).tobytes(),
+        sample_width=2,
+        frame_rate=frame_rate,
+        channels=pcm.shape[1],
+    )
+
+
+@timed('encode')
+def export(pcm, frame_rate, path, format='mp3', **kwargs):
+    """编码并写出音频文件"""
+    to_segment(pcm, frame_rate).export(path, format=format, **kwargs)
+    return path
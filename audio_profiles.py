@@ -0,0 +1,251 @@
+"""音频编码档位（多格式变体）与按客户端协商
+
+生成音频默认只有一个版本：ffmpeg 默认码率的 MP3（单声道音源为 64 kbps，2 秒音程约 16 KB；
+歌曲是立体声，每首数 MB），练耳用不到这么高的码率，慢速网络的手机用户要等很久。AUDIO_PROFILES 打开的档位
+离线编码（prerender_audio.py 渲染时一并编码，已有文件用 encode_audio_profiles.py），
+写到 static/audio/variants/<档位>/ 下（不混进原目录，避免被音源库或歌曲列表当成 MP3 扫描到）：
+
+    mp3        原始文件（始终存在）
+    mp3-mono   单声道 32 kbps / 22.05 kHz MP3（所有浏览器都能播放，慢速网络使用）
+    opus       Opus / WebM 24 kbps
+    aac        AAC / M4A 32 kbps
+
+变体与原始文件一样记录在渲染清单中，键由原始文件的输入哈希和档位参数计算：
+原始文件变化（重新渲染）后旧变体自动失效。不在清单中的文件（音源、歌曲、
+1 分钟歌曲）用文件大小和 mtime 代替输入哈希。
+
+请求路径上（缓存未命中时）只渲染原始 MP3，不再同步编码每个档位（每个档位一次 ffmpeg，
+会让出题请求慢好几倍）；变体生成之前 select 返回原始文件。
+
+协商（negotiate）：客户端能播放的格式来自 ?fmt=、页面脚本用 canPlayType 写入的
+audio_formats Cookie 和 Accept 头；Save-Data / ECT / Downlink 客户端提示表明网络较慢时
+优先选择体积最小的档位。出题接口直接返回选中的变体地址；/audio/ 路由（见 audio_delivery.py）
+对原始地址同样按请求协商。
+
+配置（环境变量）：
+    AUDIO_PROFILES           启用的档位，逗号分隔，默认 mp3（只有原始文件），如 mp3,mp3-mono,opus,aac
+    AUDIO_ENCODE_ON_RENDER   设为 1 时渲染原始文件的同时编码变体（prerender_audio.py 自动开启），
+                             默认 0（请求路径上只渲染原始文件）
+"""
+
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import audio_engine
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+AUDIO_ROOT = os.path.join(basedir, 'static', 'audio')
+VARIANTS_DIR = 'variants'
+ORIGINAL = 'mp3'
+
+# format / codec / parameters 传给 ffmpeg（经 pydub export）；channels 为 None 时保持原声道数
+Profile = namedtuple('Profile', ['name', 'ext', 'mimetype', 'format', 'codec', 'bitrate', 'channels',
+                                 'parameters'])
+
+PROFILES = {
+    'mp3': Profile('mp3', '.mp3', 'audio/mpeg', 'mp3', None, None, None, None),
+    'mp3-mono': Profile('mp3-mono', '.mp3', 'audio/mpeg', 'mp3', 'libmp3lame', '32k', 1, ['-ar', '22050']),
+    'opus': Profile('opus', '.webm', 'audio/webm', 'webm', 'libopus', '24k', None, None),
+    'aac': Profile('aac', '.m4a', 'audio/mp4', 'ipod', 'aac', '32k', None, ['-movflags', '+faststart']),
+}
+VARIANT_MIMETYPES = {profile.ext: profile.mimetype for profile in PROFILES.values() if profile.ext != '.mp3'}
+
+# 网络正常时的选择顺序：Opus / AAC 体积更小且音质不低于原始 MP3
+PREFERENCE = ('opus', 'aac', 'mp3')
+# 网络较慢时：再退到单声道低码率 MP3
+SLOW_PREFERENCE = ('opus', 'aac', 'mp3-mono', 'mp3')
+# 所有浏览器都能播放的档位
+UNIVERSAL = ('mp3', 'mp3-mono')
+# Accept 头中的 MIME 类型 -> 档位
+ACCEPT_TYPES = {'audio/webm': 'opus', 'audio/mp4': 'aac', 'audio/aac': 'aac'}
+FORMATS_COOKIE = 'audio_formats'
+SLOW_ECT = ('slow-2g', '2g', '3g')
+SLOW_DOWNLINK_MBPS = 1.5
+# 协商结果依赖的请求头
+VARY_HEADERS = ('Accept', 'Save-Data', 'ECT', 'Downlink', 'Cookie')
+
+
+def enabled_profiles():
+    """启用的档位名（原始 mp3 总在第一个）"""
+    names = [name.strip() for name in os.environ.get('AUDIO_PROFILES', ORIGINAL).split(',')]
+    return [ORIGINAL] + [name for name in PROFILES if name != ORIGINAL and name in names]
+
+
+def encode_on_render():
+    """渲染（publish）时是否同时编码变体"""
+    return os.environ.get('AUDIO_ENCODE_ON_RENDER', '0') == '1'
+
+
+def extra_profiles(names=None):
+    """需要另外编码的档位（不含原始 mp3）"""
+    return [PROFILES[name] for name in (names or enabled_profiles()) if name != ORIGINAL]
+
+
+def variant_path(rel_path, profile):
+    """rel_path（static/audio 下的相对路径）在指定档位下的文件路径"""
+    if profile.name == ORIGINAL:
+        return rel_path
+    return f'{VARIANTS_DIR}/{profile.name}/{os.path.splitext(rel_path)[0]}{profile.ext}'
+
+
+def original_path(rel_path):
+    """题目中的音频路径（可能是带 ?v= 版本号的变体路径）对应的原始文件路径"""
+    rel_path = rel_path.split('?', 1)[0]
+    if rel_path.startswith(VARIANTS_DIR + '/'):
+        profile_name, _, rest = rel_path[len(VARIANTS_DIR) + 1:].partition('/')
+        if profile_name in PROFILES and rest:
+            rel_path = os.path.splitext(rest)[0] + PROFILES[ORIGINAL].ext
+    return rel_path
+
+
+def mimetype_for(rel_path):
+    """变体文件的 MIME 类型（.webm / .m4a 按音频而不是视频发送）；其他扩展名返回 None"""
+    return VARIANT_MIMETYPES.get(os.path.splitext(rel_path)[1].lower())
+
+
+def variant_key(base_key, profile):
+    """变体的清单键：原始文件的键 + 档位编码参数"""
+    h = hashlib.sha256(base_key.encode('utf-8'))
+    h.update(json.dumps(profile._asdict(), sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+def base_key(rel_path, cache=None, audio_root=AUDIO_ROOT):
+    """原始文件当前的键：清单中的输入哈希；不在清单中的文件用大小和 mtime"""
+    entry = _cache(cache).entry(rel_path)
+    if entry is not None and entry.get('key'):
+        return entry['key']
+    try:
+        st = os.stat(os.path.join(audio_root, rel_path))
+    except OSError:
+        return None
+    return f'source:{st.st_size}:{st.st_mtime_ns}'
+
+
+def export(pcm, frame_rate, path, profile):
+    """按档位编码并写出"""
+    if profile.channels == 1:
+        pcm = audio_engine.to_mono(pcm)
+    kwargs = {}
+    if profile.codec:
+        kwargs['codec'] = profile.codec
+    if profile.bitrate:
+        kwargs['bitrate'] = profile.bitrate
+    if profile.parameters:
+        kwargs['parameters'] = list(profile.parameters)
+    return audio_engine.export(pcm, frame_rate, path, format=profile.format, **kwargs)
+
+
+def lookup(cache, rel_path, key, names=None):
+    """原始文件是最新时返回 rel_path，否则返回 None
+
+    渲染时编码变体（encode_on_render）的情况下，还要求所有启用的变体都是最新；
+    否则缺少变体不会触发重新渲染
+    """
+    if not cache.lookup(rel_path, key):
+        return None
+    if not encode_on_render():
+        return rel_path
+    for profile in extra_profiles(names):
+        entry = cache.entry(variant_path(rel_path, profile), verify=True)
+        if entry is None or entry.get('key') != variant_key(key, profile):
+            return None
+    return rel_path
+
+
+def publish(cache, rel_path, key, pcm, frame_rate, names=None, force=False, timeout=None):
+    """渲染原始 MP3（原子发布，跨进程只渲染一次），返回 rel_path；
+    encode_on_render 时同时编码所有启用的变体
+
+    等待其他 worker 渲染同一文件超时时抛出 audio_cache.RenderTimeout
+    """
+    cache.publish(rel_path, key, lambda path: audio_engine.export(pcm, frame_rate, path, format='mp3'),
+                  force=force, timeout=timeout)
+    if encode_on_render():
+        encode_variants(rel_path, pcm, frame_rate, key, cache, names, force=force, timeout=timeout)
+    return rel_path
+
+
+def encode_variants(rel_path, pcm, frame_rate, key=None, cache=None, names=None, force=False, timeout=None):
+    """为已有的原始文件编码启用的变体（已是最新的跳过），返回新编码的档位名列表"""
+    cache = _cache(cache)
+    key = key or base_key(rel_path, cache)
+    if key is None:
+        return []
+    encoded = []
+    for profile in extra_profiles(names):
+        path = variant_path(rel_path, profile)
+        vkey = variant_key(key, profile)
+        entry = cache.entry(path)
+        if not force and entry is not None and entry.get('key') == vkey:
+            continue
+        cache.publish(path, vkey, lambda tmp_path, profile=profile: export(pcm, frame_rate, tmp_path, profile),
+                      force=force, timeout=timeout)
+        encoded.append(profile.name)
+    return encoded
+
+
+def select(rel_path, profile_name, cache=None):
+    """rel_path 在指定档位下的最新变体；变体不存在或已过期时返回原路径"""
+    if not rel_path or profile_name == ORIGINAL or profile_name not in PROFILES:
+        return rel_path
+    if rel_path.startswith(VARIANTS_DIR + '/'):
+        return rel_path
+    cache = _cache(cache)
+    profile = PROFILES[profile_name]
+    path = variant_path(rel_path, profile)
+    entry = cache.entry(path, verify=True)
+    if entry is None:
+        return rel_path
+    key = base_key(rel_path, cache)
+    if key is None or entry.get('key') != variant_key(key, profile):
+        return rel_path
+    return path
+
+
+def client_formats(req):
+    """客户端声明能播放的档位"""
+    formats = set(UNIVERSAL)
+    cookie = req.cookies.get(FORMATS_COOKIE, '')
+    formats.update(name for name in cookie.split('.') if name in PROFILES)
+    for mimetype, quality in req.accept_mimetypes:
+        name = ACCEPT_TYPES.get(mimetype.split(';')[0].strip())
+        if name and quality > 0:
+            formats.add(name)
+    return formats
+
+
+def is_slow(req):
+    """客户端提示（Save-Data / ECT / Downlink）表明网络较慢"""
+    if req.headers.get('Save-Data', '').lower() == 'on':
+        return True
+    if req.headers.get('ECT', '').lower() in SLOW_ECT:
+        return True
+    try:
+        return float(req.headers.get('Downlink', '')) < SLOW_DOWNLINK_MBPS
+    except ValueError:
+        return False
+
+
+def negotiate(req, names=None):
+    """为请求选择档位名"""
+    names = names or enabled_profiles()
+    if len(names) == 1:
+        return ORIGINAL
+    requested = req.args.get('fmt')
+    if requested in names:
+        return requested
+    formats = client_formats(req)
+    for name in (SLOW_PREFERENCE if is_slow(req) else PREFERENCE):
+        if name in names and name in formats:
+            return name
+    return ORIGINAL
+
+
+def _cache(cache):
+    if cache is not None:
+        return cache
+    from audio_cache import get_render_cache
+    return get_render_cache()
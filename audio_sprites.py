@@ -0,0 +1,203 @@
+"""音色拼接包（audio sprite）与客户端合成模式
+
+服务端合成模式（默认）下，每道音程 / 和弦 / 音阶题都要在服务端混音、编码 MP3，
+并在 static/audio 下为每种组合缓存一个文件。客户端合成模式（AUDIO_SYNTHESIS=client）
+改为把一个乐器的全部音符预先拼成一个文件：
+
+    static/audio/sprites/<乐器>.mp3    每个音符截取 SPRITE_NOTE_MS，音符之间留 SPRITE_GAP_MS 静音
+    static/audio/sprites/<乐器>.json   每个音符在文件中的起点、时长和 1 秒片段的归一化增益
+
+出题接口不再返回混好的音频文件，而是返回音符事件（synth 字段，[音符, 起点 ms, 时长 ms]），
+前端（practice.js 的 spritePlayer）用 Web Audio 解码拼接包一次，按事件调度、混音。
+拼接包由渲染清单管理（输入哈希包含全部音源文件内容），build_sprites.py 生成时也会编码
+AUDIO_PROFILES 启用的档位（见 audio_profiles.py），地址带版本号长期缓存。
+
+部署时由 prerender_audio.py（或单独的 build_sprites.py）预先生成；否则第一次以客户端合成模式出题时生成。
+服务端合成模式下渲染等锁超时（RenderTimeout）时，只有拼接包已是最新（ready）才改用客户端合成，
+请求中不会为此生成拼接包或等待其他 worker 生成。
+
+配置（环境变量）：
+    AUDIO_SYNTHESIS   server（默认）/ client；出题请求也可用 ?synthesis= 单独指定
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+import audio_engine
+import audio_profiles
+from audio_cache import get_render_cache, render_key
+from sample_bank import get_sample_bank
+
+SPRITES_DIR = 'sprites'
+SYNTHESIS_MODES = ('server', 'client')
+# 每个音符截取的时长：根音参考音频最长用到 4 秒
+SPRITE_NOTE_MS = 4000
+# 音符之间的静音：吸收不同解码器对编码延迟的处理差异，避免相邻音符串音
+SPRITE_GAP_MS = 100
+# 音程归一化的片段时长和目标峰值（与 generate_interval_mp3 / audio_engine.normalize 一致）
+NORMALIZE_SLICE_MS = 1000
+NORMALIZE_HEADROOM_DB = 0.1
+# 其他 worker 正在生成拼接包时的最长等待（秒）：拼接包没有原始音源可以回退，比普通渲染等得久
+SPRITE_LOCK_TIMEOUT = 120
+
+
+def synthesis_mode(args=None):
+    """出题使用的合成模式：请求参数 synthesis 优先，其次 AUDIO_SYNTHESIS"""
+    mode = (args or {}).get('synthesis') or os.environ.get('AUDIO_SYNTHESIS', 'server')
+    return mode if mode in SYNTHESIS_MODES else 'server'
+
+
+def audio_path(instrument):
+    return f'{SPRITES_DIR}/{instrument}.mp3'
+
+
+def manifest_path(instrument):
+    return f'{SPRITES_DIR}/{instrument}.json'
+
+
+# ---------- 音符事件（与服务端生成函数的拼接 / 混音方式对应） ----------
+
+def interval_spec(note1, note2, normalize=True, note_ms=1000):
+    """音程：两个音符各 note_ms 依次播放（generate_interval_mp3）"""
+    return {'events': [[note1, 0, note_ms], [note2, note_ms, note_ms]], 'normalize': normalize}
+
+
+def chord_spec(notes, duration_ms=2000):
+    """和弦：所有音符同时播放（generate_chord_audio）"""
+    return {'events': [[note, 0, duration_ms] for note in notes], 'normalize': False}
+
+
+def scale_spec(notes, note_ms=500):
+    """完整音阶：每个音符 note_ms 依次播放（generate_scale_audio_from_mp3）"""
+    return {'events': [[note, i * note_ms, note_ms] for i, note in enumerate(notes)], 'normalize': False}
+
+
+def root_spec(note, duration_ms=4000):
+    """根音参考：单个音符 duration_ms（generate_root_audio_4sec）"""
+    return {'events': [[note, 0, duration_ms]], 'normalize': False}
+
+
+# ---------- 拼接包 ----------
+
+class SpriteBuilder:
+    """按乐器生成并缓存拼接包（每个进程一份清单，生成过程加锁）"""
+
+    def __init__(self, cache=None):
+        self._cache = cache
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return self._cache or get_render_cache()
+
+    def key(self, instrument, notes):
+        return render_key('sprite', notes, instrument, note_ms=SPRITE_NOTE_MS, gap_ms=SPRITE_GAP_MS)
+
+    def get(self, instrument, notes, force=False):
+        """拼接包的清单（dict）；不存在或音源变化时先生成"""
+        bank = get_sample_bank(instrument)
+        notes = [note for note in notes if bank.has(note)]
+        key = self.key(instrument, notes)
+        cached = self._manifests.get(instrument)
+        if not force and cached is not None and cached['key'] == key and self._is_current(instrument, key):
+            return cached
+        with self._lock:
+            if not force and self._is_current(instrument, key):
+                manifest = self._read(instrument, key)
+                if manifest is not None:
+                    self._manifests[instrument] = manifest
+                    return manifest
+            manifest = self._build(instrument, notes, key, force)
+            self._manifests[instrument] = manifest
+            return manifest
+
+    def ready(self, instrument, notes):
+        """拼接包已是最新时返回清单，否则返回 None；不生成、不等锁（请求路径上的回退判断用）"""
+        bank = get_sample_bank(instrument)
+        key = self.key(instrument, [note for note in notes if bank.has(note)])
+        if not self._is_current(instrument, key):
+            return None
+        cached = self._manifests.get(instrument)
+        if cached is not None and cached['key'] == key:
+            return cached
+        manifest = self._read(instrument, key)
+        if manifest is not None:
+            self._manifests[instrument] = manifest
+        return manifest
+
+    def _is_current(self, instrument, key):
+        return (audio_profiles.lookup(self.cache, audio_path(instrument), key) is not None
+                and self.cache.lookup(manifest_path(instrument), key) is not None)
+
+    def _read(self, instrument, key):
+        try:
+            with open(os.path.join(self.cache.audio_root, manifest_path(instrument)), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get('key') == key else None
+
+    def _build(self, instrument, notes, key, force=False):
+        bank = get_sample_bank(instrument)
+        parts = []
+        entries = {}
+        position = 0  # 帧
+        frame_rate = None
+        target_peak = 32768 * (10 ** (-NORMALIZE_HEADROOM_DB / 20))
+        for note in notes:
+            sample = bank.get(note)
+            if sample is None:
+                continue
+            frame_rate = frame_rate or sample.frame_rate
+            if sample.frame_rate != frame_rate:
+                raise ValueError(f'{instrument}/{note} 的采样率 {sample.frame_rate} 与其他音源 {frame_rate} 不一致')
+            pcm = audio_engine.slice_ms(sample.pcm, frame_rate, 0, SPRITE_NOTE_MS)
+            gap = np.zeros((audio_engine.ms_to_frames(SPRITE_GAP_MS, frame_rate), pcm.shape[1]), dtype=pcm.dtype)
+            head = audio_engine.slice_ms(pcm, frame_rate, 0, NORMALIZE_SLICE_MS)
+            peak = int(np.abs(head.astype(np.int32)).max()) if head.size else 0
+            entries[note] = {
+                'start_ms': round(position * 1000 / frame_rate, 3),
+                'duration_ms': audio_engine.duration_ms(pcm, frame_rate),
+                'norm_gain': round(target_peak / peak, 4) if peak else 1.0,
+            }
+            parts.extend([pcm, gap])
+            position += len(pcm) + len(gap)
+        if not parts:
+            raise ValueError(f'{instrument} 没有可用的音源')
+        sprite = audio_engine.concat(parts)
+
+        audio_profiles.publish(self.cache, audio_path(instrument), key, sprite, frame_rate,
+                               force=force, timeout=SPRITE_LOCK_TIMEOUT)
+        manifest = {
+            'key': key,
+            'instrument': instrument,
+            'frame_rate': frame_rate,
+            'note_ms': SPRITE_NOTE_MS,
+            'gap_ms': SPRITE_GAP_MS,
+            'notes': entries,
+        }
+
+        def write(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, sort_keys=True)
+
+        self.cache.publish(manifest_path(instrument), key, write, force=force, timeout=SPRITE_LOCK_TIMEOUT)
+        return manifest
+
+
+_builder = None
+_builder_lock = threading.Lock()
+
+
+def get_sprite_builder():
+    """进程内共享的 SpriteBuilder"""
+    global _builder
+    if _builder is None:
+        with _builder_lock:
+            if _builder is None:
+                _builder = SpriteBuilder()
+    return _builder
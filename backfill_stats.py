@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""从练习记录重建统计汇总表（UserExerciseStats / UserSubItemStats / UserDailyStats）
+
+首次部署汇总表、或用脚本直接写入过数据库（如 generate_test_data_sql.py）后运行。
+
+用法:
+    python backfill_stats.py              # 重建全部用户
+    python backfill_stats.py --user re    # 只重建指定用户（用户名或邮箱）
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from models import User
+import stats_rollup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='重建统计汇总表')
+    parser.add_argument('--user', help='只重建指定用户（用户名或邮箱）')
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        db.create_all()
+        user_id = None
+        if args.user:
+            user = User.query.filter((User.username == args.user) | (User.email == args.user)).first()
+            if not user:
+                print(f"❌ 未找到用户 '{args.user}'")
+                return 1
+            user_id = user.id
+            print(f"找到用户: {user.username} (ID: {user.id})")
+
+        start = time.perf_counter()
+        rows = stats_rollup.backfill(user_id)
+        print(f"✅ 汇总表重建完成: {rows} 行，耗时 {time.perf_counter() - start:.2f} 秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
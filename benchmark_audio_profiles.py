@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""各编码档位的每题音频字节数与解码时间（见 audio_profiles.py）
+
+按生成函数的做法（音程：两个音符各 1 秒并归一化；和弦：三和弦 2 秒；
+音阶：8 个音符各 0.5 秒）随机拼出若干道题的 PCM，用每个档位编码到临时目录，
+统计每题的文件大小、编码耗时和解码耗时（ffmpeg 解码成 PCM 的耗时，近似客户端的解码开销）。
+
+用法:
+    python benchmark_audio_profiles.py
+    python benchmark_audio_profiles.py --questions 50 --profiles mp3,opus
+"""
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+import audio_engine
+import audio_profiles
+from sample_bank import get_sample_bank
+
+KINDS = ('interval', 'chord', 'scale')
+# 和弦：大三和弦的半音间隔；音阶：大调音阶
+CHORD_SEMITONES = (0, 4, 7)
+SCALE_SEMITONES = (0, 2, 4, 5, 7, 9, 11, 12)
+
+
+def build_questions(kind, count, rng):
+    """随机生成 count 道题的 (PCM, 采样率)"""
+    bank = get_sample_bank('piano')
+    chromatic = _chromatic_order(bank.available_notes())
+    questions = []
+    while len(questions) < count:
+        start = rng.randrange(0, len(chromatic) - 12)
+        if kind == 'interval':
+            pair = [chromatic[start], chromatic[start + rng.randint(1, 12)]]
+            samples = [bank.get(note) for note in pair]
+            parts = [audio_engine.normalize(audio_engine.slice_ms(s.pcm, s.frame_rate, 0, 1000)) for s in samples]
+            pcm = audio_engine.normalize(audio_engine.concat(parts))
+        elif kind == 'chord':
+            samples = [bank.get(chromatic[start + step]) for step in CHORD_SEMITONES]
+            pcm = audio_engine.mix([audio_engine.slice_ms(s.pcm, s.frame_rate, 0, 2000) for s in samples])
+        else:
+            samples = [bank.get(chromatic[start + step]) for step in SCALE_SEMITONES]
+            pcm = audio_engine.concat([audio_engine.slice_ms(s.pcm, s.frame_rate, 0, 500) for s in samples])
+        questions.append((pcm, samples[0].frame_rate))
+    return questions
+
+
+def _chromatic_order(notes):
+    """音源格式的音符（如 Cs4）按音高排序"""
+    names = ['C', 'Cs', 'D', 'Ds', 'E', 'F', 'Fs', 'G', 'Gs', 'A', 'As', 'B']
+
+    def pitch(note):
+        name, octave = note.rstrip('0123456789'), note[len(note.rstrip('0123456789')):]
+        return int(octave) * 12 + names.index(name) if name in names and octave else None
+
+    return sorted((note for note in notes if pitch(note) is not None), key=pitch)
+
+
+def measure(questions, profile, tmp_dir):
+    """返回 (平均字节数, 编码耗时中位数 ms, 解码耗时中位数 ms)"""
+    from pydub import AudioSegment
+
+    decode_command = [AudioSegment.converter, '-v', 'error', '-i', None, '-f', 's16le', '-']
+    sizes, encode_ms, decode_ms = [], [], []
+    for i, (pcm, frame_rate) in enumerate(questions):
+        path = os.path.join(tmp_dir, f'{profile.name}_{i}{profile.ext}')
+        start = time.perf_counter()
+        audio_profiles.export(pcm, frame_rate, path, profile)
+        encode_ms.append((time.perf_counter() - start) * 1000)
+        sizes.append(os.path.getsize(path))
+        start = time.perf_counter()
+        decode_command[4] = path
+        subprocess.run(decode_command, stdout=subprocess.DEVNULL, check=True)
+        decode_ms.append((time.perf_counter() - start) * 1000)
+        os.remove(path)
+    return statistics.mean(sizes), statistics.median(encode_ms), statistics.median(decode_ms)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='各编码档位的每题音频字节数与解码时间')
+    parser.add_argument('--questions', type=int, default=20, help='每种题型的题数')
+    parser.add_argument('--profiles', default=','.join(audio_profiles.PROFILES), help='逗号分隔的档位')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.profiles.split(',') if name.strip()]
+    unknown = [name for name in names if name not in audio_profiles.PROFILES]
+    if unknown:
+        print(f"❌ 未知的档位: {', '.join(unknown)}")
+        return 1
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory(prefix='opear_profiles_') as tmp_dir:
+        for kind in KINDS:
+            questions = build_questions(kind, args.questions, rng)
+            print(f"\n📊 {kind}（{len(questions)} 题）")
+            print(f"   {'档位':<10} {'每题字节':>10} {'相对 mp3':>9} {'编码 ms':>9} {'解码 ms':>9}")
+            baseline = None
+            for name in names:
+                size, enc, dec = measure(questions, audio_profiles.PROFILES[name], tmp_dir)
+                baseline = baseline or (size if name == audio_profiles.ORIGINAL else None)
+                ratio = f'{size / baseline * 100:8.0f}%' if baseline else f"{'-':>9}"
+                print(f"   {name:<10} {size / 1024:>8.1f}KB {ratio} {enc:>9.1f} {dec:>9.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
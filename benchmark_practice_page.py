@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""练习页面的传输字节数和服务端渲染时间
+
+对每种练习类型请求 /practice/<练习类型>，统计 HTML 大小和平均渲染时间；
+再按页面中的版本号请求参考歌曲接口，统计首次访问和再次访问（带 If-None-Match）
+传输的字节数。页面中嵌入了歌曲数据的旧版本没有歌曲接口，只统计 HTML。
+
+用法:
+    python benchmark_practice_page.py
+    python benchmark_practice_page.py --songs-dir /path/to/data/songs --runs 200
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+SONGS_URL = re.compile(r"const songsDataUrl = '([^']+)'")
+
+
+def measure(client, exercise_type, runs):
+    timings = []
+    html = b''
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = client.get(f'/practice/{exercise_type}')
+        timings.append((time.perf_counter() - start) * 1000)
+        html = response.data
+    result = {
+        'html_bytes': len(html),
+        'render_ms': statistics.mean(timings),
+        'songs_bytes': 0,
+        'songs_revalidate_bytes': 0,
+        'songs_cache_control': '',
+    }
+    match = SONGS_URL.search(html.decode('utf-8'))
+    if match:
+        url = match.group(1).replace('&amp;', '&')
+        first = client.get(url)
+        again = client.get(url, headers={'If-None-Match': first.headers.get('ETag', '')})
+        result['songs_bytes'] = len(first.data)
+        result['songs_revalidate_bytes'] = len(again.data)
+        result['songs_revalidate_status'] = again.status_code
+        result['songs_cache_control'] = first.headers.get('Cache-Control', '')
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='练习页面的传输字节数和服务端渲染时间')
+    parser.add_argument('--runs', type=int, default=100, help='每种练习类型请求的次数')
+    parser.add_argument('--songs-dir', help='参考歌曲目录（默认使用应用配置的目录）')
+    args = parser.parse_args(argv)
+
+    import app as app_module
+    if args.songs_dir:
+        app_module.SONGS_DIRS[:] = [os.path.abspath(args.songs_dir)]
+    client = app_module.app.test_client()
+
+    print(f"🚀 每种练习类型请求 {args.runs} 次")
+    for exercise_type in app_module.EXERCISE_TYPES:
+        r = measure(client, exercise_type, args.runs)
+        line = f"📊 {exercise_type:<16} HTML {r['html_bytes']:>8} 字节，渲染 {r['render_ms']:.2f} ms"
+        if r['songs_cache_control']:
+            line += (f"；歌曲接口首次 {r['songs_bytes']} 字节，"
+                     f"再次 {r['songs_revalidate_bytes']} 字节（{r['songs_revalidate_status']}），"
+                     f"Cache-Control: {r['songs_cache_control']}")
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""已登录请求的 SQL 条数基准（启动阶段与登录用户缓存，见 app.initialize_app 和 identity_cache.py）
+
+在临时 SQLite 数据库中创建一个用户并登录，对几个常用接口各请求 --runs 次，
+分别统计关闭（IDENTITY_CACHE_TTL=0 的行为）和开启登录用户缓存时每次请求的 SQL 条数，
+以及其中查询 user 表的条数。检查：
+
+- 开启缓存后，已登录请求不再查询 user 表
+- 第一个请求不再执行建表 / 迁移（没有 CREATE / PRAGMA table_info 等结构查询）
+- 修改密码（User 行更新）和登出后缓存失效
+
+任一检查不通过时以非零状态码退出。
+
+用法:
+    python benchmark_request_queries.py
+    python benchmark_request_queries.py --runs 50
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+_USER_TABLE = re.compile(r'\bFROM user\b', re.IGNORECASE)
+_SCHEMA = re.compile(r'^\s*(CREATE|ALTER|PRAGMA\s+(main\.)?(table_info|index_list|table_xinfo))', re.IGNORECASE)
+
+
+def requests_for(session_id):
+    """(名称, 方法, 路径, JSON)；submit_answer 与练习页提交答案时的请求相同"""
+    answer = {
+        'answer': 'Major 3rd', 'correct_value': 'Major 3rd', 'session_id': session_id,
+        'question_data': {'type': 'interval', 'notes': ['C4', 'E4']}, 'response_time': 1.2, 'sub_item': 'Major 3rd',
+    }
+    return [
+        ('submit_answer', 'post', '/api/submit_answer', answer),
+        ('statistics', 'get', '/api/statistics', None),
+        ('index', 'get', '/', None),
+        ('statistics_page', 'get', '/statistics', None),
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='已登录请求的 SQL 条数基准')
+    parser.add_argument('--runs', type=int, default=20, help='每个接口的请求次数')
+    args = parser.parse_args(argv)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='opear_bench_'), 'bench.db')
+    # 必须在导入 app 之前设置，Flask-SQLAlchemy 在 init_app 时创建引擎；答案同步写入，便于计数
+    os.environ['OPEAR_DATABASE_URI'] = 'sqlite:///' + db_path
+    os.environ['ANSWER_WRITE_BEHIND'] = '0'
+
+    from sqlalchemy import event
+    from app import app, db, initialize_app
+    from identity_cache import get_identity_cache
+    from models import User
+
+    # 与 gunicorn worker 启动时相同（gunicorn_config.py 的 post_fork）
+    initialize_app()
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    statements = []
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def record_statement(conn, cursor, statement, *_):
+            statements.append(statement)
+
+    print(f"🗄️  数据库: {db_path}")
+    failures = []
+    client = app.test_client()
+    statements.clear()
+    response = client.post('/login', data={'identifier': 'bench', 'password': 'bench'})
+    schema = [s for s in statements if _SCHEMA.match(s)]
+    if schema:
+        failures.append(f'第一个请求执行了 {len(schema)} 条结构查询（建表 / 迁移应在启动阶段完成）')
+    response = client.post('/api/start_session', json={'exercise_type': 'interval'})
+    session_id = response.get_json()['session_id']
+
+    cache = get_identity_cache()
+    ttl = cache.ttl
+    results = {}
+    for label, cache_ttl in (('关闭缓存', 0), ('开启缓存', ttl or 60)):
+        cache.ttl = cache_ttl
+        cache.clear()
+        for name, method, path, payload in requests_for(session_id):
+            # 预热（语句编译缓存、知识库缓存、第一次加载用户）
+            getattr(client, method)(path, json=payload)
+            counts, user_counts = [], []
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                statements.clear()
+                response = getattr(client, method)(path, json=payload)
+                if response.status_code != 200:
+                    failures.append(f'{name} 返回 {response.status_code}')
+                    break
+                counts.append(len(statements))
+                user_counts.append(sum(1 for s in statements if _USER_TABLE.search(s)))
+            elapsed = (time.perf_counter() - start) * 1000 / max(len(counts), 1)
+            results[(label, name)] = (max(counts or [0]), max(user_counts or [0]), elapsed)
+
+    print(f"{'接口':<16}{'关闭缓存 SQL/次':>16}{'其中 user':>12}{'开启缓存 SQL/次':>16}{'其中 user':>12}{'ms/次':>10}")
+    for name, *_ in requests_for(session_id):
+        off, on = results[('关闭缓存', name)], results[('开启缓存', name)]
+        print(f"{name:<16}{off[0]:>16}{off[1]:>12}{on[0]:>16}{on[1]:>12}{on[2]:>10.1f}")
+        if on[1]:
+            failures.append(f'{name}: 开启缓存后每次请求仍查询 user 表 {on[1]} 次')
+
+    # 修改密码后缓存失效：下一个请求重新查询 user 表
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        user.set_password('bench2')
+        db.session.commit()
+    statements.clear()
+    client.get('/api/statistics')
+    if not any(_USER_TABLE.search(s) for s in statements):
+        failures.append('修改密码后没有重新加载用户')
+    client.get('/logout')
+    if user_id in cache:
+        failures.append('登出后缓存中仍有该用户')
+    cache.ttl = ttl
+
+    print(f"🔍 缓存命中 {cache.hits} 次，未命中 {cache.misses} 次")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ 已登录请求不再查询 user 表，启动阶段之后的请求没有结构查询")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""参考歌曲的首个可播放音频时间（time-to-first-audio）
+
+在本机启动应用的测试服务器，对同一首歌比较三种加载方式从片段起点开始播放
+需要传输的字节数和耗时：
+
+- full       下载整首歌（不支持 Range 时的行为）
+- range      Range 请求片段起点之后的前几秒（浏览器对支持 Range 的服务器的行为）
+- segmented  取分段索引 + 包含起点的那一段（SONG_SEGMENTS=1，见 song_segments.py）
+
+本机回环几乎没有带宽限制，另按 --mbps 估算真实网络下的耗时（实测耗时 + 字节数 / 带宽）。
+
+用法:
+    python benchmark_song_start.py --song songs/xxx.mp3 --start 45
+    python benchmark_song_start.py --make-test-song 180   # 生成临时测试歌曲（结束后删除）
+"""
+
+import argparse
+import http.client
+import os
+import shutil
+import statistics
+import sys
+import threading
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+# Range 模式下开始播放前需要缓冲的时长（秒）
+RANGE_BUFFER_SECONDS = 2
+TEST_SONG = 'songs/benchmark_test_song.mp3'
+
+
+def make_test_song(seconds):
+    """用钢琴音源拼出一首测试歌曲（static/audio 下的相对路径）"""
+    from pydub import AudioSegment
+    import audio_engine
+    from sample_bank import get_sample_bank
+
+    bank = get_sample_bank('piano')
+    notes = ['C4', 'E4', 'G4', 'C5', 'G4', 'E4']
+    segment = AudioSegment.from_mp3(bank.path(notes[0]))
+    frame_rate = segment.frame_rate
+    parts = []
+    total_ms = 0
+    i = 0
+    while total_ms < seconds * 1000:
+        pcm = audio_engine.from_segment(AudioSegment.from_mp3(bank.path(notes[i % len(notes)])))
+        part = audio_engine.slice_ms(pcm, frame_rate, 0, 500)
+        parts.append(part)
+        total_ms += audio_engine.duration_ms(part, frame_rate)
+        i += 1
+    path = os.path.join(basedir, 'static', 'audio', TEST_SONG)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    audio_engine.export(audio_engine.concat(parts), frame_rate, path, format='mp3', bitrate='192k')
+    return TEST_SONG
+
+
+def fetch(port, path, headers=None):
+    """返回 (状态码, 字节数, 耗时毫秒)"""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    start = time.perf_counter()
+    conn.request('GET', path, headers=headers or {})
+    response = conn.getresponse()
+    body = response.read()
+    elapsed = (time.perf_counter() - start) * 1000
+    conn.close()
+    return response.status, len(body), elapsed
+
+
+def measure(port, song, start_seconds, runs):
+    import song_segments
+
+    size = os.path.getsize(os.path.join(song_segments.AUDIO_ROOT, song))
+    index = song_segments.read_index(song)
+    duration_s = index['duration_ms'] / 1000 if index else None
+    results = {}
+
+    def run(name, requests):
+        timings = []
+        total_bytes = 0
+        for _ in range(runs):
+            total_bytes = 0
+            elapsed = 0
+            for path, headers, expected in requests:
+                status, nbytes, ms = fetch(port, path, headers)
+                if status != expected:
+                    raise RuntimeError(f'{name}: {path} 返回 {status}，预期 {expected}')
+                total_bytes += nbytes
+                elapsed += ms
+            timings.append(elapsed)
+        results[name] = (total_bytes, statistics.median(timings))
+
+    run('full', [(f'/static/audio/{song}', {}, 200)])
+    if duration_s:
+        # 固定码率 MP3：按时间比例估算字节偏移
+        bytes_per_second = size / duration_s
+        offset = int(start_seconds * bytes_per_second)
+        end = min(size - 1, offset + int(RANGE_BUFFER_SECONDS * bytes_per_second))
+        run('range', [(f'/static/audio/{song}', {'Range': f'bytes={offset}-{end}'}, 206)])
+        number = song_segments.segment_for(index, start_seconds * 1000)
+        index_url = '/' + os.path.relpath(song_segments.index_path(song), basedir).replace(os.sep, '/')
+        run('segmented', [(index_url, {}, 200),
+                          (f"/static/audio/{index['segments'][number]['file']}", {}, 200)])
+    return size, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='参考歌曲的首个可播放音频时间')
+    parser.add_argument('--song', help='static/audio 下的歌曲路径，如 songs/xxx.mp3')
+    parser.add_argument('--make-test-song', type=int, metavar='SECONDS',
+                        help='生成指定时长的临时测试歌曲（结束后删除）')
+    parser.add_argument('--start', type=float, default=45, help='片段起点（秒）')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--mbps', type=float, default=10, help='估算用的下行带宽（Mbit/s）')
+    args = parser.parse_args(argv)
+    if not args.song and not args.make_test_song:
+        parser.error('需要 --song 或 --make-test-song')
+
+    import song_segments
+    from werkzeug.serving import make_server
+    from app import app
+
+    created = []
+    song = args.song
+    if args.make_test_song:
+        # 删除时按相反顺序：先删文件，再删本次新建的（已为空的）目录
+        for directory in (song_segments.SONGS_DIR, song_segments.SEGMENTS_DIR):
+            if not os.path.isdir(os.path.join(song_segments.AUDIO_ROOT, directory)):
+                created.append(os.path.join(song_segments.AUDIO_ROOT, directory))
+        song = make_test_song(args.make_test_song)
+        created.append(os.path.dirname(song_segments.index_path(song)))
+        created.append(os.path.join(song_segments.AUDIO_ROOT, song))
+    try:
+        song_segments.build_segments(song)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            size, results = measure(server.server_port, song, args.start, args.runs)
+        finally:
+            server.shutdown()
+    finally:
+        for path in reversed(created):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    print(f"🎵 {song}: {size / 1024 / 1024:.1f} MB，从第 {args.start:g} 秒开始播放")
+    for name, (nbytes, ms) in results.items():
+        modeled = ms + nbytes * 8 / (args.mbps * 1e6) * 1000
+        print(f"📊 {name:<10} 传输 {nbytes / 1024:>9.1f} KB，本机 {ms:>7.1f} ms，"
+              f"{args.mbps:g} Mbit/s 下约 {modeled:>7.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""/api/statistics 性能基准
+
+在临时 SQLite 数据库中用 generate_test_data_sql.py 为一个用户生成大量答题记录
+（默认 10 万条）并重建统计汇总表，然后多次请求 /api/statistics，
+统计延迟与每次请求的 SQL 条数，中位数超过延迟预算时以非零状态码退出。
+
+用法:
+    python benchmark_statistics.py
+    python benchmark_statistics.py --answers 200000 --budget-ms 300 --runs 20
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+
+def seed(db_path, user_id, answers):
+    """用 generate_test_data_sql 生成数据，直到答题记录数达到 answers"""
+    import generate_test_data_sql
+
+    def count_answers():
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM user_answer WHERE user_id = ?", (user_id,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    total = count_answers()
+    while total < answers:
+        # 每天 3-7 个会话、每个会话约 10 题，一年约 1.8 万条答题记录
+        generate_test_data_sql.generate_test_data(user_id, days_back=365, sessions_per_day_range=(3, 7),
+                                                  db_path=db_path)
+        total = count_answers()
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='/api/statistics 性能基准')
+    parser.add_argument('--answers', type=int, default=100000, help='生成的答题记录数')
+    parser.add_argument('--runs', type=int, default=10, help='计时的请求次数')
+    parser.add_argument('--budget-ms', type=float, default=500.0, help='延迟预算（中位数，毫秒）')
+    parser.add_argument('--db', help='使用指定的数据库文件（默认临时文件，已有数据时不再生成）')
+    args = parser.parse_args(argv)
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='opear_bench_'), 'bench.db')
+    # 必须在导入 app 之前设置，Flask-SQLAlchemy 在 init_app 时创建引擎
+    os.environ['OPEAR_DATABASE_URI'] = 'sqlite:///' + db_path
+
+    from sqlalchemy import event
+    from app import app, db
+    from models import User
+    import stats_rollup
+
+    with app.app_context():
+        db.create_all()
+        user = User.query.filter_by(username='bench').first()
+        if user is None:
+            user = User(username='bench', email='bench@example.com')
+            user.set_password('bench')
+            db.session.add(user)
+            db.session.commit()
+        user_id = user.id
+
+    print(f"🗄️  数据库: {db_path}")
+    start = time.perf_counter()
+    total = seed(db_path, user_id, args.answers)
+    print(f"📊 答题记录: {total} 条（准备耗时 {time.perf_counter() - start:.1f} 秒）")
+
+    # 生成脚本直接写库，需要重建统计汇总表
+    start = time.perf_counter()
+    with app.app_context():
+        stats_rollup.backfill(user_id)
+    print(f"🔄 汇总表重建耗时 {time.perf_counter() - start:.2f} 秒")
+
+    query_count = [0]
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_queries(*_):
+            query_count[0] += 1
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+
+    # 预热（建表检查、连接池、语句编译缓存）
+    response = client.get('/api/statistics')
+    if response.status_code != 200 or response.get_json().get('status') != 'ok':
+        print(f"❌ 请求失败: {response.status_code} {response.get_data(as_text=True)[:200]}")
+        return 1
+
+    timings = []
+    queries = []
+    for _ in range(args.runs):
+        query_count[0] = 0
+        start = time.perf_counter()
+        client.get('/api/statistics')
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(query_count[0])
+
+    median = statistics.median(timings)
+    print(f"⏱️  {args.runs} 次请求: 中位数 {median:.1f} ms，最快 {min(timings):.1f} ms，最慢 {max(timings):.1f} ms")
+    print(f"🔍 每次请求 SQL 条数: {max(queries)}")
+    if median > args.budget_ms:
+        print(f"❌ 超出延迟预算 {args.budget_ms:.0f} ms")
+        return 1
+    print(f"✅ 在延迟预算 {args.budget_ms:.0f} ms 以内")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
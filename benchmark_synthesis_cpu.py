@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""服务端合成与客户端合成（见 audio_sprites.py）每道题的服务端 CPU 对比
+
+对音程、和弦、音阶三种练习各出 --questions 道题（同一随机种子，题目相同），统计：
+
+- server 冷缓存  渲染清单指向临时目录，每种组合第一次出现都要混音并编码
+- server 热缓存  同一批题目再出一次，全部命中缓存
+- client        只生成音符事件（拼接包已预先生成，生成耗时单独列出）
+
+CPU 时间包括本进程和 ffmpeg 子进程（编码 MP3）；音源在计时前预先解码。
+同时列出服务端缓存写入的字节数。
+
+用法:
+    python benchmark_synthesis_cpu.py
+    python benchmark_synthesis_cpu.py --questions 50
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+EXERCISES = ('interval', 'chord_quality', 'scale_degree')
+
+
+def cpu_seconds():
+    """本进程与已结束子进程的 CPU 时间之和"""
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def question_args(exercise_type, rng):
+    """每道题的出题参数（音阶和和弦随机换调，覆盖不同组合）"""
+    from app import KEYS, SCALES, CHORD_TYPES
+
+    if exercise_type == 'scale_degree':
+        return {'key': rng.choice(KEYS), 'scale_type': rng.choice(list(SCALES)), 'octave': rng.choice(['3', '4', '5'])}
+    if exercise_type == 'chord_quality':
+        return {'roots': ','.join(KEYS), 'chord_types': ','.join(CHORD_TYPES)}
+    return {}
+
+
+def run(exercise_type, mode, count, seed):
+    """返回 (每题 CPU ms, 每题耗时 ms)"""
+    from app import app, build_question, _version_question_audio
+
+    rng = random.Random(seed)
+    random.seed(seed)
+    cpu_start = cpu_seconds()
+    wall_start = time.perf_counter()
+    with app.test_request_context(), contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(count):
+            args = dict(question_args(exercise_type, rng), synthesis=mode)
+            result = build_question(exercise_type, args)
+            question = result[0] if isinstance(result, tuple) else result
+            if question.get('status') != 'ok':
+                raise RuntimeError(f"{exercise_type}/{mode}: {question.get('msg')}")
+            _version_question_audio(question)
+    cpu_ms = (cpu_seconds() - cpu_start) * 1000 / count
+    wall_ms = (time.perf_counter() - wall_start) * 1000 / count
+    return cpu_ms, wall_ms
+
+
+def dir_bytes(path):
+    total = 0
+    for dirpath, _, names in os.walk(path):
+        for name in names:
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='服务端合成与客户端合成每道题的服务端 CPU 对比')
+    parser.add_argument('--questions', type=int, default=20, help='每种练习的题数')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    import audio_cache
+    import audio_sprites
+    from app import SPRITE_INSTRUMENT, SPRITE_NOTES
+    from sample_bank import get_sample_bank
+
+    tmp_dir = tempfile.mkdtemp(prefix='opear_synth_')
+    # 所有生成音频写到临时目录，不影响 static/audio 和正式清单
+    audio_cache._cache = audio_cache.RenderCache(audio_root=tmp_dir,
+                                                 manifest_path=os.path.join(tmp_dir, '.render_manifest.json'))
+    try:
+        start = time.perf_counter()
+        get_sample_bank(SPRITE_INSTRUMENT).warm(SPRITE_NOTES)
+        print(f"🎹 预先解码音源: {time.perf_counter() - start:.1f} 秒")
+
+        cpu_start = cpu_seconds()
+        audio_sprites.get_sprite_builder().get(SPRITE_INSTRUMENT, SPRITE_NOTES)
+        sprite_cpu = cpu_seconds() - cpu_start
+        sprite_bytes = dir_bytes(os.path.join(tmp_dir, audio_sprites.SPRITES_DIR))
+        print(f"🧩 生成拼接包（一次性）: CPU {sprite_cpu:.1f} 秒，{sprite_bytes / 1024:.0f} KB")
+
+        print(f"\n{'练习':<14} {'模式':<12} {'CPU ms/题':>10} {'耗时 ms/题':>11}")
+        cache_bytes_before = dir_bytes(tmp_dir)
+        for exercise_type in EXERCISES:
+            for label, mode in (('server 冷缓存', 'server'), ('server 热缓存', 'server'), ('client', 'client')):
+                cpu_ms, wall_ms = run(exercise_type, mode, args.questions, args.seed)
+                print(f"{exercise_type:<14} {label:<12} {cpu_ms:>10.1f} {wall_ms:>11.1f}")
+        cache_bytes = dir_bytes(tmp_dir) - cache_bytes_before
+        print(f"\n💾 服务端合成写入缓存: {cache_bytes / 1024:.0f} KB（{len(EXERCISES)} × {args.questions} 题）；"
+              f"客户端合成: 0 KB")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
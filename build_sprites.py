@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""生成客户端合成模式使用的音色拼接包（见 audio_sprites.py）
+
+prerender_audio.py 已包含这一步；只需要拼接包时可单独运行。音源未变化时直接跳过。
+不预先生成时，第一次以客户端合成模式出题会在请求中生成。
+
+用法:
+    python build_sprites.py
+    python build_sprites.py --force
+"""
+
+import argparse
+import os
+import sys
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成客户端合成模式使用的音色拼接包')
+    parser.add_argument('--force', action='store_true', help='忽略清单，重新生成')
+    args = parser.parse_args(argv)
+
+    # 离线生成时一并编码 AUDIO_PROFILES 启用的档位（见 audio_profiles.py）
+    os.environ['AUDIO_ENCODE_ON_RENDER'] = '1'
+    import audio_profiles
+    import audio_sprites
+    from app import SPRITE_INSTRUMENT, SPRITE_NOTES
+    from audio_cache import get_render_cache
+
+    start = time.perf_counter()
+    manifest = audio_sprites.get_sprite_builder().get(SPRITE_INSTRUMENT, SPRITE_NOTES, force=args.force)
+    elapsed = time.perf_counter() - start
+
+    cache = get_render_cache()
+    rel_path = audio_sprites.audio_path(SPRITE_INSTRUMENT)
+    print(f"✅ {SPRITE_INSTRUMENT}: {len(manifest['notes'])} 个音符，耗时 {elapsed:.1f} 秒")
+    for profile in [audio_profiles.PROFILES[audio_profiles.ORIGINAL]] + audio_profiles.extra_profiles():
+        entry = cache.entry(audio_profiles.variant_path(rel_path, profile))
+        if entry is not None:
+            print(f"   {profile.name:<10} {entry['size'] / 1024:8.1f} KB  {audio_profiles.variant_path(rel_path, profile)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""答案异步批量写入的坏数据检查（见 answer_buffer.py）
+
+在临时 SQLite 数据库中用 AnswerBuffer 写入三批答案：
+
+1. 正常答案、无法写入的答案（correct_answer 为空，违反 NOT NULL）、正常答案
+2. 缓冲文件中缺少字段的答案（旧版本或手工改过的文件）
+3. 正常答案
+
+检查：两条正常答案写入、坏答案移到死信文件、后面的批次照常写入、
+批次标记齐全（重放时不会重复写入），以及 make_answer_record 拒绝无效字段。
+任一检查不通过时以非零状态码退出。
+
+用法:
+    python check_answer_buffer.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='opear_answers_')
+    # 必须在导入 app 之前设置，Flask-SQLAlchemy 在 init_app 时创建引擎
+    os.environ['OPEAR_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'answers.db')
+    os.environ['ANSWER_WRITE_BEHIND'] = '0'
+
+    from app import app, db
+    import answer_buffer
+    from models import AnswerSpoolBatch, PracticeSession, Question, User, UserAnswer
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='answers', email='answers@example.com')
+        user.set_password('answers')
+        db.session.add(user)
+        db.session.flush()
+        session = PracticeSession(user_id=user.id, exercise_type='interval')
+        db.session.add(session)
+        db.session.commit()
+        user_id, session_id = user.id, session.id
+
+    def record(correct_value='major_third'):
+        return answer_buffer.make_answer_record(
+            user_id, session_id, {'exercise_type': 'interval', 'notes': ['C4', 'E4']},
+            correct_value, '大三度', 'major_third', True, 1.5)
+
+    failures = []
+    for args in ((None, 1.5, session_id), ('major_third', 'slow', session_id), ('major_third', 1.5, 'abc'),
+                 ('major_third', float('nan'), session_id)):
+        correct_value, response_time, sid = args
+        try:
+            answer_buffer.make_answer_record(user_id, sid, {}, correct_value, '', '', False, response_time)
+        except ValueError:
+            continue
+        failures.append(f'make_answer_record 接受了无效字段 {args!r}')
+
+    spool_dir = os.path.join(workdir, 'spool')
+    os.makedirs(spool_dir)
+    buffer = answer_buffer.AnswerBuffer(app, spool_dir=spool_dir, flush_size=1000, flush_interval=3600)
+    # 绕过 make_answer_record，模拟校验加入之前写进缓冲文件的答案
+    bad = dict(record(), correct_answer=None)
+    truncated = {key: value for key, value in record().items() if key != 'created_at'}
+    batches = [[record(), bad, record()], [truncated], [record()]]
+    for batch in batches:
+        for item in batch:
+            buffer.submit(item)
+        buffer.flush()
+    buffer.shutdown()
+
+    with app.app_context():
+        questions = Question.query.count()
+        answers = UserAnswer.query.count()
+        markers = {marker.id for marker in AnswerSpoolBatch.query}
+    stats = buffer.stats()
+    print(f"📊 {stats}")
+    if questions != 3 or answers != 3:
+        failures.append(f'应写入 3 条答案，实际题目 {questions} 条、答案 {answers} 条')
+    if stats['queued']:
+        failures.append(f'队列中仍有 {stats["queued"]} 条答案（坏答案阻塞了写入）')
+    if stats['dead_letters'] != 2:
+        failures.append(f'应有 2 条死信，实际 {stats["dead_letters"]} 条')
+    batch_markers = {marker for marker in markers if '#' not in marker}
+    if len(batch_markers) != len(batches):
+        failures.append(f'应有 {len(batches)} 个批次标记，实际 {len(batch_markers)} 个')
+
+    dead_letter_path = os.path.join(spool_dir, answer_buffer.DEAD_LETTER_FILE)
+    dead = []
+    if os.path.exists(dead_letter_path):
+        with open(dead_letter_path, encoding='utf-8') as f:
+            dead = [json.loads(line) for line in f]
+    if [entry['record'].get('correct_answer', '') for entry in dead] != [None, 'major_third']:
+        failures.append(f'死信文件内容不对: {dead!r}')
+    leftover = [name for name in os.listdir(spool_dir) if name != answer_buffer.DEAD_LETTER_FILE]
+    if leftover:
+        failures.append(f'缓冲文件没有删除: {leftover}')
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ 坏答案移到死信文件，同批和后面批次的答案照常写入")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""音频发送方式（AUDIO_DELIVERY，见 audio_delivery.py）的集成检查
+
+对每种发送方式：
+- 练习页面中的音频地址前缀正确
+- /audio/<文件> 的响应正确：flask / static 直接返回文件内容（含 Range 206），
+  x-accel / x-sendfile 返回指向同一文件的头且不带文件内容；
+  按 nginx 的 internal location 规则解析 X-Accel-Redirect，得到的文件内容与原文件一致
+- 带版本号的地址长期缓存
+- 越界路径、隐藏文件、不允许的目录和扩展名返回 404
+
+加 --nginx 且本机有 nginx 时，另外启动应用（x-accel）和一个临时 nginx，
+经过 nginx 下载并比对文件内容和 Range 响应。
+
+用法:
+    python check_audio_delivery.py
+    python check_audio_delivery.py --nginx
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from urllib.parse import unquote
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+FORBIDDEN = [
+    '../app.py',
+    'interval/../../app.py',
+    '.render_manifest.json',
+    'interval/.hidden.mp3',
+    'samples/piano/missing.mp3',
+    'samples/piano/../../../models.py',
+    'not_allowed/file.mp3',
+]
+
+
+class Checker:
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, condition, message):
+        print(('✅ ' if condition else '❌ ') + message)
+        if not condition:
+            self.failures += 1
+
+
+def pick_sample(audio_root):
+    """用于检查的音频文件（static/audio 下的相对路径）"""
+    for directory in ('samples', 'interval', 'scale', 'chords'):
+        root = os.path.join(audio_root, directory)
+        for dirpath, _, files in os.walk(root):
+            for name in sorted(files):
+                if name.endswith('.mp3'):
+                    return os.path.relpath(os.path.join(dirpath, name), audio_root).replace(os.sep, '/')
+    return None
+
+
+def check_modes(checker, app, audio_root, filename):
+    import audio_delivery
+    import static_assets
+
+    with open(os.path.join(audio_root, filename), 'rb') as f:
+        content = f.read()
+    client = app.test_client()
+    version = static_assets.audio_version(filename)
+
+    for mode in audio_delivery.MODES:
+        os.environ['AUDIO_DELIVERY'] = mode
+        print(f"\n🔍 AUDIO_DELIVERY={mode}")
+        page = client.get('/practice/interval').data.decode('utf-8')
+        expected_base = audio_delivery.base_url(mode)
+        checker.check(f'window.AUDIO_BASE_URL = "{expected_base}"' in page, f"页面音频前缀为 {expected_base}")
+
+        r = client.get(f'/audio/{filename}')
+        if mode == 'x-accel':
+            accel = r.headers.get('X-Accel-Redirect', '')
+            checker.check(r.status_code == 200 and not r.data, 'X-Accel-Redirect 响应不带文件内容')
+            prefix = audio_delivery.accel_prefix()
+            # 模拟 nginx：internal location 的 alias 指向 static/audio/
+            resolved = os.path.join(audio_root, unquote(accel[len(prefix):])) if accel.startswith(prefix) else None
+            ok = resolved is not None and os.path.isfile(resolved) and open(resolved, 'rb').read() == content
+            checker.check(ok, f'X-Accel-Redirect {accel} 指向同一文件')
+        elif mode == 'x-sendfile':
+            sendfile = r.headers.get('X-Sendfile', '')
+            checker.check(r.status_code == 200 and not r.data, 'X-Sendfile 响应不带文件内容')
+            ok = os.path.isfile(sendfile) and open(sendfile, 'rb').read() == content
+            checker.check(ok, 'X-Sendfile 指向同一文件')
+        else:
+            checker.check(r.status_code == 200 and r.data == content, 'Flask 返回完整文件内容')
+            checker.check(r.headers.get('Accept-Ranges') == 'bytes', 'Accept-Ranges: bytes')
+            r = client.get(f'/audio/{filename}', headers={'Range': 'bytes=100-199'})
+            checker.check(r.status_code == 206 and r.data == content[100:200], 'Range 请求返回 206 和对应字节')
+
+        if version:
+            r = client.get(f'/audio/{filename}?v={version}')
+            checker.check(r.headers.get('Cache-Control') == static_assets.IMMUTABLE_CACHE_CONTROL,
+                          '带版本号的地址长期缓存')
+
+        for path in FORBIDDEN:
+            r = client.get(f'/audio/{path}')
+            checker.check(r.status_code == 404 and 'X-Accel-Redirect' not in r.headers
+                          and 'X-Sendfile' not in r.headers, f'拒绝 {path}')
+    os.environ.pop('AUDIO_DELIVERY', None)
+
+
+NGINX_CONF = """
+daemon off;
+pid {tmp}/nginx.pid;
+error_log {tmp}/error.log;
+events {{ worker_connections 64; }}
+http {{
+    access_log off;
+    client_body_temp_path {tmp}/body;
+    proxy_temp_path {tmp}/proxy;
+    fastcgi_temp_path {tmp}/fastcgi;
+    uwsgi_temp_path {tmp}/uwsgi;
+    scgi_temp_path {tmp}/scgi;
+    server {{
+        listen 127.0.0.1:{nginx_port};
+        location {prefix} {{
+            internal;
+            alias {audio_root}/;
+        }}
+        location / {{
+            proxy_pass http://127.0.0.1:{app_port};
+        }}
+    }}
+}}
+"""
+
+
+def check_nginx(checker, app, audio_root, filename):
+    import socket
+    import audio_delivery
+    from werkzeug.serving import make_server
+
+    nginx = shutil.which('nginx')
+    if nginx is None:
+        print("\n⚠️ 未找到 nginx，跳过经过 nginx 的检查")
+        return
+    print("\n🔍 经过 nginx（AUDIO_DELIVERY=x-accel）")
+    os.environ['AUDIO_DELIVERY'] = 'x-accel'
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        nginx_port = s.getsockname()[1]
+    tmp = tempfile.mkdtemp(prefix='opear_nginx_')
+    with open(os.path.join(tmp, 'nginx.conf'), 'w') as f:
+        f.write(NGINX_CONF.format(tmp=tmp, nginx_port=nginx_port, app_port=server.server_port,
+                                  prefix=audio_delivery.accel_prefix(), audio_root=audio_root))
+    proc = subprocess.Popen([nginx, '-p', tmp, '-c', os.path.join(tmp, 'nginx.conf')])
+    try:
+        url = f'http://127.0.0.1:{nginx_port}/audio/{filename}'
+        for _ in range(50):
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{nginx_port}/login', timeout=1)
+                break
+            except OSError:
+                time.sleep(0.1)
+        with open(os.path.join(audio_root, filename), 'rb') as f:
+            content = f.read()
+        with urllib.request.urlopen(url) as r:
+            checker.check(r.read() == content and 'X-Accel-Redirect' not in r.headers, 'nginx 返回完整文件内容')
+        request = urllib.request.Request(url, headers={'Range': 'bytes=100-199'})
+        with urllib.request.urlopen(request) as r:
+            checker.check(r.status == 206 and r.read() == content[100:200], 'nginx Range 请求返回 206')
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{nginx_port}{audio_delivery.accel_prefix()}{filename}')
+            checker.check(False, '内部路径不能直接访问')
+        except urllib.error.HTTPError as e:
+            checker.check(e.code == 404, '内部路径不能直接访问')
+    finally:
+        proc.terminate()
+        proc.wait()
+        server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.environ.pop('AUDIO_DELIVERY', None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='音频发送方式的集成检查')
+    parser.add_argument('--nginx', action='store_true', help='同时经过本机的 nginx 检查 X-Accel-Redirect')
+    args = parser.parse_args(argv)
+
+    from app import app
+    import audio_delivery
+
+    filename = pick_sample(audio_delivery.AUDIO_ROOT)
+    if filename is None:
+        print("❌ static/audio 下没有可用于检查的 MP3")
+        return 1
+    print(f"🎵 检查文件: {filename}")
+
+    checker = Checker()
+    check_modes(checker, app, audio_delivery.AUDIO_ROOT, filename)
+    if args.nginx:
+        check_nginx(checker, app, audio_delivery.AUDIO_ROOT, filename)
+
+    if checker.failures:
+        print(f"\n❌ {checker.failures} 项检查失败")
+        return 1
+    print("\n✅ 全部检查通过")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""热点查询的执行计划检查
+
+在临时 SQLite 数据库中走一遍开始会话、提交答案、结束会话、首页、统计页和
+汇总表重建，记录期间执行的全部 SELECT，对每条语句执行 EXPLAIN QUERY PLAN。
+任何一条在练习记录表或汇总表上出现全表扫描（SCAN <表> 且未使用索引）时，
+以非零状态码退出。
+
+用法:
+    python check_query_plans.py
+    python check_query_plans.py -v     # 打印每条语句的执行计划
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+# 不允许全表扫描的表
+CHECKED_TABLES = ('practice_session', 'question', 'user_answer',
+                  'user_exercise_stats', 'user_sub_item_stats', 'user_daily_stats')
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)\b(?! USING)')
+
+
+def capture_hot_queries(app, db):
+    """走一遍主要的写入和读取路径，返回期间执行的 (SQL, 参数) 列表"""
+    from sqlalchemy import event
+    from models import User
+    import stats_rollup
+
+    with app.app_context():
+        db.create_all()
+        user = User(username='plan_check', email='plan_check@example.com')
+        user.set_password('plan_check')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    client.get('/api/statistics')  # 建表、补建索引等一次性初始化不计入
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            for exercise_type, correct_value in (('interval', 'minor_third'), ('scale_degree', '3'),
+                                                 ('chord_quality', 'major')):
+                session_id = client.post('/api/start_session', json={
+                    'exercise_type': exercise_type, 'settings': {}}).get_json()['session_id']
+                client.post('/api/submit_answer', json={
+                    'answer': correct_value, 'correct_value': correct_value, 'session_id': session_id,
+                    'question_data': {'exercise_type': exercise_type}, 'response_time': 2.5,
+                    'sub_item': correct_value})
+                client.post('/api/end_session', json={
+                    'session_id': session_id, 'duration': 60, 'total_questions': 1, 'correct_answers': 1})
+            client.get('/')
+            client.get('/api/statistics')
+            stats_rollup.backfill(user_id)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return statements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='热点查询的执行计划检查')
+    parser.add_argument('-v', '--verbose', action='store_true', help='打印每条语句的执行计划')
+    args = parser.parse_args(argv)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='opear_plan_'), 'plan.db')
+    # 必须在导入 app 之前设置，Flask-SQLAlchemy 在 init_app 时创建引擎
+    os.environ['OPEAR_DATABASE_URI'] = 'sqlite:///' + db_path
+
+    from app import app, db
+
+    statements = capture_hot_queries(app, db)
+    failures = []
+    seen = set()
+    with app.app_context():
+        with db.engine.connect() as conn:
+            for statement, parameters in statements:
+                if statement in seen:
+                    continue
+                seen.add(statement)
+                plan = [row[3] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)]
+                scans = [line for line in plan
+                         if FULL_SCAN.match(line) and FULL_SCAN.match(line).group(1) in CHECKED_TABLES]
+                if scans:
+                    failures.append((statement, plan))
+                if args.verbose or scans:
+                    print(('❌ ' if scans else '✅ ') + ' '.join(statement.split()))
+                    for line in plan:
+                        print(f"      {line}")
+
+    print(f"🔍 检查了 {len(seen)} 条不同的查询")
+    if failures:
+        print(f"❌ {len(failures)} 条查询出现全表扫描")
+        return 1
+    print("✅ 没有全表扫描")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
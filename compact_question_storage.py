@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""题目数据去重迁移
+
+把 question 表中仍内联的 question_data JSON 迁移为 question_template 引用
+（见 question_templates.py），并打印迁移前后每个答案占用的字节数。
+分批提交，可中断后重跑；已迁移的记录不会重复处理。
+
+用法:
+    python compact_question_storage.py
+    python compact_question_storage.py --report      # 只打印占用情况
+    python compact_question_storage.py --vacuum      # 迁移后 VACUUM，把释放的页还给文件系统
+    python compact_question_storage.py --db /path/to/opear.db
+"""
+
+import argparse
+import os
+import sys
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+
+def print_report(title, report):
+    print(f"📊 {title}: {report['answers']} 个答案，{report['questions']} 道题，{report['templates']} 个模板")
+    print(f"   题目数据: 内联 {report['inline_bytes']} 字节 + 模板 {report['template_bytes']} 字节，"
+          f"平均每个答案 {report['question_data_bytes_per_answer']:.1f} 字节")
+    if 'question_table_bytes' in report:
+        print(f"   question + question_template 表: {report['question_table_bytes']} 字节，"
+              f"平均每个答案 {report['question_table_bytes_per_answer']:.1f} 字节")
+    if 'database_bytes' in report:
+        print(f"   数据库已用页: {report['database_bytes']} 字节")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='题目数据去重迁移')
+    parser.add_argument('--db', help='SQLite 数据库文件（默认使用应用配置的数据库）')
+    parser.add_argument('--batch-size', type=int, default=2000, help='每个事务迁移的题目数')
+    parser.add_argument('--report', action='store_true', help='只打印占用情况，不迁移')
+    parser.add_argument('--vacuum', action='store_true', help='迁移后执行 VACUUM（SQLite）')
+    args = parser.parse_args(argv)
+
+    if args.db:
+        # 必须在导入 app 之前设置，Flask-SQLAlchemy 在 init_app 时创建引擎
+        os.environ['OPEAR_DATABASE_URI'] = 'sqlite:///' + os.path.abspath(args.db)
+
+    from app import app, db
+    import db_migrations
+    import question_templates
+
+    with app.app_context():
+        db.create_all()
+        db_migrations.upgrade()
+        before = question_templates.storage_report()
+        print_report('迁移前' if not args.report else '当前', before)
+        if args.report:
+            return 0
+
+        compacted = question_templates.compact(batch_size=args.batch_size)
+        print(f"✅ 迁移了 {compacted} 道题的题目数据")
+        if args.vacuum and db.engine.dialect.name == 'sqlite':
+            db.session.close()
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                conn.exec_driver_sql('VACUUM')
+            print("✅ VACUUM 完成")
+        print_report('迁移后', question_templates.storage_report())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""数据库结构升级
+
+db.create_all() 只会创建不存在的表，已有的 opear.db 不会得到新加的列和索引。
+upgrade() 在应用启动阶段（app.initialize_app，gunicorn worker 启动时）执行，可重复运行：
+
+- 为已有的表补加 models.py 中新增的可空列（ALTER TABLE ... ADD COLUMN）
+- 为已有的表补建 models.py 中声明的全部索引（CREATE INDEX IF NOT EXISTS）
+
+数据迁移（如 compact_question_storage.py）耗时与数据量有关，不在启动时执行。
+
+也可以手动执行：
+
+    python db_migrations.py
+"""
+
+from models import db
+
+
+def _add_missing_columns(engine, inspector, table):
+    """补加缺失的列，返回新加的 表.列 列表（只支持可空、无服务端默认值的列）"""
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        if not column.nullable or column.primary_key:
+            raise RuntimeError(f"无法自动为 {table.name} 添加非空列 {column.name}")
+        column_type = column.type.compile(dialect=engine.dialect)
+        ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+        for foreign_key in column.foreign_keys:
+            ddl += f' REFERENCES {foreign_key.column.table.name}({foreign_key.column.name})'
+        with engine.begin() as conn:
+            conn.exec_driver_sql(ddl)
+        added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def upgrade(engine=None):
+    """补加缺失的列、补建缺失的索引，返回新加的列和索引名列表"""
+    engine = engine or db.engine
+    from sqlalchemy import inspect
+
+    inspector = inspect(engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        created.extend(_add_missing_columns(engine, inspector, table))
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine, checkfirst=True)
+                created.append(index.name)
+    return created
+
+
+if __name__ == '__main__':
+    import os
+    import sys
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from app import app
+
+    with app.app_context():
+        db.create_all()
+        created = upgrade()
+        if created:
+            print(f"✅ 新加的列和索引: {', '.join(created)}")
+        else:
+            print("✅ 数据库结构已是最新")
@@ -89,11 +89,20 @@ server {
     listen 80;
     server_name $SERVER_NAME;
 
-    # 静态文件
+    # 静态文件：带内容哈希版本号（?v=）的 URL 长期缓存，其余每次重新验证
     location /static {
         alias $PROJECT_DIR/static;
-        expires 30d;
-        add_header Cache-Control "public, immutable";
+        set \$static_cache_control "no-cache";
+        if (\$arg_v) {
+            set \$static_cache_control "public, max-age=31536000, immutable";
+        }
+        add_header Cache-Control \$static_cache_control;
+    }
+
+    # 音频由 nginx 发送：Flask 校验 /audio/ 路径后返回 X-Accel-Redirect（AUDIO_DELIVERY=x-accel）
+    location /_audio_internal/ {
+        internal;
+        alias $PROJECT_DIR/static/audio/;
     }
 
     # 反向代理
@@ -141,6 +150,7 @@ User=www-data
 Group=www-data
 WorkingDirectory=$PROJECT_DIR
 Environment="PATH=$PROJECT_DIR/venv/bin"
+Environment="AUDIO_DELIVERY=x-accel"
 ExecStart=$PROJECT_DIR/venv/bin/gunicorn -c gunicorn_config.py app:app
 Restart=always
 RestartSec=3
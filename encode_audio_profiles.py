@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""为已有的音频补齐编码档位的变体（见 audio_profiles.py）
+
+请求路径上只渲染原始 MP3（prerender_audio.py 渲染时会同时编码 AUDIO_PROFILES 启用的档位）；
+部署后、打开新档位（或修改档位参数）后，以及定期（cron）运行本脚本为已有文件生成变体：
+
+- 渲染清单中的生成音频（interval / chords / scale）和音色拼接包（sprites）
+- 1 分钟歌曲（songs_1min），可选完整歌曲（--include-songs）和音源（--include-samples）
+
+变体由已有的 MP3 转码得到；之后重新渲染的音频直接从音源编码。已是最新的变体跳过。
+
+用法:
+    AUDIO_PROFILES=mp3,mp3-mono,opus,aac python encode_audio_profiles.py
+    python encode_audio_profiles.py --profiles opus,aac --include-songs
+    python encode_audio_profiles.py --profiles opus --force
+"""
+
+import argparse
+import os
+import sys
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+import audio_engine
+import audio_profiles
+from audio_cache import get_render_cache
+
+GENERATED_DIRS = ('interval', 'chords', 'scale', 'sprites')
+SOURCE_DIRS = ('songs_1min',)
+
+
+def collect(cache, include_songs=False, include_samples=False):
+    """需要编码变体的原始文件（static/audio 下的相对路径）"""
+    files = [path for path in sorted(cache.entries())
+             if path.split('/', 1)[0] in GENERATED_DIRS and path.endswith('.mp3')]
+    source_dirs = list(SOURCE_DIRS) + (['songs'] if include_songs else []) + (['samples'] if include_samples else [])
+    for directory in source_dirs:
+        root = os.path.join(audio_profiles.AUDIO_ROOT, directory)
+        for dirpath, _, names in sorted(os.walk(root)):
+            for name in sorted(names):
+                if name.endswith('.mp3'):
+                    files.append(os.path.relpath(os.path.join(dirpath, name), audio_profiles.AUDIO_ROOT)
+                                 .replace(os.sep, '/'))
+    return files
+
+
+def is_current(cache, rel_path, names):
+    key = audio_profiles.base_key(rel_path, cache)
+    if key is None:
+        return True
+    for profile in audio_profiles.extra_profiles(names):
+        entry = cache.entry(audio_profiles.variant_path(rel_path, profile))
+        if entry is None or entry.get('key') != audio_profiles.variant_key(key, profile):
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='为已有的音频补齐编码档位的变体')
+    parser.add_argument('--profiles', help='逗号分隔的档位，默认取 AUDIO_PROFILES')
+    parser.add_argument('--include-songs', action='store_true', help='同时处理完整歌曲（songs）')
+    parser.add_argument('--include-samples', action='store_true', help='同时处理音源（samples）')
+    parser.add_argument('--force', action='store_true', help='忽略已有变体，全部重新编码')
+    args = parser.parse_args(argv)
+
+    if args.profiles:
+        names = [audio_profiles.ORIGINAL] + [name.strip() for name in args.profiles.split(',')
+                                            if name.strip() != audio_profiles.ORIGINAL]
+        unknown = [name for name in names if name not in audio_profiles.PROFILES]
+        if unknown:
+            print(f"❌ 未知的档位: {', '.join(unknown)}（可选: {', '.join(audio_profiles.PROFILES)}）")
+            return 1
+    else:
+        names = audio_profiles.enabled_profiles()
+    if len(names) == 1:
+        print("⚠️ 没有需要编码的档位：设置 AUDIO_PROFILES 或使用 --profiles")
+        return 1
+
+    from pydub import AudioSegment
+
+    cache = get_render_cache()
+    files = collect(cache, args.include_songs, args.include_samples)
+    print(f"📁 {len(files)} 个原始文件，档位: {', '.join(names[1:])}")
+
+    encoded = skipped = failed = 0
+    start = time.perf_counter()
+    with cache.deferred():
+        for i, rel_path in enumerate(files, 1):
+            if not args.force and is_current(cache, rel_path, names):
+                skipped += 1
+                continue
+            try:
+                segment = AudioSegment.from_mp3(os.path.join(audio_profiles.AUDIO_ROOT, rel_path))
+                pcm = audio_engine.from_segment(segment)
+                audio_profiles.encode_variants(rel_path, pcm, segment.frame_rate, cache=cache, names=names,
+                                               force=args.force)
+            except Exception as e:
+                failed += 1
+                print(f"❌ {rel_path}: {e}")
+                continue
+            encoded += 1
+            if encoded % 100 == 0:
+                print(f"   [{i}/{len(files)}] 已编码 {encoded} 个")
+
+    sizes = {}
+    for path, entry in cache.entries().items():
+        parts = path.split('/')
+        if parts[0] == audio_profiles.VARIANTS_DIR and len(parts) > 2:
+            sizes[parts[1]] = sizes.get(parts[1], 0) + entry.get('size', 0)
+    print(f"🎵 编码 {encoded} 个，跳过 {skipped} 个（已是最新），失败 {failed} 个，"
+          f"耗时 {time.perf_counter() - start:.1f} 秒")
+    for name, size in sorted(sizes.items()):
+        print(f"   {name:<10} {size / 1024 / 1024:8.1f} MB")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
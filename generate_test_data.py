@@ -10,8 +10,10 @@ import json
 # 添加项目路径
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db
+from app import app, db, initialize_app
 from models import User, PracticeSession, Question, UserAnswer
+import question_templates
+import stats_rollup
 
 # 练习类型
 EXERCISE_TYPES = ['interval', 'scale_degree', 'chord_quality']
@@ -99,7 +101,7 @@ def generate_test_data(user_id, days_back=90, sessions_per_day_range=(1, 5)):
                 question = Question(
                     session_id=session.id,
                     exercise_type=exercise_type,
-                    question_data=json.dumps({
+                    template_id=question_templates.intern(exercise_type, {
                         'exercise_type': exercise_type,
                         'sub_item': sub_item
                     }),
@@ -138,6 +140,8 @@ def generate_test_data(user_id, days_back=90, sessions_per_day_range=(1, 5)):
     # 提交所有数据
     try:
         db.session.commit()
+        # 测试数据直接写入记录表，重建该用户的统计汇总
+        stats_rollup.backfill(user_id)
         print(f"✅ 成功生成数据:")
         print(f"   - 会话数: {total_sessions}")
         print(f"   - 题目数: {total_questions}")
@@ -148,6 +152,7 @@ def generate_test_data(user_id, days_back=90, sessions_per_day_range=(1, 5)):
         raise
 
 if __name__ == '__main__':
+    initialize_app()
     with app.app_context():
         # 查找用户
         user = User.query.filter_by(username='re').first()
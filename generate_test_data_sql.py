@@ -24,9 +24,9 @@ SCALE_DEGREES = ['1', '2', 'b3', '3', '4', 'b5', '5', 'b6', '6', 'b7', '7']
 CHORD_TYPES = ['major', 'minor', 'diminished', 'augmented', 'sus4', 'sus2',
                'major7th', 'minor7th', 'dominant7th', 'diminished7th']
 
-def generate_test_data(user_id, days_back=90, sessions_per_day_range=(1, 5)):
-    """生成测试数据"""
-    conn = sqlite3.connect(DB_PATH)
+def generate_test_data(user_id, days_back=90, sessions_per_day_range=(1, 5), db_path=None):
+    """生成测试数据（db_path 默认为 DB_PATH）"""
+    conn = sqlite3.connect(db_path or DB_PATH)
     cursor = conn.cursor()
     
     print(f"开始为用户ID {user_id} 生成测试数据...")
@@ -213,4 +213,6 @@ if __name__ == '__main__':
     # 生成新数据（2周，每种练习类型50-100题）
     generate_test_data(user_id, days_back=14, sessions_per_day_range=(1, 3))
     print("✅ 数据生成完成！")
+    print("💡 数据直接写入了数据库，请运行 python backfill_stats.py --user re 更新统计汇总表")
+    print("💡 题目数据为内联 JSON，可运行 python compact_question_storage.py 去重压缩")
 
@@ -31,3 +31,36 @@ daemon = False
 
 # 注意：worker_tmp_dir 在 macOS 上不需要设置，使用系统默认的临时目录
 
+
+# worker 启动后执行应用启动阶段（建表、迁移、预热知识库缓存，见 app.initialize_app），
+# 再预热音源采样库（需设置 SAMPLE_BANK_PRELOAD=1）
+def post_fork(server, worker):
+    from app import initialize_app
+    initialize_app()
+
+    from sample_bank import preload_from_env
+    loaded = preload_from_env()
+    if loaded:
+        server.log.info("worker %s 预热音源采样 %d 个", worker.pid, loaded)
+
+
+# 主进程启动时清空上次运行留下的请求计时直方图文件（/metrics 合并所有 worker，见 request_timing.py）
+def on_starting(server):
+    from request_timing import get_histograms
+    get_histograms().reset_dir()
+
+
+# 主进程定期轮转、压缩 app.log / access.log / error.log（见 log_archive.py，LOG_ROTATE=0 关闭）
+def when_ready(server):
+    import os
+    import signal
+    if os.environ.get('LOG_ROTATE', '1') == '0':
+        return
+    from log_archive import start_rotation_thread
+
+    def reopen(kinds):
+        # access.log / error.log 由 gunicorn 写：SIGUSR1 让主进程和所有 worker 重新打开日志文件
+        if 'access' in kinds or 'error' in kinds:
+            os.kill(os.getpid(), signal.SIGUSR1)
+
+    start_rotation_thread(on_rotate=reopen)
@@ -0,0 +1,126 @@
+"""登录用户的进程内缓存（Flask-Login user_loader 使用）
+
+Flask-Login 每个带登录 cookie 的请求都会调用 user_loader，原来是一次 User.query.get，
+连 submit_answer 这类只需要 current_user.id 的接口也要先查 user 表。
+现在每个 worker 按用户 id 缓存一份只读快照（CachedUser：id、username、email），
+同一个请求内 Flask-Login 本身会复用 current_user，跨请求由这里复用：
+
+- 登录时放入缓存（put），之后的请求不再查询 user 表
+- 登出时（invalidate）以及 User 行被更新或删除时（SQLAlchemy mapper 事件，如修改密码）立即从本进程缓存移除
+- 其他 worker 中的副本最多保留 IDENTITY_CACHE_TTL 秒；快照里没有密码哈希，
+  校验密码（登录）总是查询数据库
+
+视图里需要修改用户数据时，用 db.session.get(User, current_user.id) 取 ORM 对象，不要修改快照。
+
+配置（环境变量）：
+    IDENTITY_CACHE_TTL   缓存有效期（秒），默认 60；设为 0 时关闭缓存（每个请求都查询）
+    IDENTITY_CACHE_SIZE  每个 worker 最多缓存的用户数，默认 10000
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+from sqlalchemy import event
+
+DEFAULT_TTL = float(os.environ.get('IDENTITY_CACHE_TTL', '60'))
+DEFAULT_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', '10000'))
+
+
+class CachedUser(UserMixin):
+    """用户的只读快照，作为 current_user 使用"""
+
+    __slots__ = ('id', 'username', 'email')
+
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.email)
+
+    def __repr__(self):
+        return f'<CachedUser {self.id} {self.username}>'
+
+
+class IdentityCache:
+    """用户 id -> (CachedUser, 过期时间)，超过 max_size 时淘汰最久未使用的"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, user_id, loader):
+        """返回 user_id 的快照；未缓存或已过期时调用 loader(user_id)（返回 User 或 None）"""
+        if not self.enabled:
+            user = loader(user_id)
+            return CachedUser.from_user(user) if user is not None else None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        user = loader(user_id)
+        if user is None:
+            # 不存在的用户不缓存（cookie 中的 id 已失效）
+            self.invalidate(user_id)
+            return None
+        return self.put(user)
+
+    def put(self, user):
+        """放入（或刷新）用户快照，返回快照"""
+        identity = CachedUser.from_user(user)
+        if not self.enabled:
+            return identity
+        with self._lock:
+            self._entries[identity.id] = (identity, time.monotonic() + self.ttl)
+            self._entries.move_to_end(identity.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return identity
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def install(user_model):
+    """User 行被更新或删除时从本进程缓存移除（修改密码、用户名等）"""
+
+    @event.listens_for(user_model, 'after_update')
+    @event.listens_for(user_model, 'after_delete')
+    def invalidate_identity(mapper, connection, target):
+        get_identity_cache().invalidate(target.id)
+
+
+_cache = None
+
+
+def get_identity_cache():
+    """进程内共享的 IdentityCache"""
+    global _cache
+    if _cache is None:
+        _cache = IdentityCache()
+    return _cache
@@ -0,0 +1,86 @@
+"""知识库文件（Tips、歌曲、Markdown 笔记）的内存缓存
+
+练习页每次请求都要读 tips.json、遍历 data/songs/*/*.json 并逐个解析、读两份笔记。
+这些文件只在部署或编辑内容时变化，改为每个 worker 加载一次后缓存，
+按所依赖文件和目录的 mtime 失效：
+
+- 加载函数返回 (结果, 依赖的路径列表)；路径可以是文件或目录，也可以是尚不存在的路径
+  （之后出现会触发重新加载）。目录的 mtime 在增删文件时变化，文件的 mtime 在修改时变化
+- 距上次检查不到 KNOWLEDGE_CACHE_CHECK_INTERVAL 秒时直接返回缓存，不访问文件系统；
+  超过后只 stat 依赖路径，未变化时不重新遍历目录或解析 JSON
+
+返回的是共享对象，调用方不要修改。
+
+配置（环境变量）：
+    KNOWLEDGE_CACHE_CHECK_INTERVAL  两次 mtime 检查的最短间隔（秒），默认 2；设为 0 时每次都检查
+"""
+
+import os
+import threading
+import time
+
+DEFAULT_CHECK_INTERVAL = float(os.environ.get('KNOWLEDGE_CACHE_CHECK_INTERVAL', '2'))
+
+
+def _stamp(paths):
+    stamp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            stamp.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            stamp.append((path, None, None))
+    return tuple(stamp)
+
+
+class KnowledgeCache:
+    """按名称缓存加载结果，依赖文件的 mtime 变化时重新加载"""
+
+    def __init__(self, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._entries = {}  # 名称 -> [结果, 依赖路径, stamp, 上次检查时间]
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, name, loader):
+        """返回 name 的缓存结果；首次访问或依赖文件变化时调用 loader()"""
+        entry = self._entries.get(name)
+        now = time.monotonic()
+        if entry is not None and now - entry[3] < self.check_interval:
+            return entry[0]
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                if time.monotonic() - entry[3] < self.check_interval:
+                    return entry[0]
+                if _stamp(entry[1]) == entry[2]:
+                    entry[3] = time.monotonic()
+                    return entry[0]
+            # 依赖路径由 loader 给出，加载前用旧的依赖路径取 stamp：
+            # 加载期间被修改的文件在下次检查时会再加载一次，而不是一直停留在旧内容
+            before = _stamp(entry[1]) if entry is not None else None
+            value, paths = loader()
+            paths = tuple(paths)
+            stamp = before if entry is not None and paths == entry[1] else _stamp(paths)
+            self._entries[name] = [value, paths, stamp, time.monotonic()]
+            self.loads += 1
+            return value
+
+    def invalidate(self, name=None):
+        """丢弃 name（None 时丢弃全部）的缓存"""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+
+_cache = None
+
+
+def get_knowledge_cache():
+    """进程内共享的 KnowledgeCache"""
+    global _cache
+    if _cache is None:
+        _cache = KnowledgeCache()
+    return _cache
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""SQLite 并发写入压测
+
+模拟 gunicorn 的多进程 sync worker：每个进程以不同用户登录，开始会话后连续提交答案
+（每 20 题结束一次会话），所有进程同时开始。依次运行以下配置，对比写入吞吐、
+延迟和丢失的写入（submit_answer 遇到 "database is locked" 时回滚但仍返回 ok）：
+
+- default:sync               SQLite 默认的回滚日志模式，每个答案同步提交
+- production:sync            WAL 等（见 sqlite_profile.py），每个答案同步提交
+- production:write-behind    WAL + 答案异步批量写入（见 answer_buffer.py）
+
+write-behind 的吞吐按全部答案落库（含进程退出前的最后一次写入）计算。
+
+用法:
+    python loadtest_sqlite_writes.py
+    python loadtest_sqlite_writes.py --workers 9 --answers 300 --configs production:sync,production:write-behind
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+QUESTIONS_PER_SESSION = 20
+
+DEFAULT_CONFIGS = 'default:sync,production:sync,production:write-behind'
+
+
+def _import_app(db_path, profile, write_behind=False):
+    # 必须在导入 app 之前设置，Flask-SQLAlchemy 在 init_app 时创建引擎
+    os.environ['OPEAR_DATABASE_URI'] = 'sqlite:///' + db_path
+    os.environ['SQLITE_PROFILE'] = profile
+    os.environ['ANSWER_WRITE_BEHIND'] = '1' if write_behind else '0'
+    os.environ['ANSWER_SPOOL_DIR'] = os.path.join(os.path.dirname(db_path), 'spool')
+    sys.stdout = open(os.devnull, 'w')
+    from app import app, db
+    return app, db
+
+
+def _setup(db_path, profile, workers):
+    """建表并创建压测用户"""
+    app, db = _import_app(db_path, profile)
+    from models import User
+
+    with app.app_context():
+        db.create_all()
+        for i in range(workers):
+            user = User(username=f'load{i}', email=f'load{i}@example.com')
+            user.set_password('load')
+            db.session.add(user)
+        db.session.commit()
+
+
+def _worker(db_path, profile, write_behind, user_id, answers, barrier, results):
+    app, db = _import_app(db_path, profile, write_behind)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    client.get('/api/statistics')  # 初始化（建表检查、连接池）不计入
+
+    latencies = []
+    errors = 0
+    barrier.wait()
+    session_id = None
+    for i in range(answers):
+        start = time.perf_counter()
+        if i % QUESTIONS_PER_SESSION == 0:
+            if session_id is not None:
+                r = client.post('/api/end_session', json={
+                    'session_id': session_id, 'duration': 60,
+                    'total_questions': QUESTIONS_PER_SESSION, 'correct_answers': QUESTIONS_PER_SESSION // 2})
+                errors += r.status_code != 200
+            r = client.post('/api/start_session', json={'exercise_type': 'interval', 'settings': {}})
+            if r.status_code != 200:
+                errors += 1
+                continue
+            session_id = r.get_json()['session_id']
+        r = client.post('/api/submit_answer', json={
+            'answer': 'minor_third', 'correct_value': 'minor_third', 'session_id': session_id,
+            'question_data': {'exercise_type': 'interval'}, 'response_time': 3.0,
+            'sub_item': 'minor_third'})
+        errors += r.status_code != 200
+        latencies.append((time.perf_counter() - start) * 1000)
+    # write-behind：等剩余答案写入数据库
+    import app as app_module
+    if app_module.answer_writer is not None:
+        app_module.answer_writer.shutdown()
+    results.put((latencies, errors))
+
+
+def run(profile, write_behind, workers, answers):
+    ctx = multiprocessing.get_context('spawn')
+    db_path = os.path.join(tempfile.mkdtemp(prefix='opear_load_'), 'load.db')
+
+    setup = ctx.Process(target=_setup, args=(db_path, profile, workers))
+    setup.start()
+    setup.join()
+
+    conn = sqlite3.connect(db_path)
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM user ORDER BY id")]
+    conn.close()
+
+    barrier = ctx.Barrier(workers + 1)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(db_path, profile, write_behind, uid, answers, barrier, results))
+             for uid in user_ids]
+    for p in procs:
+        p.start()
+    barrier.wait()
+    start = time.perf_counter()
+    collected = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - start
+    for p in procs:
+        p.join()
+
+    latencies = sorted(l for worker_latencies, _ in collected for l in worker_latencies)
+    conn = sqlite3.connect(db_path)
+    committed = conn.execute("SELECT COUNT(*) FROM user_answer").fetchone()[0]
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.close()
+    attempted = workers * answers
+    return {
+        'config': f"{profile}:{'write-behind' if write_behind else 'sync'}",
+        'journal_mode': journal_mode,
+        'elapsed': elapsed,
+        'committed': committed,
+        'lost': attempted - committed,
+        'errors': sum(e for _, e in collected),
+        'throughput': committed / elapsed if elapsed else 0,
+        'p50': statistics.median(latencies) if latencies else 0,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] if latencies else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SQLite 并发写入压测')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count() * 2 + 1,
+                        help='并发进程数（默认与 gunicorn_config.py 相同）')
+    parser.add_argument('--answers', type=int, default=200, help='每个进程提交的答案数')
+    parser.add_argument('--configs', default=DEFAULT_CONFIGS,
+                        help=f'逗号分隔的 SQLITE_PROFILE:写入模式（sync / write-behind），默认 {DEFAULT_CONFIGS}')
+    args = parser.parse_args(argv)
+
+    print(f"🚀 {args.workers} 个进程 × {args.answers} 个答案")
+    for config in args.configs.split(','):
+        profile, _, mode = config.partition(':')
+        r = run(profile, mode == 'write-behind', args.workers, args.answers)
+        print(f"📊 {r['config']:<24} (journal_mode={r['journal_mode']}): "
+              f"{r['throughput']:.0f} 答案/秒，耗时 {r['elapsed']:.1f} 秒，"
+              f"延迟 p50 {r['p50']:.1f} ms / p95 {r['p95']:.1f} ms，"
+              f"丢失写入 {r['lost']}，错误响应 {r['errors']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,430 @@
+"""日志轮转、压缩归档与按时间范围检索（app.log 以及 gunicorn 的 access.log / error.log）
+
+轮转：当前日志文件超过 LOG_ROTATE_BYTES，或第一行距今超过 LOG_ROTATE_SECONDS 时，
+改名移到 LOG_ARCHIVE_DIR（<名称>.<轮转时间>，如 app.log.20261017-140000），写入方重新打开原路径：
+- app.log：structured_logging 使用 WatchedFileHandler，发现文件被移走后自动重新打开
+- access.log / error.log：gunicorn 主进程收到 SIGUSR1 后重新打开（并通知所有 worker）
+gunicorn 部署时由主进程的后台线程定期检查（gunicorn_config.py 的 when_ready），
+其他部署方式用 cron 运行 python rotate_logs.py。
+
+压缩：改名后等待 LOG_COMPRESS_DELAY 秒（让仍持有旧文件的写入方写完），再压缩成 <段>.gz。
+每 LOG_INDEX_BLOCK 字节（未压缩，按整行切分）单独压缩成一个 gzip 成员，多个成员首尾相接，
+整个文件仍是普通的 gzip（zcat / zgrep 可直接读）。同时写出稀疏索引 <段>.gz.idx：
+
+    {"kind": "app", "start": 1792216800.0, "end": 1792303199.5, "lines": 412003,
+     "blocks": [[块内最早时间, 块内最晚时间, 压缩偏移, 压缩长度], ...]}
+
+检索 [since, until]：
+- 归档段：按索引跳过时间范围不相交的段和块，只解压命中的块
+- 当前文件和尚未压缩的段：按字节偏移二分查找 since 所在位置，从那里顺序读到超过 until 为止
+多个 worker 写同一个文件时时间戳可能有轻微乱序，二分和提前结束都留 SEARCH_SLACK 秒余量，
+每一行仍按精确的时间范围过滤。没有时间戳的行（如 error.log 中的 traceback）沿用上一行的时间和级别。
+
+配置（环境变量）：
+    LOG_ROTATE                 设为 0 时 gunicorn 主进程不做轮转，默认开启
+    LOG_ROTATE_BYTES           单个文件的轮转大小（字节），默认 50 MiB
+    LOG_ROTATE_SECONDS         单个文件的最长时间跨度（秒），默认 86400（每天）
+    LOG_ROTATE_CHECK_INTERVAL  检查间隔（秒），默认 60
+    LOG_COMPRESS_DELAY         轮转后多久压缩（秒），默认 60
+    LOG_INDEX_BLOCK            索引块大小（未压缩字节），默认 256 KiB
+    LOG_ARCHIVE_DIR            归档目录，默认 logs/archive
+    LOG_ARCHIVE_KEEP_DAYS      归档保留天数，默认 30（0 表示不删除）
+    LOG_SEARCH_MAX_LINES       一次检索最多返回的行数，默认 5000
+"""
+
+import fcntl
+import glob
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import log_tail
+import structured_logging
+
+logger = logging.getLogger(__name__)
+
+LOGS_DIR = os.path.join(structured_logging.basedir, 'logs')
+ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR') or os.path.join(LOGS_DIR, 'archive')
+
+ROTATE_BYTES = int(os.environ.get('LOG_ROTATE_BYTES', str(50 * 1024 * 1024)))
+ROTATE_SECONDS = float(os.environ.get('LOG_ROTATE_SECONDS', '86400'))
+ROTATE_CHECK_INTERVAL = float(os.environ.get('LOG_ROTATE_CHECK_INTERVAL', '60'))
+COMPRESS_DELAY = float(os.environ.get('LOG_COMPRESS_DELAY', '60'))
+INDEX_BLOCK = int(os.environ.get('LOG_INDEX_BLOCK', str(256 * 1024)))
+KEEP_DAYS = float(os.environ.get('LOG_ARCHIVE_KEEP_DAYS', '30'))
+SEARCH_MAX_LINES = int(os.environ.get('LOG_SEARCH_MAX_LINES', '5000'))
+
+# 多个写入方之间时间戳的最大乱序（秒）
+SEARCH_SLACK = 5.0
+# 二分查找缩小到这个范围后改为顺序读取
+BISECT_MIN_SPAN = 64 * 1024
+
+KINDS = ('app', 'access', 'error')
+
+# gunicorn 访问日志：... [17/Oct/2026:14:03:22 +0800] "GET / HTTP/1.1" ...
+_ACCESS_TIME = re.compile(r'\[(\d{2}/\w{3}/\d{4}:\d{2}:\d{2}:\d{2} [+-]\d{4})\]')
+# gunicorn 错误日志：[2026-10-17 14:03:22 +0800] [4121] [INFO] Booting worker with pid: 4121
+_ERROR_LINE = re.compile(r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} [+-]\d{4})\] \[\d+\] \[([A-Z]+)\] ')
+
+
+def log_files():
+    """{类型: 当前日志文件路径}"""
+    return {
+        'app': log_tail.default_log_file(),
+        'access': os.path.join(LOGS_DIR, 'access.log'),
+        'error': os.path.join(LOGS_DIR, 'error.log'),
+    }
+
+
+# ---------- 解析 ----------
+
+def parse(line, kind):
+    """返回 (时间戳（epoch 秒）或 None, 级别或 None, 显示文本)"""
+    if kind == 'app':
+        entry = log_tail.parse_line(line)
+        ts = entry['ts'].timestamp() if entry['ts'] else None
+        return ts, entry['level'], log_tail.format_entry(entry)
+    line = line.rstrip('\n')
+    if kind == 'error':
+        match = _ERROR_LINE.match(line)
+        if match:
+            ts = datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S %z').timestamp()
+            return ts, match.group(2), line
+        return None, None, line
+    match = _ACCESS_TIME.search(line)
+    if match:
+        try:
+            return datetime.strptime(match.group(1), '%d/%b/%Y:%H:%M:%S %z').timestamp(), None, line
+        except ValueError:
+            pass
+    return None, None, line
+
+
+def _first_time(path, kind, limit=64 * 1024):
+    """文件开头第一个带时间戳的行的时间"""
+    try:
+        with open(path, 'rb') as f:
+            for raw in f.read(limit).split(b'\n')[:-1]:
+                ts = parse(raw.decode('utf-8', 'replace'), kind)[0]
+                if ts is not None:
+                    return ts
+    except OSError:
+        pass
+    return None
+
+
+# ---------- 轮转与压缩 ----------
+
+class _DirLock:
+    """归档目录上的非阻塞文件锁（gunicorn 主进程和 cron 不会同时轮转）"""
+
+    def __init__(self, archive_dir):
+        os.makedirs(archive_dir, exist_ok=True)
+        self.path = os.path.join(archive_dir, '.lock')
+        self.fd = None
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(self.fd)
+            self.fd = None
+        return self.fd is not None
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+def needs_rotation(path, kind, now=None):
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return False
+    if size == 0:
+        return False
+    if size >= ROTATE_BYTES:
+        return True
+    first = _first_time(path, kind)
+    return first is not None and (now or time.time()) - first >= ROTATE_SECONDS
+
+
+def rotate(force=False, archive_dir=None, files=None):
+    """轮转需要轮转的文件，返回已轮转的类型列表（调用方负责通知 gunicorn 重新打开 access/error）"""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    files = files or log_files()
+    rotated = []
+    with _DirLock(archive_dir) as locked:
+        if not locked:
+            return rotated
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        for kind, path in files.items():
+            if force:
+                if not os.path.exists(path) or os.path.getsize(path) == 0:
+                    continue
+            elif not needs_rotation(path, kind):
+                continue
+            target = os.path.join(archive_dir, f'{os.path.basename(path)}.{stamp}')
+            suffix = 1
+            while os.path.exists(target) or os.path.exists(target + '.gz'):
+                suffix += 1
+                target = os.path.join(archive_dir, f'{os.path.basename(path)}.{stamp}-{suffix}')
+            try:
+                os.rename(path, target)
+            except OSError as e:
+                # 归档目录和日志不在同一个文件系统时不能原子改名
+                logger.warning("⚠️ 日志轮转失败 %s: %s", path, e)
+                continue
+            rotated.append(kind)
+            logger.info("🗂️ 日志已轮转: %s -> %s", path, target)
+    return rotated
+
+
+def _segment_kind(name):
+    for kind, path in log_files().items():
+        if name.startswith(os.path.basename(path) + '.'):
+            return kind
+    return None
+
+
+def compress_segment(path, kind, block_size=None):
+    """把未压缩的归档段压缩成分块 gzip 并写出索引，完成后删除原文件"""
+    block_size = block_size or INDEX_BLOCK
+    gz_path = path + '.gz'
+    blocks = []
+    lines = 0
+    with open(path, 'rb') as src, open(gz_path + '.tmp', 'wb') as dst:
+        block, block_bytes, block_min, block_max = [], 0, None, None
+
+        def flush_block():
+            if not block:
+                return
+            data = gzip.compress(b''.join(block), mtime=0)
+            blocks.append([block_min, block_max, dst.tell(), len(data)])
+            dst.write(data)
+
+        for raw in src:
+            ts = parse(raw.decode('utf-8', 'replace'), kind)[0]
+            # 块按整行切分，且只在有时间戳的行处开始新块（traceback 等续行和所属的行留在同一块）
+            if block_bytes >= block_size and ts is not None:
+                flush_block()
+                block, block_bytes, block_min, block_max = [], 0, None, None
+            block.append(raw)
+            block_bytes += len(raw)
+            lines += 1
+            if ts is not None:
+                block_min = ts if block_min is None else min(block_min, ts)
+                block_max = ts if block_max is None else max(block_max, ts)
+        flush_block()
+    times = [b[0] for b in blocks if b[0] is not None] + [b[1] for b in blocks if b[1] is not None]
+    index = {
+        'kind': kind,
+        'start': min(times) if times else None,
+        'end': max(times) if times else None,
+        'lines': lines,
+        'blocks': blocks,
+    }
+    os.replace(gz_path + '.tmp', gz_path)
+    with open(gz_path + '.idx.tmp', 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(gz_path + '.idx.tmp', gz_path + '.idx')
+    os.remove(path)
+    return index
+
+
+def compress_pending(archive_dir=None, delay=None, now=None):
+    """压缩轮转后超过 delay 秒的段，删除超过保留天数的归档，返回压缩的段数"""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    delay = COMPRESS_DELAY if delay is None else delay
+    now = now or time.time()
+    compressed = 0
+    with _DirLock(archive_dir) as locked:
+        if not locked:
+            return compressed
+        for path in sorted(glob.glob(os.path.join(archive_dir, '*'))):
+            name = os.path.basename(path)
+            if name.endswith(('.gz', '.idx', '.tmp')) or name.startswith('.'):
+                continue
+            kind = _segment_kind(name)
+            if kind is None or now - os.path.getmtime(path) < delay:
+                continue
+            try:
+                index = compress_segment(path, kind)
+            except OSError as e:
+                logger.warning("⚠️ 日志压缩失败 %s: %s", path, e)
+                continue
+            compressed += 1
+            logger.info("🗜️ 日志已压缩: %s（%d 行，%d 个索引块）", name, index['lines'], len(index['blocks']))
+        if KEEP_DAYS > 0:
+            for path in glob.glob(os.path.join(archive_dir, '*.gz')):
+                if now - os.path.getmtime(path) > KEEP_DAYS * 86400:
+                    for stale in (path, path + '.idx'):
+                        try:
+                            os.remove(stale)
+                        except OSError:
+                            pass
+    return compressed
+
+
+def start_rotation_thread(on_rotate=None, interval=None):
+    """后台线程：定期轮转和压缩。on_rotate(类型列表) 在有文件被轮转后调用"""
+    interval = ROTATE_CHECK_INTERVAL if interval is None else interval
+
+    def loop():
+        while True:
+            try:
+                rotated = rotate()
+                if rotated and on_rotate is not None:
+                    on_rotate(rotated)
+                compress_pending()
+            except Exception:
+                logger.exception("❌ 日志轮转出错")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name='log-rotation', daemon=True)
+    thread.start()
+    return thread
+
+
+# ---------- 检索 ----------
+
+def _segments(kind, since, until, archive_dir):
+    """按时间顺序列出可能包含 [since, until] 的段：('gz', 路径, 索引) 或 ('plain', 路径, None)"""
+    current = log_files()[kind]
+    segments = []
+    for path in glob.glob(os.path.join(archive_dir, os.path.basename(current) + '.*')):
+        name = os.path.basename(path)
+        if name.endswith('.gz'):
+            try:
+                with open(path + '.idx', 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                # 索引还没写完：原文件还在，按未压缩段处理
+                continue
+            if index['start'] is None:
+                continue
+            segments.append((index['start'], index['end'], 'gz', path, index))
+        elif not name.endswith(('.idx', '.tmp')) and not os.path.exists(path + '.gz.idx'):
+            segments.append(_plain_segment(path, kind))
+    if os.path.exists(current):
+        segments.append(_plain_segment(current, kind, end=time.time()))
+    result = []
+    for start, end, fmt, path, index in sorted((s for s in segments if s[0] is not None), key=lambda s: s[0]):
+        if end + SEARCH_SLACK >= since and start - SEARCH_SLACK <= until:
+            result.append((fmt, path, index))
+    return result
+
+
+def _plain_segment(path, kind, end=None):
+    start = _first_time(path, kind)
+    try:
+        end = end or os.path.getmtime(path)
+    except OSError:
+        start = None
+    return start, end, 'plain', path, None
+
+
+def _time_at(f, offset, size, kind):
+    """offset 之后第一个完整行中的时间戳（向后找到第一个带时间戳的行），返回 (时间, 行起始偏移)"""
+    f.seek(offset)
+    if offset > 0:
+        f.readline()
+    while f.tell() < size:
+        start = f.tell()
+        raw = f.readline()
+        if not raw.endswith(b'\n'):
+            break
+        ts = parse(raw.decode('utf-8', 'replace'), kind)[0]
+        if ts is not None:
+            return ts, start
+    return None, size
+
+
+def _bisect(f, size, kind, since):
+    """返回一个偏移，其后的行（考虑乱序余量）才可能不早于 since"""
+    lo, hi = 0, size
+    target = since - SEARCH_SLACK
+    while hi - lo > BISECT_MIN_SPAN:
+        mid = (lo + hi) // 2
+        ts, _ = _time_at(f, mid, size, kind)
+        if ts is not None and ts < target:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _plain_lines(path, kind, since):
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        offset = _bisect(f, size, kind, since)
+        f.seek(offset)
+        if offset > 0:
+            f.readline()
+        while f.tell() < size:
+            raw = f.readline()
+            if not raw.endswith(b'\n'):
+                break
+            yield raw
+
+
+def _gz_lines(path, index, since, until):
+    with open(path, 'rb') as f:
+        for block_min, block_max, offset, length in index['blocks']:
+            if block_min is None:
+                continue
+            if block_max + SEARCH_SLACK < since or block_min - SEARCH_SLACK > until:
+                continue
+            f.seek(offset)
+            data = zlib.decompressobj(wbits=31).decompress(f.read(length))
+            yield from data.splitlines(keepends=True)
+
+
+def search(kind, since, until=None, level=None, query=None, max_lines=None, archive_dir=None):
+    """按时间顺序产出 [since, until] 内（且满足最低级别和关键字）的日志行（显示文本）
+
+    since / until 为 datetime 或 epoch 秒；最多 max_lines 行，超出时最后产出 None 表示被截断。
+    """
+    if kind not in KINDS:
+        raise ValueError(f'未知的日志类型: {kind}')
+    since = since.timestamp() if isinstance(since, datetime) else float(since)
+    until = time.time() if until is None else (until.timestamp() if isinstance(until, datetime) else float(until))
+    min_level = logging.getLevelName(level.upper()) if level and level.upper() in log_tail.LEVELS else None
+    max_lines = max_lines or SEARCH_MAX_LINES
+    archive_dir = archive_dir or ARCHIVE_DIR
+
+    emitted = 0
+    for fmt, path, index in _segments(kind, since, until, archive_dir):
+        source = _gz_lines(path, index, since, until) if fmt == 'gz' else _plain_lines(path, kind, since)
+        last_ts, last_level = None, None
+        for raw in source:
+            ts, entry_level, text = parse(raw.decode('utf-8', 'replace'), kind)
+            if ts is None:
+                ts, entry_level = last_ts, last_level
+            else:
+                last_ts, last_level = ts, entry_level
+            if ts is None or ts < since:
+                continue
+            if ts > until:
+                if ts > until + SEARCH_SLACK:
+                    break
+                continue
+            # 访问日志没有级别，不按级别过滤
+            if min_level is not None and entry_level is not None and logging.getLevelName(entry_level) < min_level:
+                continue
+            if query and query not in text:
+                continue
+            if emitted >= max_lines:
+                yield None
+                return
+            emitted += 1
+            yield text
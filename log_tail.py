@@ -0,0 +1,318 @@
+"""日志文件的尾部读取、过滤与追加跟踪（/logs 页面使用）
+
+- tail(): 从文件末尾按块向前读取，只读到凑够所需行数为止，开销与请求的行数成正比，
+  与文件大小无关（不再 readlines() 整个文件）
+- read_new(): 读取给定字节偏移之后新追加的完整行后立即返回；/logs 页面的实时模式定时调用（短请求）
+- follow(): 从给定的字节偏移开始跟踪新追加的完整行（定时轮询文件大小，标准库没有 inotify），
+  文件被截断或轮转（inode 变化）时从新文件开头继续；供 Server-Sent Events 接口逐行推送
+- StreamSlots: 跨 worker 的长连接名额（文件锁），限制同时占用 sync worker 的连接数
+- LogFilter: 按最低级别和时间范围过滤
+
+日志行可以是 structured_logging.py 写出的 JSON，也可以是文本格式
+（"2026-10-17 14:03:22,481 WARNING [app] ..."）；无法识别的行（如 traceback 续行）没有级别和时间，
+只在不按级别/时间过滤时显示。
+"""
+
+import fcntl
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import structured_logging
+
+CHUNK_SIZE = 64 * 1024
+# follow() 每次最多读取的字节数
+READ_LIMIT = 1024 * 1024
+# 带过滤条件向前查找时最多读取的字节数，避免条件很少命中时扫描整个文件
+MAX_SCAN_BYTES = 16 * 1024 * 1024
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+def default_log_file():
+    """应用日志文件：LOG_FILE（默认 logs/app.log），不存在时尝试上一级目录的 logs/app.log"""
+    path = os.environ.get('LOG_FILE') or structured_logging.DEFAULT_LOG_FILE
+    if os.path.exists(path):
+        return path
+    legacy = os.path.join(os.path.dirname(structured_logging.basedir), 'logs', 'app.log')
+    return legacy if os.path.exists(legacy) else path
+
+
+# ---------- 解析与过滤 ----------
+
+def parse_line(line):
+    """解析一行日志，返回 {'ts': datetime 或 None, 'level': str 或 None, 'logger', 'msg', 'exc'}"""
+    line = line.rstrip('\n')
+    if line.startswith('{'):
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            return {
+                'ts': parse_time(data.get('ts')),
+                'level': data.get('level'),
+                'logger': data.get('logger', ''),
+                'msg': data.get('msg', ''),
+                'exc': data.get('exc'),
+            }
+    # 文本格式：%(asctime)s %(levelname)s [%(name)s] %(message)s
+    parts = line.split(' ', 3)
+    if len(parts) == 4 and parts[2] in LEVELS:
+        ts = parse_time(f'{parts[0]} {parts[1]}'.replace(',', '.'))
+        if ts is not None:
+            name, _, msg = parts[3].partition('] ')
+            return {'ts': ts, 'level': parts[2], 'logger': name.lstrip('['), 'msg': msg, 'exc': None}
+    return {'ts': None, 'level': None, 'logger': '', 'msg': line, 'exc': None}
+
+
+def parse_time(value):
+    """ISO 8601 时间（不带时区的按本地时间），无法解析返回 None"""
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return ts.astimezone() if ts.tzinfo is None else ts
+
+
+def format_entry(entry):
+    """页面上显示的一条日志（多行：异常堆栈附在后面）"""
+    if entry['level'] is None:
+        return entry['msg']
+    ts = entry['ts'].strftime('%Y-%m-%d %H:%M:%S') if entry['ts'] else ''
+    text = f"{ts} {entry['level']} [{entry['logger']}] {entry['msg']}"
+    if entry.get('exc'):
+        text += '\n' + entry['exc']
+    return text
+
+
+class LogFilter:
+    """最低级别 + 时间范围 [since, until]"""
+
+    def __init__(self, level=None, since=None, until=None):
+        level = (level or '').upper()
+        self.min_level = logging.getLevelName(level) if level in LEVELS else None
+        self.since = parse_time(since) if isinstance(since, str) else since
+        self.until = parse_time(until) if isinstance(until, str) else until
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(args.get('level'), args.get('since'), args.get('until'))
+
+    @property
+    def active(self):
+        return self.min_level is not None or self.since is not None or self.until is not None
+
+    def matches(self, entry):
+        if not self.active:
+            return True
+        if entry['level'] is None:
+            return False
+        if self.min_level is not None and logging.getLevelName(entry['level']) < self.min_level:
+            return False
+        ts = entry['ts']
+        if self.since is not None and (ts is None or ts < self.since):
+            return False
+        if self.until is not None and (ts is None or ts > self.until):
+            return False
+        return True
+
+    def before_range(self, entry):
+        """向前读取时已经早于 since：更早的行都不会命中（日志按时间追加）"""
+        return self.since is not None and entry['ts'] is not None and entry['ts'] < self.since
+
+
+# ---------- 尾部读取 ----------
+
+def _reverse_lines(f, end):
+    """从 end 向前逐行产出 (起始偏移, 行字节)，不含末尾不完整的行"""
+    position = end
+    buffer = b''
+    while position > 0:
+        size = min(CHUNK_SIZE, position)
+        position -= size
+        f.seek(position)
+        buffer = f.read(size) + buffer
+        lines = buffer.split(b'\n')
+        # 第一段可能是不完整的行，留到下一块
+        buffer = lines[0]
+        offset = position + len(buffer) + 1
+        complete = []
+        for line in lines[1:]:
+            complete.append((offset, line))
+            offset += len(line) + 1
+        for item in reversed(complete):
+            yield item
+    if buffer:
+        yield 0, buffer
+
+
+def tail(path, lines=200, log_filter=None, max_scan_bytes=MAX_SCAN_BYTES):
+    """最后 lines 条（满足过滤条件的）日志，返回 (条目列表（按时间顺序）, 文件末尾偏移)
+
+    末尾偏移是最后一个完整行之后的位置，可直接作为 follow() 的起点。
+    """
+    log_filter = log_filter or LogFilter()
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = size = f.tell()
+        entries = []
+        for offset, raw in _reverse_lines(f, size):
+            if offset + len(raw) == size:
+                # 文件末尾没有换行的部分是正在写入的行，留给 follow()
+                end = offset
+                continue
+            if end - offset > max_scan_bytes:
+                break
+            if not raw.strip():
+                continue
+            entry = parse_line(raw.decode('utf-8', 'replace'))
+            if log_filter.before_range(entry):
+                break
+            if log_filter.matches(entry):
+                entries.append(entry)
+                if len(entries) >= lines:
+                    break
+    entries.reverse()
+    return entries, end
+
+
+# ---------- 追加跟踪 ----------
+
+def read_new(path, offset, file_id=None, log_filter=None, max_lines=None):
+    """offset 之后新追加的（满足过滤条件的）完整行，返回 (条目列表, 新偏移, 文件 ID)
+
+    file_id 是上次返回的文件 ID（inode）；文件已轮转（ID 不同）或被截断（比 offset 短）时从开头读取。
+    一次最多读 READ_LIMIT 字节、保留最后 max_lines 条，调用方带上新偏移继续读。
+    """
+    log_filter = log_filter or LogFilter()
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if (file_id is not None and st.st_ino != file_id) or offset > st.st_size:
+            offset = 0
+        entries = []
+        reader = _read_new_lines(f, offset, log_filter)
+        while True:
+            try:
+                _, entry = next(reader)
+            except StopIteration as stop:
+                offset = stop.value
+                break
+            entries.append(entry)
+    if max_lines is not None:
+        entries = entries[-max_lines:]
+    return entries, offset, st.st_ino
+
+
+def follow(path, offset=None, log_filter=None, max_seconds=30.0, poll_interval=0.5, heartbeat=15.0):
+    """从 offset（默认文件末尾）开始产出新追加的完整行
+
+    产出 (行末偏移, 条目)；每次读到新内容后、以及超过 heartbeat 秒没有新行时产出 (偏移, None)，
+    调用方据此更新偏移或发送心跳。
+    运行 max_seconds 秒后结束（sync worker 不能被长连接一直占用，客户端带上最后的偏移重连）。
+    """
+    log_filter = log_filter or LogFilter()
+    deadline = time.monotonic() + max_seconds
+    last_output = time.monotonic()
+    f = None
+    inode = None
+    try:
+        while time.monotonic() < deadline:
+            if f is None:
+                try:
+                    f = open(path, 'rb')
+                except OSError:
+                    time.sleep(poll_interval)
+                    continue
+                inode = os.fstat(f.fileno()).st_ino
+                size = os.fstat(f.fileno()).st_size
+                offset = size if offset is None else offset
+                if offset > size:
+                    # 文件已被截断或换成了新文件
+                    offset = 0
+            try:
+                current = os.stat(path)
+            except OSError:
+                current = None
+            if current is not None and current.st_ino != inode:
+                # 文件已轮转：先读完旧文件剩下的内容，再从新文件开头继续
+                offset = yield from _read_new_lines(f, offset, log_filter)
+                f.close()
+                f, offset = None, 0
+                continue
+            if current is not None and current.st_size < offset:
+                offset = 0
+            new_offset = yield from _read_new_lines(f, offset, log_filter)
+            if new_offset != offset:
+                # 即使新行都被过滤掉，也把偏移告诉调用方（重连时不必重新扫描）
+                offset = new_offset
+                last_output = time.monotonic()
+                yield offset, None
+            elif time.monotonic() - last_output >= heartbeat:
+                last_output = time.monotonic()
+                yield offset, None
+            else:
+                time.sleep(poll_interval)
+    finally:
+        if f is not None:
+            f.close()
+
+
+class StreamSlots:
+    """跨 worker 的长连接名额：slot_dir 下 count 个锁文件，每个连接非阻塞地锁住其中一个
+
+    名额用完时 acquire() 返回 None，调用方拒绝连接；worker 退出时内核释放文件锁，名额不会泄漏。
+    """
+
+    def __init__(self, slot_dir, count):
+        self.slot_dir = slot_dir
+        self.count = count
+
+    def acquire(self):
+        """占用一个空闲名额，返回 StreamSlot（用完调用 release()）；没有空闲名额时返回 None"""
+        if self.count <= 0:
+            return None
+        os.makedirs(self.slot_dir, exist_ok=True)
+        for i in range(self.count):
+            fd = os.open(os.path.join(self.slot_dir, f'slot-{i}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            return StreamSlot(fd)
+        return None
+
+
+class StreamSlot:
+    """StreamSlots 中被占用的一个名额"""
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def release(self):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+def _read_new_lines(f, offset, log_filter):
+    """读取 offset 之后的完整行并产出匹配的条目，返回新的偏移"""
+    f.seek(offset)
+    data = f.read(READ_LIMIT)
+    cut = data.rfind(b'\n')
+    if cut < 0:
+        # 超长的单行：跳过，避免一直卡在这里
+        return offset + len(data) if len(data) == READ_LIMIT else offset
+    for raw in data[:cut].split(b'\n'):
+        offset += len(raw) + 1
+        if not raw.strip():
+            continue
+        entry = parse_line(raw.decode('utf-8', 'replace'))
+        if log_filter.matches(entry):
+            yield offset, entry
+    return offset
@@ -29,16 +29,34 @@ class PracticeSession(db.Model):
     correct_answers = db.Column(db.Integer, default=0)
     settings = db.Column(db.Text)  # JSON格式存储练习设置
 
+    __table_args__ = (
+        # 按用户 + 练习类型筛选会话（统计、汇总表重建）
+        db.Index('ix_practice_session_user_type', 'user_id', 'exercise_type'),
+    )
+
 class Question(db.Model):
     """通用题目表，支持多种练习类型"""
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('practice_session.id'), nullable=False)
     exercise_type = db.Column(db.String(20), nullable=False)
-    question_data = db.Column(db.Text)  # JSON格式存储题目数据
+    question_data = db.Column(db.Text)  # JSON格式存储题目数据（旧记录；新记录为空，见 template_id）
+    template_id = db.Column(db.Integer, db.ForeignKey('question_template.id'))  # 去重后的题目数据
     correct_answer = db.Column(db.String(100), nullable=False)
     sub_item = db.Column(db.String(100))  # 细分项，如音程练习中的"小二度"、"大二度"等
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # 会话 -> 题目的联表
+        db.Index('ix_question_session_type', 'session_id', 'exercise_type'),
+    )
+
+class QuestionTemplate(db.Model):
+    """去重后的题目数据：相同内容的 question_data 只存一份，Question 通过 template_id 引用"""
+    id = db.Column(db.Integer, primary_key=True)
+    exercise_type = db.Column(db.String(20), nullable=False)
+    fingerprint = db.Column(db.String(40), unique=True, nullable=False)  # 规范化 JSON 的 SHA-1
+    data = db.Column(db.Text, nullable=False)  # 规范化 JSON（键排序、去掉空值）
+
 class UserAnswer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -48,3 +66,42 @@ class UserAnswer(db.Model):
     response_time = db.Column(db.Float)  # 响应时间（秒）
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # 题目 -> 答案的联表
+        db.Index('ix_user_answer_question_user', 'question_id', 'user_id'),
+    )
+
+
+# 统计汇总表：由 stats_rollup 在开始/结束会话和提交答案时增量维护，
+# 首页和统计页只读这些表，不再扫描全部历史记录
+class UserExerciseStats(db.Model):
+    """用户 × 练习类型的会话汇总"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    exercise_type = db.Column(db.String(20), primary_key=True)
+    practice_count = db.Column(db.Integer, nullable=False, default=0)
+    duration = db.Column(db.Integer, nullable=False, default=0)  # 秒
+    total_questions = db.Column(db.Integer, nullable=False, default=0)
+    correct_answers = db.Column(db.Integer, nullable=False, default=0)
+
+class UserSubItemStats(db.Model):
+    """用户 × 练习类型 × 细分项的答题汇总"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    exercise_type = db.Column(db.String(20), primary_key=True)
+    sub_item = db.Column(db.String(100), primary_key=True)
+    total_questions = db.Column(db.Integer, nullable=False, default=0)
+    correct_answers = db.Column(db.Integer, nullable=False, default=0)
+    duration = db.Column(db.Integer, nullable=False, default=0)  # 响应时间（取整秒）累加
+    first_question_id = db.Column(db.Integer)  # 该细分项第一次出现的题目，用于保持显示顺序
+
+class UserDailyStats(db.Model):
+    """用户 × 日期的会话汇总（日期取会话开始时间，UTC）"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    duration = db.Column(db.Integer, nullable=False, default=0)  # 秒
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    timed_sessions = db.Column(db.Integer, nullable=False, default=0)  # 有时长记录的会话数
+
+class AnswerSpoolBatch(db.Model):
+    """已写入数据库的答案批次（answer_buffer 的缓冲文件 ID），崩溃后重放时据此跳过已提交的批次"""
+    id = db.Column(db.String(100), primary_key=True)
+    committed_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""离线预渲染全部练习音频（音程 / 音阶 / 根音 / 和弦）
+
+枚举 generate_question 在 interval、scale_degree、chord_quality 三种练习中
+可能用到的全部音频组合，以及客户端合成模式的音色拼接包（sprite），用进程池并行生成，
+部署时运行一次即可保证请求路径上不再触发任何音频合成。
+
+增量渲染：生成函数通过 audio_cache 的内容寻址清单判断输出是否最新
+（输入哈希包含音符、时长、归一化参数和音源文件内容），最新的任务直接跳过。
+渲染时同时编码 AUDIO_PROFILES 启用的档位（AUDIO_ENCODE_ON_RENDER=1，见 audio_profiles.py），
+缺少变体的音频也会补齐。
+
+用法:
+    python prerender_audio.py                     # 全部类型，默认进程数
+    python prerender_audio.py --only interval -j 8
+    python prerender_audio.py --force             # 忽略清单，全部重新生成
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 添加项目路径
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+from sample_bank import convert_note_name, get_sample_bank
+
+KINDS = ['interval', 'root', 'scale', 'chord', 'sprite']
+
+# 前端音阶练习可选的起始八度（practice.html 中的 octave 下拉框）
+SCALE_OCTAVES = [3, 4, 5]
+# 和弦练习固定使用的八度（generate_question 中的 chord_quality 分支）
+CHORD_OCTAVE = 4
+
+
+def enumerate_jobs(kinds):
+    """枚举所有渲染任务，每个任务为 (name, kind, args)"""
+    from app import (NOTE_NAMES, INTERVALS, KEYS, SCALES, CHORD_TYPES,
+                     build_chord_notes, build_scale_audio_notes)
+
+    jobs = []
+    if 'interval' in kinds:
+        semitone_values = [s for s in INTERVALS if s != 0]
+        for note1_idx in range(len(NOTE_NAMES)):
+            for semitones in semitone_values:
+                for note2_idx in (note1_idx + semitones, note1_idx - semitones):
+                    if not 0 <= note2_idx < len(NOTE_NAMES):
+                        continue
+                    note1 = convert_note_name(NOTE_NAMES[note1_idx])
+                    note2 = convert_note_name(NOTE_NAMES[note2_idx])
+                    args = {'note1': note1, 'note2': note2}
+                    jobs.append((f"interval:{note1}:{note2}", 'interval', args))
+
+    if 'root' in kinds:
+        root_octaves = sorted(set(SCALE_OCTAVES) | {CHORD_OCTAVE})
+        for key in KEYS:
+            for octave in root_octaves:
+                root = convert_note_name(f"{key}{octave}")
+                args = {'key': key, 'octave': octave, 'root': root}
+                jobs.append((f"root:{key}:{octave}", 'root', args))
+
+    if 'scale' in kinds:
+        for key in KEYS:
+            for scale_type in SCALES:
+                for octave in SCALE_OCTAVES:
+                    notes = build_scale_audio_notes(key, scale_type, octave)
+                    args = {'key': key, 'scale_type': scale_type, 'octave': octave, 'notes': notes}
+                    jobs.append((f"scale:{key}:{scale_type}:{octave}", 'scale', args))
+
+    if 'chord' in kinds:
+        for key in KEYS:
+            for chord_type in CHORD_TYPES:
+                notes = build_chord_notes(key, chord_type, CHORD_OCTAVE)
+                args = {'notes': notes}
+                jobs.append((f"chord:{key}:{chord_type}", 'chord', args))
+
+    if 'sprite' in kinds:
+        # 客户端合成模式和渲染超时回退使用的音色拼接包（见 audio_sprites.py）
+        jobs.append(("sprite:piano", 'sprite', {}))
+    return jobs
+
+
+# 每个进程池任务处理的渲染任务数；一批结束时才写一次缓存清单
+BATCH_SIZE = 25
+
+
+def render_batch(batch, force=False):
+    """在工作进程中执行一批任务，返回 [(name, 输出相对路径或 None, 是否实际渲染, 耗时秒, 错误)]"""
+    from audio_cache import get_render_cache
+
+    results = []
+    with get_render_cache().deferred():
+        for name, kind, args in batch:
+            try:
+                results.append((name,) + render_job(kind, args, force) + (None,))
+            except Exception as e:
+                results.append((name, None, False, 0.0, str(e)))
+    return results
+
+
+def render_job(kind, args, force=False):
+    """执行单个任务，返回 (输出相对路径或 None, 是否实际渲染, 耗时秒)"""
+    import app
+    from audio_cache import get_render_cache
+
+    start = time.perf_counter()
+    bank = get_sample_bank('piano')
+    cache = get_render_cache()
+    published_before = cache.published
+    if kind == 'interval':
+        output = app.generate_interval_mp3(args['note1'], args['note2'], force=force)
+    elif kind == 'root':
+        output = app.generate_root_audio_4sec(args['key'], args['octave'], args['root'],
+                                              bank.samples_dir, force=force)
+    elif kind == 'scale':
+        output = app.generate_scale_audio_from_mp3(args['key'], args['scale_type'], args['octave'],
+                                                   args['notes'], bank.samples_dir,
+                                                   convert_note_name, force=force)
+    elif kind == 'chord':
+        output = app.generate_chord_audio(args['notes'], duration=2.0, force=force)
+    elif kind == 'sprite':
+        import audio_sprites
+        audio_sprites.get_sprite_builder().get(app.SPRITE_INSTRUMENT, app.SPRITE_NOTES, force=force)
+        output = audio_sprites.audio_path(app.SPRITE_INSTRUMENT)
+    else:
+        raise ValueError(f"未知任务类型: {kind}")
+    return output, cache.published > published_before, time.perf_counter() - start
+
+
+def _init_worker():
+    # 预先导入应用，避免第一个任务承担导入开销；同时屏蔽生成函数的调试输出
+    import app  # noqa: F401
+    sys.stdout = open(os.devnull, 'w')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='离线预渲染练习音频')
+    parser.add_argument('--only', action='append', choices=KINDS,
+                        help='只渲染指定类型（可重复），默认全部')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='并行进程数')
+    parser.add_argument('--force', action='store_true', help='忽略清单，全部重新生成')
+    args = parser.parse_args(argv)
+
+    # 离线渲染时一并编码变体（工作进程继承环境变量）
+    os.environ['AUDIO_ENCODE_ON_RENDER'] = '1'
+    kinds = args.only or KINDS
+    print(f"🔍 枚举渲染任务: {', '.join(kinds)}")
+    jobs = enumerate_jobs(kinds)
+    print(f"📊 共 {len(jobs)} 个任务")
+    audio_root = os.path.join(basedir, 'static', 'audio')
+
+    rendered = 0
+    skipped = 0
+    failed = 0
+    render_seconds = 0.0
+    written_bytes = 0
+    start = time.perf_counter()
+    batches = [jobs[i:i + BATCH_SIZE] for i in range(0, len(jobs), BATCH_SIZE)]
+    done = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs), initializer=_init_worker) as pool:
+        futures = [pool.submit(render_batch, batch, args.force) for batch in batches]
+        for future in as_completed(futures):
+            for name, output, was_rendered, seconds, error in future.result():
+                if not output:
+                    failed += 1
+                    print(f"❌ 渲染失败: {name}" + (f" ({error})" if error else ""))
+                elif was_rendered:
+                    rendered += 1
+                    render_seconds += seconds
+                    written_bytes += os.path.getsize(os.path.join(audio_root, output))
+                else:
+                    skipped += 1
+            done += 1
+            if done % 10 == 0:
+                elapsed = time.perf_counter() - start
+                finished = min(done * BATCH_SIZE, len(jobs))
+                print(f"   [{finished}/{len(jobs)}] {finished / elapsed:.1f} 个/秒")
+
+    elapsed = time.perf_counter() - start
+    print("=" * 60)
+    print(f"✅ 渲染完成: {rendered}  已是最新: {skipped}  失败: {failed}")
+    print(f"⏱️  总耗时 {elapsed:.1f} 秒，吞吐 {rendered / elapsed if elapsed else 0:.1f} 个/秒"
+          f"（{args.jobs} 进程，单任务平均 {render_seconds / rendered * 1000 if rendered else 0:.0f} 毫秒）")
+    print(f"💾 写出 {written_bytes / 1024 / 1024:.1f} MB")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
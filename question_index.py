@@ -0,0 +1,91 @@
+"""练习题目的预计算索引
+
+音程练习的所有合法 (note1_idx, note2_idx, semitones) 组合在导入时一次性算好，
+按 (音程, 方向) 存成紧凑的 int8 数组；每种过滤条件（允许的音程集合 × 方向集合）
+第一次出现时把对应数组拼接起来并缓存，之后抽题只是一次随机下标访问（O(1)），
+请求路径上不再有 60 × 方向 × 13 的三重循环。
+"""
+
+import random
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+IntervalCandidate = namedtuple('IntervalCandidate', ['note1_idx', 'note2_idx', 'semitones', 'direction'])
+
+DIRECTIONS = ('up', 'down')
+
+
+class IntervalCandidates:
+    """某一过滤条件下的全部候选题目（只读）"""
+
+    __slots__ = ('pairs',)
+
+    def __init__(self, pairs):
+        # pairs: 形状为 (候选数, 3) 的 int8 数组，每行为 (note1_idx, note2_idx, semitones)
+        pairs.flags.writeable = False
+        self.pairs = pairs
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __getitem__(self, i):
+        note1_idx, note2_idx, semitones = (int(v) for v in self.pairs[i])
+        return IntervalCandidate(note1_idx, note2_idx, semitones, 'up' if note2_idx > note1_idx else 'down')
+
+    def sample(self, rng=random):
+        """随机抽取一个候选"""
+        return self[rng.randrange(len(self.pairs))]
+
+    def sample_distinct(self, n, rng=random):
+        """随机抽取 n 个互不相同的候选（候选不足 n 个时全部返回，顺序随机）"""
+        return [self[i] for i in rng.sample(range(len(self.pairs)), min(n, len(self.pairs)))]
+
+
+class IntervalQuestionIndex:
+    """音程题目索引：(允许的音程, 允许的方向) -> IntervalCandidates"""
+
+    def __init__(self, note_count, intervals):
+        self.note_count = note_count
+        # 音程英文名 -> 半音数（同度不出题）
+        self.semitones_by_name = {info['name']: semitones
+                                  for semitones, info in intervals.items() if semitones != 0}
+        self._tables = {}
+        for semitones in self.semitones_by_name.values():
+            note1 = np.arange(max(0, note_count - semitones), dtype=np.int8)
+            self._tables[(semitones, 'up')] = np.stack(
+                [note1, note1 + semitones, np.full_like(note1, semitones)], axis=1)
+            note1 = np.arange(semitones, note_count, dtype=np.int8)
+            self._tables[(semitones, 'down')] = np.stack(
+                [note1, note1 - semitones, np.full_like(note1, semitones)], axis=1)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def candidates(self, interval_names, directions):
+        """返回过滤条件对应的候选集合（按过滤条件缓存）
+
+        参数:
+            interval_names: 允许的音程英文名（未知名称忽略）
+            directions: 允许的方向；与原逻辑一致，'up' 以外的值都按 'down' 处理
+        """
+        semitone_set = frozenset(self.semitones_by_name[name] for name in interval_names
+                                 if name in self.semitones_by_name)
+        direction_set = frozenset('up' if d == 'up' else 'down' for d in directions)
+        memo_key = (semitone_set, direction_set)
+        found = self._memo.get(memo_key)
+        if found is None:
+            parts = [self._tables[(semitones, direction)]
+                     for semitones in sorted(semitone_set) for direction in DIRECTIONS
+                     if direction in direction_set]
+            pairs = np.concatenate(parts) if parts else np.empty((0, 3), dtype=np.int8)
+            found = IntervalCandidates(pairs)
+            with self._lock:
+                found = self._memo.setdefault(memo_key, found)
+        return found
+
+    def stats(self):
+        return {
+            'filters': len(self._memo),
+            'bytes': sum(c.pairs.nbytes for c in self._memo.values()),
+        }
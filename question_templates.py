@@ -0,0 +1,167 @@
+"""题目数据去重存储
+
+submit_answer 过去为每个答案写一份完整的 question_data JSON（练习类型、两个音、
+音频路径等），内容完全由练习类型和少数参数决定，大量重复，question 表占了数据库
+的大部分空间和页缓存。现在题目数据规范化（键排序、去掉空值、音频换成原始路径、紧凑分隔符）后
+按 SHA-1 去重存入 question_template，Question 只保存 template_id。
+
+- intern_many: 写入路径，批量取得（必要时插入）模板 ID，进程内缓存模板 ID
+- question_data: 读取一道题的题目数据（兼容仍内联 question_data 的旧记录）
+- compact: 把旧记录的 question_data 迁移为模板引用（见 compact_question_storage.py）
+- storage_report: 每个答案占用的字节数
+"""
+
+import hashlib
+import json
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import audio_profiles
+from models import db, Question, QuestionTemplate, UserAnswer
+
+_UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+# 指纹 -> 模板 ID（任何事务回滚时清空，避免缓存随回滚失效的 ID）
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_cache(session):
+    with _cache_lock:
+        _cache.clear()
+
+
+def canonical(question_data):
+    """规范化的题目数据 JSON（question_data 可以是 dict 或 JSON 字符串）
+
+    音频路径换成原始文件路径（去掉 ?v= 版本号和 variants/<档位>/ 前缀），
+    同一道题不会因为重新渲染或客户端选择的编码档位不同而存成多个模板
+    """
+    if isinstance(question_data, str):
+        try:
+            question_data = json.loads(question_data) if question_data else {}
+        except ValueError:
+            return question_data
+    if isinstance(question_data, dict):
+        question_data = {key: audio_profiles.original_path(value)
+                         if key.endswith('audio_file') and isinstance(value, str) else value
+                         for key, value in question_data.items() if value is not None}
+    return json.dumps(question_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def fingerprint(exercise_type, data):
+    return hashlib.sha1(f"{exercise_type}\n{data}".encode('utf-8')).hexdigest()
+
+
+def _lookup(fingerprints):
+    if not fingerprints:
+        return {}
+    rows = db.session.query(QuestionTemplate.fingerprint, QuestionTemplate.id).filter(
+        QuestionTemplate.fingerprint.in_(fingerprints))
+    return dict(rows)
+
+
+def intern_many(items):
+    """items 为 (练习类型, question_data)，返回对应的模板 ID 列表（在当前数据库会话中插入新模板，不提交）"""
+    keyed = []
+    for exercise_type, question_data in items:
+        data = canonical(question_data)
+        keyed.append((fingerprint(exercise_type, data), exercise_type, data))
+
+    with _cache_lock:
+        ids = {fp: _cache[fp] for fp, _, _ in keyed if fp in _cache}
+    missing = {fp for fp, _, _ in keyed if fp not in ids}
+    if missing:
+        found = _lookup(missing)
+        with _cache_lock:
+            _cache.update(found)
+        ids.update(found)
+        new = {fp: (exercise_type, data) for fp, exercise_type, data in keyed if fp not in ids}
+        if new:
+            values = [{'fingerprint': fp, 'exercise_type': exercise_type, 'data': data}
+                      for fp, (exercise_type, data) in new.items()]
+            insert = _UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+            if insert is not None:
+                # 其他 worker 可能同时插入同一模板
+                db.session.execute(insert(QuestionTemplate).values(values).on_conflict_do_nothing(
+                    index_elements=['fingerprint']))
+            else:
+                db.session.add_all(QuestionTemplate(**value) for value in values)
+                db.session.flush()
+            ids.update(_lookup(set(new)))
+    return [ids[fp] for fp, _, _ in keyed]
+
+
+def intern(exercise_type, question_data):
+    """单个题目数据的模板 ID"""
+    return intern_many([(exercise_type, question_data)])[0]
+
+
+def question_data(question):
+    """题目数据（dict）"""
+    raw = question.question_data
+    if raw is None and question.template_id is not None:
+        template = db.session.get(QuestionTemplate, question.template_id)
+        raw = template.data if template else None
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return {}
+
+
+def compact(batch_size=2000):
+    """把旧记录内联的 question_data 改为模板引用，返回迁移的题目数（每批提交一次，可中断后重跑）"""
+    compacted = 0
+    while True:
+        rows = db.session.query(Question.id, Question.exercise_type, Question.question_data).filter(
+            Question.question_data.isnot(None)).order_by(Question.id).limit(batch_size).all()
+        if not rows:
+            return compacted
+        template_ids = intern_many([(exercise_type, data) for _, exercise_type, data in rows])
+        db.session.execute(db.update(Question), [
+            {'id': question_id, 'template_id': template_id, 'question_data': None}
+            for (question_id, _, _), template_id in zip(rows, template_ids)])
+        db.session.commit()
+        compacted += len(rows)
+
+
+def storage_report():
+    """题目数据占用的空间：内联 JSON 与模板的字节数、每个答案平均字节数；SQLite 下还有表和数据库文件大小"""
+    answers = db.session.query(db.func.count(UserAnswer.id)).scalar() or 0
+    questions = db.session.query(db.func.count(Question.id)).scalar() or 0
+    inline_bytes = db.session.query(db.func.coalesce(db.func.sum(db.func.length(Question.question_data)), 0)).scalar()
+    templates = db.session.query(db.func.count(QuestionTemplate.id)).scalar() or 0
+    template_bytes = db.session.query(
+        db.func.coalesce(db.func.sum(db.func.length(QuestionTemplate.data) + db.func.length(QuestionTemplate.fingerprint)), 0)
+    ).scalar()
+    report = {
+        'answers': answers,
+        'questions': questions,
+        'inline_bytes': int(inline_bytes),
+        'templates': templates,
+        'template_bytes': int(template_bytes),
+        'question_data_bytes_per_answer': (int(inline_bytes) + int(template_bytes)) / answers if answers else 0,
+    }
+    if db.session.get_bind().dialect.name == 'sqlite':
+        conn = db.session.connection()
+        page_size = conn.exec_driver_sql('PRAGMA page_size').scalar()
+        page_count = conn.exec_driver_sql('PRAGMA page_count').scalar()
+        freelist = conn.exec_driver_sql('PRAGMA freelist_count').scalar()
+        report['database_bytes'] = (page_count - freelist) * page_size
+        try:
+            tables = dict(conn.exec_driver_sql(
+                "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN ('question', 'question_template') GROUP BY name"
+            ).all())
+        except OperationalError:
+            tables = {}  # SQLite 未编译 dbstat
+        if tables:
+            report['question_table_bytes'] = int(sum(tables.values()))
+            report['question_table_bytes_per_answer'] = report['question_table_bytes'] / answers if answers else 0
+    return report
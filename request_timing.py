@@ -0,0 +1,291 @@
+"""请求分阶段计时：Server-Timing 响应头 + 按接口的延迟直方图 + /metrics
+
+每个请求开始时（before_request）在当前线程上开始记录，各阶段的计时器只在有请求记录时生效，
+离线脚本（prerender_audio.py 等）调用同样的函数时没有额外开销。计时点放在各模块的公共入口，
+所有生成函数和接口都经过这些入口：
+
+    sample   音源解码（SampleBank._decode，ffmpeg 解码 MP3）
+    mix      PCM 拼接 / 混音 / 归一化（audio_engine.concat / mix / normalize）
+    encode   编码写出音频文件（audio_engine.export，ffmpeg 编码）
+    cache    生成音频缓存清单查询（RenderCache.lookup）
+    lock     等待其他 worker 渲染同一文件（RenderCache.render_lock）
+    db       SQL 执行（SQLAlchemy before/after_cursor_execute 事件）
+
+同名阶段嵌套时只计最外层（如 normalize 内部不会再被 concat 重复计时）。
+
+请求结束时（after_request）：
+- 响应头 Server-Timing: sample;dur=12.1;desc="n=1", ..., total;dur=58.3（毫秒，n 为次数，浏览器开发者工具可直接查看）
+- 总耗时和各阶段耗时计入按接口（Flask endpoint）的直方图
+
+gunicorn 的每个 worker 各自累计，每隔 METRICS_FLUSH_INTERVAL 秒（以及进程退出时）
+把本进程的直方图原子写到 METRICS_DIR/<pid>-<启动时间>.json；/metrics 读取目录中所有文件求和，
+输出 Prometheus 文本格式。已退出 worker 的文件保留（计数只增不减），gunicorn 主进程启动时清空目录
+（gunicorn_config.py 的 on_starting）。
+
+配置（环境变量）：
+    REQUEST_TIMING          设为 0 关闭计时、Server-Timing 和直方图，默认开启
+    METRICS_DIR             各 worker 直方图文件的目录，默认 logs/metrics
+    METRICS_FLUSH_INTERVAL  写入直方图文件的最短间隔（秒），默认 5
+    METRICS_TOKEN           设置后 /metrics 需要 Authorization: Bearer <token>
+"""
+
+import atexit
+import contextlib
+import functools
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_METRICS_DIR = os.path.join(basedir, 'logs', 'metrics')
+
+logger = logging.getLogger(__name__)
+
+PHASES = ('sample', 'mix', 'encode', 'cache', 'lock', 'db')
+# 直方图桶上限（秒），与 Prometheus 客户端的默认值一致
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_METRIC = 'opear_request_duration_seconds'
+PHASE_METRIC = 'opear_request_phase_seconds'
+METRIC_HELP = {
+    REQUEST_METRIC: '请求总耗时（按接口）',
+    PHASE_METRIC: '请求中各阶段的累计耗时（按接口和阶段）',
+}
+
+
+def enabled():
+    return os.environ.get('REQUEST_TIMING', '1') != '0'
+
+
+# ---------- 单个请求的阶段计时 ----------
+
+_local = threading.local()
+
+
+class _Recorder:
+    __slots__ = ('start', 'durations', 'counts', 'active')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+        self.active = set()
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+
+def start():
+    """在当前线程上开始记录一个请求"""
+    _local.recorder = _Recorder()
+
+
+def finish():
+    """结束当前线程的请求记录，返回 (总耗时秒, {阶段: 耗时秒}, {阶段: 次数})；没有记录时返回 None"""
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is None:
+        return None
+    _local.recorder = None
+    return time.perf_counter() - recorder.start, recorder.durations, recorder.counts
+
+
+def record(name, seconds):
+    """直接计入一段已测得的耗时（如 SQL 事件）"""
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is not None:
+        recorder.add(name, seconds)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """计时一个阶段（没有正在记录的请求或同名阶段已在计时时不做任何事）"""
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is None or name in recorder.active:
+        yield
+        return
+    recorder.active.add(name)
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.active.discard(name)
+        recorder.add(name, time.perf_counter() - start_time)
+
+
+def timed(name):
+    """函数装饰器：调用期间计入阶段 name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = getattr(_local, 'recorder', None)
+            if recorder is None or name in recorder.active:
+                return func(*args, **kwargs)
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def install_sql_timer(engine):
+    """在引擎上注册 SQL 执行计时（阶段 db）"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('request_timing_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_sql_timer(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('request_timing_start')
+        if starts:
+            record('db', time.perf_counter() - starts.pop())
+
+
+def server_timing_header(total, durations, counts):
+    """Server-Timing 响应头的值（毫秒；响应头只能用 ASCII）"""
+    items = []
+    for name in PHASES:
+        if name in durations:
+            items.append(f'{name};dur={durations[name] * 1000:.1f};desc="n={counts[name]}"')
+    items.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(items)
+
+
+# ---------- 直方图（每个 worker 一份，/metrics 时合并） ----------
+
+class Histograms:
+    """{(指标, 标签...): [各桶计数..., +Inf 计数, 总和]}，桶计数不累加（输出时再累加）"""
+
+    def __init__(self, metrics_dir=None, flush_interval=None):
+        self.metrics_dir = metrics_dir or os.environ.get('METRICS_DIR', DEFAULT_METRICS_DIR)
+        self.flush_interval = (float(os.environ.get('METRICS_FLUSH_INTERVAL', '5'))
+                               if flush_interval is None else flush_interval)
+        self._series = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._dirty = False
+        self._path = None
+        self._path_pid = None
+
+    def observe(self, metric, labels, seconds):
+        key = (metric,) + tuple(labels)
+        index = next((i for i, bound in enumerate(BUCKETS) if seconds <= bound), len(BUCKETS))
+        self._check_fork()
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+            self._dirty = True
+
+    def observe_request(self, endpoint, total, durations):
+        self.observe(REQUEST_METRIC, (endpoint,), total)
+        for name, seconds in durations.items():
+            self.observe(PHASE_METRIC, (endpoint, name), seconds)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """把本进程的直方图原子写入 METRICS_DIR"""
+        self._check_fork()
+        with self._lock:
+            if not self._dirty:
+                return
+            data = [[list(key), list(series)] for key, series in self._series.items()]
+            self._dirty = False
+            self._last_flush = time.monotonic()
+            path = self._path
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'buckets': list(BUCKETS), 'series': data}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("⚠️ 无法写入请求计时直方图 %s: %s", path, e)
+
+    def _check_fork(self):
+        # fork 之后 pid 变化：清空从父进程继承的数据并换文件（gunicorn preload 时主进程可能已经创建过实例）
+        pid = os.getpid()
+        if self._path_pid != pid:
+            with self._lock:
+                if self._path_pid != pid:
+                    if self._path_pid is not None:
+                        self._series = {}
+                        self._dirty = False
+                    self._path = os.path.join(self.metrics_dir, f'{pid}-{time.time_ns()}.json')
+                    self._path_pid = pid
+
+    def merged(self):
+        """合并目录中所有 worker 的直方图（先写入本进程的最新数据）"""
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(self.metrics_dir, '*.json')):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get('buckets') != list(BUCKETS):
+                continue
+            for key, series in data.get('series', []):
+                key = tuple(key)
+                total = merged.get(key)
+                if total is None:
+                    merged[key] = list(series)
+                else:
+                    for i, value in enumerate(series):
+                        total[i] += value
+        return merged
+
+    def reset_dir(self):
+        """删除目录中所有 worker 的直方图文件（gunicorn 主进程启动时调用）"""
+        for path in glob.glob(os.path.join(self.metrics_dir, '*.json')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def render_prometheus(merged):
+    """Prometheus 文本格式"""
+    label_names = {REQUEST_METRIC: ('endpoint',), PHASE_METRIC: ('endpoint', 'phase')}
+    lines = []
+    for metric in (REQUEST_METRIC, PHASE_METRIC):
+        lines.append(f'# HELP {metric} {METRIC_HELP[metric]}')
+        lines.append(f'# TYPE {metric} histogram')
+        for key in sorted(k for k in merged if k[0] == metric):
+            series = merged[key]
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(label_names[metric], key[1:]))
+            cumulative = 0
+            for bound, count in zip(BUCKETS + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{{labels}}} {series[-1]:.6f}')
+            lines.append(f'{metric}_count{{{labels}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_histograms = None
+_histograms_lock = threading.Lock()
+
+
+def get_histograms():
+    """进程级的直方图（第一次使用时注册退出时写入）"""
+    global _histograms
+    if _histograms is None:
+        with _histograms_lock:
+            if _histograms is None:
+                _histograms = Histograms()
+                atexit.register(_histograms.flush)
+    return _histograms
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""轮转、压缩日志并按时间范围检索（见 log_archive.py）
+
+gunicorn 部署时主进程会自动轮转；用其他方式运行（run_production.py、flask 开发服务器）时可以用 cron 定期执行。
+轮转了 access.log / error.log 后需要让 gunicorn 重新打开日志文件（kill -USR1 <主进程 pid>）。
+
+用法:
+    python rotate_logs.py                        # 轮转需要轮转的文件，压缩到期的归档段
+    python rotate_logs.py --force --compress-now # 立即轮转所有非空文件并压缩
+    python rotate_logs.py search --since "2026-10-17 14:00" --until "2026-10-17 14:05" --file access
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import log_archive
+import log_tail
+
+
+def run_rotate(args):
+    rotated = log_archive.rotate(force=args.force)
+    for kind in rotated:
+        print(f"🗂️ 已轮转 {kind}")
+    if {'access', 'error'} & set(rotated):
+        print("💡 请让 gunicorn 重新打开日志文件: kill -USR1 <主进程 pid>")
+    start = time.perf_counter()
+    compressed = log_archive.compress_pending(delay=0 if args.compress_now else None)
+    print(f"✅ 轮转 {len(rotated)} 个文件，压缩 {compressed} 个归档段，耗时 {time.perf_counter() - start:.2f} 秒")
+    return 0
+
+
+def run_search(args):
+    since = log_tail.parse_time(args.since)
+    until = log_tail.parse_time(args.until) if args.until else None
+    if since is None or (args.until and until is None):
+        print("❌ 无效的时间（示例：2026-10-17 14:00 或 2026-10-17T14:00:00+08:00）")
+        return 1
+    count = 0
+    for text in log_archive.search(args.file, since, until, level=args.level, query=args.query,
+                                   max_lines=args.max_lines):
+        if text is None:
+            print(f"… 已达到 {args.max_lines or log_archive.SEARCH_MAX_LINES} 行上限", file=sys.stderr)
+            break
+        print(text)
+        count += 1
+    print(f"✅ {count} 行", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='轮转、压缩日志并按时间范围检索')
+    parser.add_argument('--force', action='store_true', help='不论大小和时间，轮转所有非空日志文件')
+    parser.add_argument('--compress-now', action='store_true', help='立即压缩所有未压缩的归档段（不等待 LOG_COMPRESS_DELAY）')
+    subparsers = parser.add_subparsers(dest='command')
+    search = subparsers.add_parser('search', help='按时间范围检索')
+    search.add_argument('--file', choices=log_archive.KINDS, default='app')
+    search.add_argument('--since', required=True, help='开始时间（ISO 格式，不带时区按本地时间）')
+    search.add_argument('--until', help='结束时间，默认现在')
+    search.add_argument('--level', choices=log_tail.LEVELS, help='最低级别（access.log 没有级别，忽略）')
+    search.add_argument('--query', help='只显示包含该文字的行')
+    search.add_argument('--max-lines', type=int, help='最多输出的行数')
+    args = parser.parse_args(argv)
+
+    if args.command == 'search':
+        return run_search(args)
+    return run_rotate(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""进程级音源采样库
+
+每个乐器（static/audio/samples/<instrument>）的音符 MP3 只解码一次，
+以紧凑的 int16 NumPy PCM 数组常驻内存，供音程/和弦/音阶/根音生成函数复用，
+避免每次缓存未命中都 fork ffmpeg 重新解码同一批文件。
+
+配置（环境变量）：
+    SAMPLE_BANK_MAX_MB       每个乐器的内存上限（MB），超出后按 LRU 淘汰，默认 128
+    SAMPLE_BANK_MAX_SECONDS  每个音符保留的最大时长（秒），默认 4（根音音频最长用到 4 秒）
+    SAMPLE_BANK_PRELOAD      设为 1 时在 worker 启动阶段预热 piano 音源
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import audio_engine
+from request_timing import timed
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+SAMPLES_ROOT = os.path.join(basedir, 'static', 'audio', 'samples')
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get('SAMPLE_BANK_MAX_MB', '128')) * 1024 * 1024)
+DEFAULT_MAX_SECONDS = float(os.environ.get('SAMPLE_BANK_MAX_SECONDS', '4'))
+
+# pcm: int16 数组，形状为 (帧数, 声道数)；frame_rate: 采样率
+Sample = namedtuple('Sample', ['pcm', 'frame_rate'])
+
+
+def convert_note_name(note_name):
+    """将音符名称转换为音源文件名格式（如 C#4 -> Cs4）"""
+    if '#' in note_name:
+        parts = note_name.split('#')
+        if len(parts) == 2:
+            note_letter, octave = parts
+            return f"{note_letter}s{octave}"
+    return note_name
+
+
+class SampleBank:
+    """单个乐器的解码采样缓存（线程安全，LRU 淘汰）"""
+
+    def __init__(self, instrument='piano', samples_dir=None, max_bytes=DEFAULT_MAX_BYTES,
+                 max_seconds=DEFAULT_MAX_SECONDS):
+        self.instrument = instrument
+        self.samples_dir = samples_dir or os.path.join(SAMPLES_ROOT, instrument)
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self._cache = OrderedDict()
+        self._nbytes = 0
+        self._available = None
+        self._digests = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def available_notes(self):
+        """音源目录中可用的音符（只列目录一次）"""
+        if self._available is None:
+            try:
+                names = os.listdir(self.samples_dir)
+            except OSError:
+                names = []
+            self._available = frozenset(name[:-4] for name in names if name.endswith('.mp3'))
+        return self._available
+
+    def has(self, note):
+        """音符是否有对应的音源文件（note 为音源格式，如 Cs4）"""
+        return note in self.available_notes()
+
+    def path(self, note):
+        return os.path.join(self.samples_dir, f"{note}.mp3")
+
+    def source_digest(self, note):
+        """音源文件内容的哈希（每个音符只读一次文件），用于判断生成音频是否过期"""
+        digest = self._digests.get(note)
+        if digest is None:
+            try:
+                with open(self.path(note), 'rb') as f:
+                    digest = hashlib.sha1(f.read()).hexdigest()
+            except OSError:
+                digest = 'missing'
+            self._digests[note] = digest
+        return digest
+
+    def get(self, note):
+        """获取解码后的音符采样，不存在或解码失败返回 None"""
+        with self._lock:
+            sample = self._cache.get(note)
+            if sample is not None:
+                self._cache.move_to_end(note)
+                self.hits += 1
+                return sample
+            self.misses += 1
+
+        if not self.has(note):
+            return None
+
+        sample = self._decode(note)
+        with self._lock:
+            if note not in self._cache:
+                self._cache[note] = sample
+                self._nbytes += sample.pcm.nbytes
+                self._evict()
+        return sample
+
+    def segment(self, note):
+        """以 pydub AudioSegment 形式返回音符采样（不经过 ffmpeg）"""
+        sample = self.get(note)
+        if sample is None:
+            return None
+        return audio_engine.to_segment(sample.pcm, sample.frame_rate)
+
+    def warm(self, notes=None):
+        """预先解码指定音符（默认全部），返回成功解码的数量"""
+        loaded = 0
+        for note in sorted(notes if notes is not None else self.available_notes()):
+            if self.get(note) is not None:
+                loaded += 1
+        return loaded
+
+    def stats(self):
+        with self._lock:
+            return {
+                'instrument': self.instrument,
+                'notes': len(self._cache),
+                'bytes': self._nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._nbytes = 0
+            self._available = None
+            self._digests = {}
+
+    @timed('sample')
+    def _decode(self, note):
+        from pydub import AudioSegment
+
+        audio = AudioSegment.from_mp3(self.path(note))
+        if self.max_seconds:
+            audio = audio[:int(self.max_seconds * 1000)]
+        return Sample(audio_engine.from_segment(audio).copy(), audio.frame_rate)
+
+    def _evict(self):
+        # 至少保留最近使用的一个音符，避免单个大文件超过上限时反复解码
+        while self._nbytes > self.max_bytes and len(self._cache) > 1:
+            _, sample = self._cache.popitem(last=False)
+            self._nbytes -= sample.pcm.nbytes
+            self.evictions += 1
+
+
+_banks = {}
+_banks_lock = threading.Lock()
+
+
+def get_sample_bank(instrument='piano'):
+    """获取指定乐器的进程级采样库"""
+    bank = _banks.get(instrument)
+    if bank is None:
+        with _banks_lock:
+            bank = _banks.get(instrument)
+            if bank is None:
+                bank = SampleBank(instrument)
+                _banks[instrument] = bank
+    return bank
+
+
+def preload_from_env():
+    """根据 SAMPLE_BANK_PRELOAD 在 worker 启动阶段预热 piano 音源"""
+    if os.environ.get('SAMPLE_BANK_PRELOAD', '0') != '1':
+        return 0
+    return get_sample_bank('piano').warm()
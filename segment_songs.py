@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""把参考歌曲切分成固定时长的小段（分段播放模式，见 song_segments.py）
+
+部署时运行一次；源文件未变化的歌曲直接跳过。应用以 SONG_SEGMENTS=1 启动后，
+练习页面的参考歌曲按分段加载。
+
+用法:
+    python segment_songs.py
+    python segment_songs.py --segment-seconds 15
+    python segment_songs.py --only Rainbow --force
+"""
+
+import argparse
+import os
+import sys
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+import song_segments
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把参考歌曲切分成固定时长的小段')
+    parser.add_argument('--segment-seconds', type=float, default=song_segments.DEFAULT_SEGMENT_SECONDS,
+                        help=f'每段时长（秒），默认 {song_segments.DEFAULT_SEGMENT_SECONDS}')
+    parser.add_argument('--only', help='只处理文件名包含该字符串的歌曲')
+    parser.add_argument('--force', action='store_true', help='忽略已有索引，全部重新切分')
+    args = parser.parse_args(argv)
+
+    songs_dir = os.path.join(song_segments.AUDIO_ROOT, song_segments.SONGS_DIR)
+    if not os.path.isdir(songs_dir):
+        print(f"❌ 歌曲目录不存在: {songs_dir}")
+        return 1
+    names = sorted(name for name in os.listdir(songs_dir) if name.endswith('.mp3'))
+    if args.only:
+        names = [name for name in names if args.only in name]
+    if not names:
+        print(f"⚠️ 未找到MP3文件在目录: {songs_dir}")
+        return 0
+
+    segment_ms = int(args.segment_seconds * 1000)
+    built = skipped = failed = 0
+    start = time.perf_counter()
+    for name in names:
+        audio_path = f'{song_segments.SONGS_DIR}/{name}'
+        if not args.force and song_segments.is_current(audio_path, segment_ms):
+            skipped += 1
+            continue
+        try:
+            index = song_segments.build_segments(audio_path, args.segment_seconds, force=args.force)
+        except Exception as e:
+            failed += 1
+            print(f"❌ {name}: {e}")
+            continue
+        built += 1
+        print(f"✅ {name}: {len(index['segments'])} 段，"
+              f"共 {sum(s['bytes'] for s in index['segments']) / 1024 / 1024:.1f} MB")
+
+    print(f"🎵 切分 {built} 首，跳过 {skipped} 首（已是最新），失败 {failed} 首，"
+          f"耗时 {time.perf_counter() - start:.1f} 秒")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""参考歌曲的分段文件
+
+static/audio/songs 下的歌曲每首 7–23 MB。/static 路由（以及 nginx）支持 Range 请求，
+浏览器可以只下载需要的部分；分段模式（SONG_SEGMENTS=1）更进一步：
+每首歌预先切成固定时长的小段 MP3，并写一个索引：
+
+    static/audio/songs_segments/<歌曲名>/index.json
+    static/audio/songs_segments/<歌曲名>/seg_000.mp3, seg_001.mp3, ...
+
+前端先取索引，直接加载包含片段起点的那一段，播完再接着加载下一段，
+不需要下载或解析整首歌。索引记录源文件的大小和 mtime，源文件变化后重新切分。
+
+用法见 segment_songs.py。
+"""
+
+import json
+import os
+
+import audio_engine
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+AUDIO_ROOT = os.path.join(basedir, 'static', 'audio')
+SONGS_DIR = 'songs'
+SEGMENTS_DIR = 'songs_segments'
+DEFAULT_SEGMENT_SECONDS = 10
+INDEX_NAME = 'index.json'
+
+
+def segments_enabled():
+    return os.environ.get('SONG_SEGMENTS', '0') == '1'
+
+
+def index_path(audio_path, audio_root=AUDIO_ROOT):
+    """歌曲（static/audio 下的相对路径，如 songs/xxx.mp3）的索引文件路径"""
+    stem = os.path.splitext(os.path.basename(audio_path))[0]
+    return os.path.join(audio_root, SEGMENTS_DIR, stem, INDEX_NAME)
+
+
+def read_index(audio_path, audio_root=AUDIO_ROOT):
+    """已有的索引；不存在或已损坏时返回 None"""
+    try:
+        with open(index_path(audio_path, audio_root), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(audio_path, segment_ms, audio_root=AUDIO_ROOT):
+    """索引是否与源文件和分段时长一致"""
+    index = read_index(audio_path, audio_root)
+    if index is None:
+        return False
+    try:
+        st = os.stat(os.path.join(audio_root, audio_path))
+    except OSError:
+        return False
+    return (index.get('source_size') == st.st_size and index.get('source_mtime') == int(st.st_mtime)
+            and index.get('segment_ms') == segment_ms)
+
+
+def build_segments(audio_path, segment_seconds=DEFAULT_SEGMENT_SECONDS, audio_root=AUDIO_ROOT, force=False):
+    """把歌曲切成 segment_seconds 秒的小段并写索引，返回索引（已是最新时直接返回已有索引）"""
+    from pydub import AudioSegment
+
+    segment_ms = int(segment_seconds * 1000)
+    if not force and is_current(audio_path, segment_ms, audio_root):
+        return read_index(audio_path, audio_root)
+
+    source = os.path.join(audio_root, audio_path)
+    st = os.stat(source)
+    segment = AudioSegment.from_mp3(source)
+    frame_rate = segment.frame_rate
+    pcm = audio_engine.from_segment(segment)
+    total_ms = audio_engine.duration_ms(pcm, frame_rate)
+
+    out_dir = os.path.dirname(index_path(audio_path, audio_root))
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.basename(out_dir)
+    segments = []
+    for number, start_ms in enumerate(range(0, total_ms, segment_ms)):
+        end_ms = min(start_ms + segment_ms, total_ms)
+        name = f'seg_{number:03d}.mp3'
+        path = os.path.join(out_dir, name)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        audio_engine.export(audio_engine.slice_ms(pcm, frame_rate, start_ms, end_ms), frame_rate,
+                            tmp_path, format='mp3')
+        os.replace(tmp_path, path)
+        segments.append({
+            'file': f'{SEGMENTS_DIR}/{stem}/{name}',
+            'start_ms': start_ms,
+            'duration_ms': end_ms - start_ms,
+            'bytes': os.path.getsize(path),
+        })
+
+    # 删除上次切分遗留的多余分段
+    names = {os.path.basename(s['file']) for s in segments}
+    for name in os.listdir(out_dir):
+        if name.startswith('seg_') and name.endswith('.mp3') and name not in names:
+            os.remove(os.path.join(out_dir, name))
+
+    index = {
+        'source': audio_path,
+        'source_size': st.st_size,
+        'source_mtime': int(st.st_mtime),
+        'duration_ms': total_ms,
+        'segment_ms': segment_ms,
+        'segments': segments,
+    }
+    tmp_index = index_path(audio_path, audio_root) + f'.{os.getpid()}.tmp'
+    with open(tmp_index, 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp_index, index_path(audio_path, audio_root))
+    return index
+
+
+def segment_for(index, position_ms):
+    """包含 position_ms 的分段序号"""
+    for number, segment in enumerate(index['segments']):
+        if segment['start_ms'] + segment['duration_ms'] > position_ms:
+            return number
+    return len(index['segments']) - 1
@@ -1,5 +1,8 @@
 // 练习页面JavaScript
 
+// 音频地址前缀：/static/audio/ 或 /audio/（由服务端的 AUDIO_DELIVERY 决定，见 base.html）
+const AUDIO_BASE_URL = window.AUDIO_BASE_URL || '/static/audio/';
+
 // 侧边栏收起/展开功能
 document.addEventListener('DOMContentLoaded', function() {
     const sidebarToggle = document.getElementById('sidebar-toggle');
@@ -199,6 +202,7 @@ function applySettings() {
     // 重置统计
     currentScore = 0;
     currentTotal = 0;
+    questionQueue = [];
     
     if (exerciseType === 'interval') {
         settings.intervals = formData.getAll('intervals');
@@ -312,7 +316,172 @@ function loadQuestion() {
     const exerciseType = window.location.pathname.split('/').pop();
     window.exerciseType = exerciseType;
     
-    // 构建请求参数
+    // 设置变化后丢弃之前预取的题目
+    const params = buildQuestionParams(exerciseType, settings);
+    const queueKey = `${exerciseType}?${params.toString()}`;
+    if (queueKey !== questionQueueKey) {
+        questionQueue = [];
+        questionQueueKey = queueKey;
+    }
+    
+    // 优先使用已预取的题目
+    if (questionQueue.length > 0) {
+        displayQuestion(questionQueue.shift());
+        return;
+    }
+    
+    // 一次请求取回本次练习剩余的全部题目
+    const remaining = totalQuestions - currentTotal;
+    params.append('count', remaining > 0 ? remaining : totalQuestions);
+    
+    // 调用API获取题目
+    fetch(`/api/generate_questions/${exerciseType}?${params.toString()}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.status === 'ok' && data.questions.length > 0) {
+                questionQueue = data.questions;
+                prefetchAudio(data.audio_files || []);
+                if (data.questions[0].sprite) {
+                    spritePlayer.load(data.questions[0].sprite).catch(() => {});
+                }
+                displayQuestion(questionQueue.shift());
+            } else if (data.retry) {
+                // 服务器正在生成音频（其他请求占用），稍后自动重试
+                setTimeout(loadQuestion, 2000);
+            } else {
+                questionArea.innerHTML = `<div class="error-message">${data.msg || '加载失败'}</div>`;
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            questionArea.innerHTML = '<div class="error-message">加载失败，请刷新页面重试</div>';
+        });
+}
+
+// 预取的题目队列
+let questionQueue = [];
+let questionQueueKey = null; // 生成队列时的练习类型和设置
+
+// 后台预取音频（答题期间下载，切到下一题时直接命中浏览器缓存）
+function prefetchAudio(audioFiles) {
+    audioFiles.forEach(file => {
+        fetch(`${AUDIO_BASE_URL}${file}`).catch(() => {});
+    });
+}
+
+// <source> 的 type：出题接口可能返回 Opus / AAC 变体（见 audio_profiles.py）
+function audioSourceType(file) {
+    const path = (file || '').split('?')[0];
+    if (path.endsWith('.webm')) return 'audio/webm';
+    if (path.endsWith('.m4a')) return 'audio/mp4';
+    if (path.endsWith('.wav')) return 'audio/wav';
+    return 'audio/mpeg';
+}
+
+// 客户端合成模式（服务端 AUDIO_SYNTHESIS=client，见 audio_sprites.py）：
+// 题目的 synth 字段给出各音频的音符事件 [音符, 起点 ms, 时长 ms]，
+// 从音色拼接包中截取对应音符，用 Web Audio 调度、混音
+const spritePlayer = {
+    context: null,
+    loads: {},   // 拼接包音频地址 -> Promise<{manifest, buffer}>
+    sources: [],
+    fadeSeconds: 0.01,
+
+    audioContext() {
+        if (!this.context) {
+            const AudioContextClass = window.AudioContext || window.webkitAudioContext;
+            this.context = new AudioContextClass();
+        }
+        return this.context;
+    },
+
+    // 下载并解码拼接包（每个地址只解码一次）
+    load(sprite) {
+        if (!this.loads[sprite.audio]) {
+            const context = this.audioContext();
+            this.loads[sprite.audio] = Promise.all([
+                fetch(`${AUDIO_BASE_URL}${sprite.manifest}`).then(response => response.json()),
+                fetch(`${AUDIO_BASE_URL}${sprite.audio}`)
+                    .then(response => response.arrayBuffer())
+                    .then(data => new Promise((resolve, reject) => context.decodeAudioData(data, resolve, reject))),
+            ]).then(([manifest, buffer]) => ({manifest, buffer}));
+            this.loads[sprite.audio].catch(() => { delete this.loads[sprite.audio]; });
+        }
+        return this.loads[sprite.audio];
+    },
+
+    stop() {
+        this.sources.forEach(source => {
+            try { source.stop(); } catch (e) { /* 已经停止 */ }
+        });
+        this.sources = [];
+    },
+
+    async play(sprite, spec) {
+        const context = this.audioContext();
+        if (context.state === 'suspended') {
+            await context.resume();
+        }
+        const {manifest, buffer} = await this.load(sprite);
+        this.stop();
+        const startAt = context.currentTime + 0.05;
+        spec.events.forEach(([note, startMs, durationMs]) => {
+            const info = manifest.notes[note];
+            if (!info) {
+                console.error('拼接包中没有音符:', note);
+                return;
+            }
+            const duration = Math.min(durationMs, info.duration_ms) / 1000;
+            const start = startAt + startMs / 1000;
+            const level = spec.normalize ? info.norm_gain : 1;
+            const gain = context.createGain();
+            // 结尾短淡出，避免截断处的爆音
+            gain.gain.setValueAtTime(level, start);
+            gain.gain.setValueAtTime(level, start + Math.max(0, duration - this.fadeSeconds));
+            gain.gain.linearRampToValueAtTime(0, start + duration);
+            const source = context.createBufferSource();
+            source.buffer = buffer;
+            source.connect(gain);
+            gain.connect(context.destination);
+            source.start(start, info.start_ms / 1000, duration);
+            this.sources.push(source);
+        });
+    },
+};
+
+// 题目的某个音频字段是否由客户端合成
+function isSynthesized(data, field) {
+    return Boolean(data && data.synth && data.synth[field] && data.sprite);
+}
+
+// 播放客户端合成的音频字段
+function playSynth(field) {
+    const question = window.currentQuestion;
+    if (!isSynthesized(question, field)) return;
+    spritePlayer.play(question.sprite, question.synth[field]).catch(e => {
+        console.error('播放失败:', e);
+    });
+}
+
+// 参考音频：服务端文件用 <audio> 控件，客户端合成用播放按钮
+function referenceAudioHtml(data, field, label, attrs) {
+    if (isSynthesized(data, field)) {
+        return `
+            <button class="play-audio-btn" onclick="playSynth('${field}')">
+                <span>▶️</span> ${label}
+            </button>
+        `;
+    }
+    return `
+        <audio ${attrs} controls preload="metadata" style="width: 100%;">
+            <source src="${AUDIO_BASE_URL}${data[field]}" type="${audioSourceType(data[field])}">
+            您的浏览器不支持音频播放。
+        </audio>
+    `;
+}
+
+// 构建出题请求参数
+function buildQuestionParams(exerciseType, settings) {
     const params = new URLSearchParams();
     if (exerciseType === 'interval') {
         const intervals = settings.intervals || [];
@@ -344,21 +513,7 @@ function loadQuestion() {
             params.append('chord_types', settings.chord_types.join(','));
         }
     }
-    
-    // 调用API获取题目
-    fetch(`/api/generate_question/${exerciseType}?${params.toString()}`)
-        .then(response => response.json())
-        .then(data => {
-            if (data.status === 'ok') {
-                displayQuestion(data);
-            } else {
-                questionArea.innerHTML = `<div class="error-message">${data.msg || '加载失败'}</div>`;
-            }
-        })
-        .catch(error => {
-            console.error('Error:', error);
-            questionArea.innerHTML = '<div class="error-message">加载失败，请刷新页面重试</div>';
-        });
+    return params;
 }
 
 // 显示题目
@@ -396,11 +551,13 @@ function displayQuestion(data) {
                 </p>
                 ` : ''}
                 <div id="interval-audio-container">
+                    ${isSynthesized(data, 'audio_file') ? '' : `
                     <audio id="audioPlayer" controls preload="metadata">
-                        <source src="/static/audio/${data.audio_file}" type="audio/mpeg">
+                        <source src="${AUDIO_BASE_URL}${data.audio_file}" type="${audioSourceType(data.audio_file)}">
                         您的浏览器不支持音频播放。
                     </audio>
                     <br>
+                    `}
                     <button class="play-audio-btn" onclick="playAudio()">
                         <span>▶️</span> 播放音程
                     </button>
@@ -430,7 +587,7 @@ function displayQuestion(data) {
                     当前音阶：<strong style="color: #000000;">${data.scale_name || ''}</strong>
                 </p>
                 <audio id="audioPlayer" controls preload="metadata">
-                    <source src="/static/audio/${data.audio_file}" type="audio/wav">
+                    <source src="${AUDIO_BASE_URL}${data.audio_file}" type="${audioSourceType(data.audio_file)}">
                     您的浏览器不支持音频播放。
                 </audio>
                 <br>
@@ -441,13 +598,10 @@ function displayQuestion(data) {
             <div class="reference-audio-container" style="margin-top: 12px;">
                 <h4 style="font-size: 13px; font-weight: 600; margin-bottom: 8px; color: #000000; font-family: 'JetBrains Mono', 'Space Mono', monospace;">参考音频：</h4>
                 <div style="display: flex; gap: 12px; flex-wrap: wrap;">
-                    ${data.root_audio_file ? `
+                    ${data.root_audio_file || isSynthesized(data, 'root_audio_file') ? `
                     <div style="flex: 1; min-width: 200px;">
                         <label style="font-size: 11px; color: #606060; margin-bottom: 4px; display: block; font-family: 'JetBrains Mono', 'Space Mono', monospace; font-weight: 600;">根音：</label>
-                        <audio controls preload="metadata" style="width: 100%;" onerror="console.error('根音音频加载失败:', this.src)">
-                            <source src="/static/audio/${data.root_audio_file}" type="audio/mpeg">
-                            您的浏览器不支持音频播放。
-                        </audio>
+                        ${referenceAudioHtml(data, 'root_audio_file', '播放根音', `onerror="console.error('根音音频加载失败:', this.src)"`)}
                     </div>
                     ` : `
                     <div style="flex: 1; min-width: 200px;">
@@ -457,11 +611,8 @@ function displayQuestion(data) {
                     `}
                     <div style="flex: 1; min-width: 200px;">
                         <label style="font-size: 11px; color: #606060; margin-bottom: 4px; display: block; font-family: 'JetBrains Mono', 'Space Mono', monospace; font-weight: 600;">完整音阶：</label>
-                        ${data.scale_audio_file ? `
-                        <audio id="scaleAudioPlayer" controls preload="metadata" style="width: 100%;" onerror="console.error('音阶音频加载失败:', this.src)">
-                            <source src="/static/audio/${data.scale_audio_file}" type="audio/mpeg">
-                            您的浏览器不支持音频播放。
-                        </audio>
+                        ${data.scale_audio_file || isSynthesized(data, 'scale_audio_file') ? `
+                        ${referenceAudioHtml(data, 'scale_audio_file', '播放完整音阶', `id="scaleAudioPlayer" onerror="console.error('音阶音频加载失败:', this.src)"`)}
                         ` : '<p style="font-size: 11px; color: #dc2626; padding: 8px; background: #fee2e2; border-radius: 4px;">⚠️ 音阶音频未加载</p>'}
                     </div>
                 </div>
@@ -511,12 +662,10 @@ function displayQuestion(data) {
                         <span>▶️</span> 播放和弦
                     </button>
                 </div>
-                ${data.root_audio_file ? `
+                ${data.root_audio_file || isSynthesized(data, 'root_audio_file') ? `
                 <div style="margin-top: 12px;">
                     <label style="font-size: 12px; color: #606060; margin-bottom: 6px; display: block; font-family: 'JetBrains Mono', 'Space Mono', monospace; font-weight: 600;">参考根音：</label>
-                    <audio controls preload="metadata" style="width: 100%;">
-                        <source src="/static/audio/${data.root_audio_file}" type="audio/mpeg">
-                    </audio>
+                    ${referenceAudioHtml(data, 'root_audio_file', '播放根音', '')}
                 </div>
                 ` : ''}
             </div>
@@ -718,6 +867,10 @@ function showResult(data) {
 
 // 播放音频函数
 function playAudio() {
+    if (isSynthesized(window.currentQuestion, 'audio_file')) {
+        playSynth('audio_file');
+        return;
+    }
     const audioPlayer = document.getElementById('audioPlayer');
     if (audioPlayer) {
         // 移动端需要先加载音频
@@ -743,6 +896,10 @@ function playAudio() {
 
 // 重复播放音频
 function repeatAudio() {
+    if (isSynthesized(window.currentQuestion, 'audio_file')) {
+        playSynth('audio_file');
+        return;
+    }
     const audioPlayer = document.getElementById('audioPlayer');
     if (audioPlayer) {
         audioPlayer.currentTime = 0;
@@ -754,6 +911,10 @@ function repeatAudio() {
 
 // 播放和弦音频（单个文件）
 function playChordAudio() {
+    if (isSynthesized(window.currentQuestion, 'chord_audio_file')) {
+        playSynth('chord_audio_file');
+        return;
+    }
     if (!window.chordAudioFile) {
         console.error('没有和弦音频文件');
         return;
@@ -766,7 +927,7 @@ function playChordAudio() {
     }
     
     // 创建新的音频播放器
-    const audio = new Audio(`/static/audio/${window.chordAudioFile}`);
+    const audio = new Audio(`${AUDIO_BASE_URL}${window.chordAudioFile}`);
     window.chordAudioPlayer = audio;
     
     audio.play().catch(e => {
@@ -0,0 +1,138 @@
+"""静态文件的内容哈希版本号
+
+url_for('static', filename=...) 生成的 URL 自动带上 ?v=<内容哈希>（app.url_defaults），
+生成的音频（interval / chords / scale / root 等）由接口返回带版本号的相对路径。
+请求中的版本号与文件当前内容一致时响应 Cache-Control: public, max-age=31536000, immutable，
+浏览器在文件变化前不再重新验证；文件变化后页面引用新的版本号，旧缓存自然失效。
+
+版本号的来源：
+- 渲染缓存清单中有记录的生成音频：渲染输入哈希（见 audio_cache.py），不读文件
+- 其他文件：文件内容的 SHA-1，按 (mtime, size) 缓存；CSS / JS 等在启动时预先计算，
+  之后最多每 STATIC_VERSION_CHECK_INTERVAL 秒 stat 一次检查是否被修改
+
+配置（环境变量）：
+    STATIC_VERSION_CHECK_INTERVAL  两次 stat 检查的最短间隔（秒），默认 2
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+from audio_cache import get_render_cache
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+STATIC_ROOT = os.path.join(basedir, 'static')
+
+# 版本号长度（十六进制字符）
+VERSION_LENGTH = 12
+# 启动时预先计算版本号的文件类型（音频按需计算）
+PRIME_EXTENSIONS = ('.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.woff', '.woff2')
+# 长期缓存的 Cache-Control
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def _file_digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()[:VERSION_LENGTH]
+
+
+class AssetManifest:
+    """static 目录下文件的版本号"""
+
+    def __init__(self, static_root=STATIC_ROOT, check_interval=None):
+        self.static_root = static_root
+        if check_interval is None:
+            check_interval = float(os.environ.get('STATIC_VERSION_CHECK_INTERVAL', '2'))
+        self.check_interval = check_interval
+        self._entries = {}  # filename -> (mtime_ns, size, 版本号, 上次检查时间)
+        self._lock = threading.Lock()
+
+    def prime(self):
+        """预先计算 CSS / JS / 图片等的版本号，返回文件数"""
+        count = 0
+        for root, dirs, files in os.walk(self.static_root):
+            dirs[:] = [d for d in dirs if d != 'audio']
+            for name in files:
+                if name.endswith(PRIME_EXTENSIONS):
+                    rel = os.path.relpath(os.path.join(root, name), self.static_root).replace(os.sep, '/')
+                    if self.version(rel):
+                        count += 1
+        return count
+
+    def version(self, filename):
+        """filename（static 下的相对路径）的版本号；文件不存在时返回 None"""
+        if filename.startswith('audio/'):
+            version = audio_version(filename[len('audio/'):], fallback=False)
+            if version:
+                return version
+        entry = self._entries.get(filename)
+        now = time.monotonic()
+        if entry is not None and now - entry[3] < self.check_interval:
+            return entry[2]
+        path = os.path.join(self.static_root, filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(filename, None)
+            return None
+        if entry is not None and (st.st_mtime_ns, st.st_size) == entry[:2]:
+            version = entry[2]
+        else:
+            try:
+                version = _file_digest(path)
+            except OSError:
+                return None
+        with self._lock:
+            self._entries[filename] = (st.st_mtime_ns, st.st_size, version, now)
+        return version
+
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+
+def get_asset_manifest():
+    """进程内共享的 AssetManifest"""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                _manifest = AssetManifest()
+    return _manifest
+
+
+def audio_version(rel_path, fallback=True):
+    """static/audio 下文件的版本号：生成音频用渲染输入哈希，fallback 时其他文件用内容哈希"""
+    entry = get_render_cache().entry(rel_path)
+    if entry is not None and entry.get('key'):
+        return entry['key'][:VERSION_LENGTH]
+    if fallback:
+        return get_asset_manifest().version('audio/' + rel_path)
+    return None
+
+
+def versioned_audio(rel_path):
+    """带版本号的音频相对路径（前端拼成 /static/audio/<相对路径>）；无法确定版本时原样返回"""
+    if not rel_path or '?' in rel_path:
+        return rel_path
+    version = audio_version(rel_path)
+    return f'{rel_path}?v={version}' if version else rel_path
+
+
+def add_static_version(endpoint, values):
+    """app.url_defaults 回调：url_for('static', filename=...) 自动带上版本号"""
+    if endpoint != 'static' or 'v' in values or not values.get('filename'):
+        return
+    version = get_asset_manifest().version(values['filename'])
+    if version:
+        values['v'] = version
+
+
+def is_current_version(filename, version):
+    """请求中的版本号是否与文件当前内容一致"""
+    return bool(version) and get_asset_manifest().version(filename) == version
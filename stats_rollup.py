@@ -0,0 +1,221 @@
+"""统计汇总表的增量维护
+
+首页和统计页读取 UserExerciseStats / UserSubItemStats / UserDailyStats，
+读取成本只与返回的行数有关。写入路径在同一个事务里更新汇总表：
+
+- start_session: record_session_start（练习次数、当天会话数）
+- end_session:   record_session_update（时长、题目数、正确数的增量，可重复调用）
+- submit_answer: record_answer（细分项的题数、正确数、响应时间）
+
+汇总按 UPSERT 累加（SQLite / PostgreSQL 的 ON CONFLICT），多个 worker 并发写入也不会丢失计数。
+已有数据或绕过应用直接写库的数据（如 generate_test_data_sql.py）用 backfill 重建：
+
+    python backfill_stats.py
+"""
+
+from datetime import date
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import (db, PracticeSession, Question, UserAnswer,
+                    UserExerciseStats, UserSubItemStats, UserDailyStats)
+
+# 有细分项统计的练习类型
+SUB_ITEM_EXERCISE_TYPES = ('interval', 'scale_degree', 'chord_quality')
+
+_UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def sub_item_for(exercise_type, sub_item, correct_answer):
+    """题目的细分项：音程练习只看 sub_item，其余练习缺省时用正确答案；没有细分项返回 None"""
+    if exercise_type == 'interval':
+        return sub_item or None
+    return sub_item or correct_answer or None
+
+
+def _sub_item_expression():
+    """sub_item_for 的 SQL 版本（空字符串视为缺省）"""
+    sub_item = db.func.nullif(Question.sub_item, '')
+    return db.case(
+        (Question.exercise_type == 'interval', sub_item),
+        else_=db.func.coalesce(sub_item, db.func.nullif(Question.correct_answer, '')),
+    )
+
+
+def _bump(model, keys, increments, **initial):
+    """按主键累加计数列，行不存在时插入（initial 只在插入时写入）"""
+    insert = _UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if insert is not None:
+        stmt = insert(model).values(**keys, **increments, **initial)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: getattr(model, name) + value for name, value in increments.items()},
+        )
+        db.session.execute(stmt)
+        return
+    row = db.session.get(model, tuple(keys.values()))
+    if row is None:
+        row = model(**keys, **{name: 0 for name in increments}, **initial)
+        db.session.add(row)
+    for name, value in increments.items():
+        setattr(row, name, (getattr(row, name) or 0) + value)
+
+
+def snapshot(session):
+    """会话中计入汇总的字段（end_session 修改前调用，用于计算增量）"""
+    return (session.duration or 0, session.total_questions or 0, session.correct_answers or 0)
+
+
+def record_session_start(session):
+    """新会话计入汇总（需在 flush 之后调用，以便取得 start_time）"""
+    duration, total_questions, correct_answers = snapshot(session)
+    _bump(UserExerciseStats, {'user_id': session.user_id, 'exercise_type': session.exercise_type}, {
+        'practice_count': 1,
+        'duration': duration,
+        'total_questions': total_questions,
+        'correct_answers': correct_answers,
+    })
+    if session.start_time:
+        _bump(UserDailyStats, {'user_id': session.user_id, 'day': session.start_time.date()}, {
+            'duration': duration,
+            'sessions': 1,
+            'timed_sessions': 1 if duration else 0,
+        })
+
+
+def record_session_update(session, before):
+    """会话字段更新后，把与 before（snapshot 的结果）的差值计入汇总"""
+    after = snapshot(session)
+    delta_duration, delta_questions, delta_correct = (a - b for a, b in zip(after, before))
+    if delta_duration or delta_questions or delta_correct:
+        _bump(UserExerciseStats, {'user_id': session.user_id, 'exercise_type': session.exercise_type}, {
+            'duration': delta_duration,
+            'total_questions': delta_questions,
+            'correct_answers': delta_correct,
+        })
+    delta_timed = int(bool(after[0])) - int(bool(before[0]))
+    if session.start_time and (delta_duration or delta_timed):
+        _bump(UserDailyStats, {'user_id': session.user_id, 'day': session.start_time.date()}, {
+            'duration': delta_duration,
+            'timed_sessions': delta_timed,
+        })
+
+
+def record_answer(question, answer, session):
+    """答案计入细分项汇总（question 需已 flush；会话不属于答题用户或类型不符时不计入）"""
+    record_answers([(question, answer, session)])
+
+
+def record_answers(items):
+    """批量计入细分项汇总，items 为 (question, answer, session)；同一细分项合并成一次累加"""
+    totals = {}
+    for question, answer, session in items:
+        if session is None or session.user_id != answer.user_id or session.exercise_type != question.exercise_type:
+            continue
+        if question.exercise_type not in SUB_ITEM_EXERCISE_TYPES:
+            continue
+        sub_item = sub_item_for(question.exercise_type, question.sub_item, question.correct_answer)
+        if sub_item is None:
+            continue
+        key = (answer.user_id, question.exercise_type, sub_item)
+        total = totals.setdefault(key, {'total_questions': 0, 'correct_answers': 0, 'duration': 0,
+                                        'first_question_id': question.id})
+        total['total_questions'] += 1
+        total['correct_answers'] += 1 if answer.is_correct else 0
+        total['duration'] += int(answer.response_time or 0)
+        total['first_question_id'] = min(total['first_question_id'], question.id)
+    for (user_id, exercise_type, sub_item), total in totals.items():
+        first_question_id = total.pop('first_question_id')
+        _bump(UserSubItemStats,
+              {'user_id': user_id, 'exercise_type': exercise_type, 'sub_item': sub_item},
+              total, first_question_id=first_question_id)
+
+
+def exercise_totals(user_id):
+    """{练习类型: UserExerciseStats}"""
+    return {row.exercise_type: row for row in UserExerciseStats.query.filter_by(user_id=user_id)}
+
+
+def sub_item_totals(user_id):
+    """细分项汇总，按第一次出现的顺序"""
+    return UserSubItemStats.query.filter_by(user_id=user_id).order_by(UserSubItemStats.first_question_id).all()
+
+
+def daily_totals(user_id):
+    """有会话的日期汇总"""
+    return UserDailyStats.query.filter(UserDailyStats.user_id == user_id, UserDailyStats.sessions > 0).all()
+
+
+def backfill(user_id=None):
+    """从原始记录重建汇总表（user_id 为 None 时重建全部用户），返回写入的汇总行数"""
+    for model in (UserExerciseStats, UserSubItemStats, UserDailyStats):
+        query = model.query if user_id is None else model.query.filter_by(user_id=user_id)
+        query.delete(synchronize_session=False)
+    session_filter = [] if user_id is None else [PracticeSession.user_id == user_id]
+
+    exercise_rows = db.session.query(
+        PracticeSession.user_id,
+        PracticeSession.exercise_type,
+        db.func.count(PracticeSession.id),
+        db.func.coalesce(db.func.sum(PracticeSession.duration), 0),
+        db.func.coalesce(db.func.sum(PracticeSession.total_questions), 0),
+        db.func.coalesce(db.func.sum(PracticeSession.correct_answers), 0),
+    ).filter(*session_filter).group_by(PracticeSession.user_id, PracticeSession.exercise_type).all()
+    exercise_values = [{
+        'user_id': uid, 'exercise_type': exercise_type, 'practice_count': count,
+        'duration': duration, 'total_questions': questions, 'correct_answers': correct,
+    } for uid, exercise_type, count, duration, questions, correct in exercise_rows]
+
+    day = db.func.date(PracticeSession.start_time)
+    daily_rows = db.session.query(
+        PracticeSession.user_id,
+        day,
+        db.func.coalesce(db.func.sum(PracticeSession.duration), 0),
+        db.func.count(PracticeSession.id),
+        db.func.count(db.func.nullif(PracticeSession.duration, 0)),
+    ).filter(PracticeSession.start_time.isnot(None), *session_filter).group_by(PracticeSession.user_id, day).all()
+    daily_values = [{
+        'user_id': uid, 'day': d if isinstance(d, date) else date.fromisoformat(d),
+        'duration': duration, 'sessions': sessions, 'timed_sessions': timed,
+    } for uid, d, duration, sessions, timed in daily_rows]
+
+    sub_item_expr = _sub_item_expression()
+    sub_item_rows = db.session.query(
+        PracticeSession.user_id,
+        Question.exercise_type,
+        sub_item_expr,
+        db.func.count(UserAnswer.id),
+        db.func.sum(db.case((UserAnswer.is_correct, 1), else_=0)),
+        db.func.coalesce(db.func.sum(db.cast(UserAnswer.response_time, db.Integer)), 0),
+        db.func.min(Question.id),
+    ).join(
+        PracticeSession, Question.session_id == PracticeSession.id
+    ).join(
+        UserAnswer, (UserAnswer.question_id == Question.id) & (UserAnswer.user_id == PracticeSession.user_id)
+    ).filter(
+        PracticeSession.exercise_type == Question.exercise_type,
+        Question.exercise_type.in_(SUB_ITEM_EXERCISE_TYPES),
+        sub_item_expr.isnot(None),
+        *session_filter
+    ).group_by(PracticeSession.user_id, Question.exercise_type, sub_item_expr).all()
+    sub_item_values = [{
+        'user_id': uid, 'exercise_type': exercise_type, 'sub_item': sub_item,
+        'total_questions': count, 'correct_answers': correct, 'duration': duration,
+        'first_question_id': first_question_id,
+    } for uid, exercise_type, sub_item, count, correct, duration, first_question_id in sub_item_rows]
+
+    for model, values in ((UserExerciseStats, exercise_values), (UserDailyStats, daily_values),
+                          (UserSubItemStats, sub_item_values)):
+        if values:
+            db.session.execute(db.insert(model), values)
+    db.session.commit()
+    return len(exercise_values) + len(daily_values) + len(sub_item_values)
+
+
+def backfill_if_empty():
+    """汇总表为空但已有练习记录时（首次部署汇总表）自动重建"""
+    if db.session.query(UserExerciseStats.user_id).first() is not None:
+        return 0
+    if db.session.query(PracticeSession.id).first() is None:
+        return 0
+    return backfill()
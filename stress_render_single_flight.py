@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""多进程同时请求同一个未缓存音频的压力测试（见 audio_cache.py 的渲染锁）
+
+每一轮新建一个临时渲染目录，fork 出 --processes 个进程，在同一时刻调用同一个生成函数
+（与 gunicorn 多个 worker 同时收到同一道新题相同）。检查：
+
+- 每个文件（原始 MP3；AUDIO_ENCODE_ON_RENDER=1 时还有 AUDIO_PROFILES 启用的变体）只渲染一次，其余进程复用（coalesced）
+- 所有进程拿到同一个路径；没有残留的临时文件
+- 发布的文件能被 ffmpeg 完整解码，PCM 长度与单进程渲染的参考文件一致（没有截断）
+
+--lock-timeout 设得很小（如 0）时，等锁的进程会超时（RenderTimeout），用来检查回退路径：
+此时只要求没有重复渲染，超时的进程数单独列出。
+
+用法:
+    python stress_render_single_flight.py
+    python stress_render_single_flight.py --processes 32 --rounds 10 --kind chord
+    python stress_render_single_flight.py --lock-timeout 0
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, basedir)
+
+# 每种类型压测的输入（音源格式的音符）
+JOBS = {
+    'interval': ['C4', 'G4'],
+    'chord': ['C4', 'E4', 'G4'],
+}
+
+
+def use_cache(tmp_dir, lock_timeout=None):
+    """让生成函数把文件和清单写到临时目录"""
+    import audio_cache
+
+    audio_cache._cache = audio_cache.RenderCache(audio_root=tmp_dir,
+                                                 manifest_path=os.path.join(tmp_dir, '.render_manifest.json'),
+                                                 lock_timeout=lock_timeout)
+    return audio_cache._cache
+
+
+def render(kind):
+    """调用生成函数，返回相对路径（等锁超时抛出 RenderTimeout）"""
+    import app
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if kind == 'interval':
+            return app.generate_interval_mp3(*JOBS[kind])
+        return app.generate_chord_audio(JOBS[kind], duration=2.0)
+
+
+def worker(kind, tmp_dir, lock_timeout, barrier, results):
+    from audio_cache import RenderTimeout
+
+    cache = use_cache(tmp_dir, lock_timeout)
+    barrier.wait()
+    start = time.perf_counter()
+    try:
+        output, error = render(kind), None
+    except RenderTimeout as e:
+        output, error = None, f'timeout: {e}'
+    results.put({
+        'pid': os.getpid(),
+        'output': output,
+        'error': error,
+        'published': cache.published,
+        'coalesced': cache.coalesced,
+        'lock_timeouts': cache.lock_timeouts,
+        'seconds': time.perf_counter() - start,
+    })
+
+
+def decode(path):
+    """ffmpeg 解码成 PCM，返回 (字节数, 错误输出)"""
+    from pydub import AudioSegment
+
+    proc = subprocess.run([AudioSegment.converter, '-v', 'error', '-i', path, '-f', 's16le', '-'],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return len(proc.stdout), proc.stderr.decode('utf-8', 'replace').strip() or (
+        f'ffmpeg 退出码 {proc.returncode}' if proc.returncode else '')
+
+
+def published_files(cache, rel_path):
+    """rel_path 对应的原始文件和渲染时编码的变体"""
+    import audio_profiles
+
+    if not audio_profiles.encode_on_render():
+        return [rel_path]
+    return [rel_path] + [audio_profiles.variant_path(rel_path, profile) for profile in audio_profiles.extra_profiles()]
+
+
+def reference_lengths(kind):
+    """单进程渲染一次，记录每个文件解码后的 PCM 字节数"""
+    tmp_dir = tempfile.mkdtemp(prefix='opear_ref_')
+    try:
+        cache = use_cache(tmp_dir)
+        rel_path = render(kind)
+        return {path: decode(os.path.join(tmp_dir, path))[0] for path in published_files(cache, rel_path)}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run_round(kind, processes, lock_timeout, reference):
+    """返回 (问题列表, 统计)"""
+    tmp_dir = tempfile.mkdtemp(prefix='opear_stress_')
+    ctx = multiprocessing.get_context('fork')
+    barrier = ctx.Barrier(processes)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(kind, tmp_dir, lock_timeout, barrier, results))
+             for _ in range(processes)]
+    try:
+        for proc in procs:
+            proc.start()
+        rows = [results.get(timeout=300) for _ in procs]
+        for proc in procs:
+            proc.join()
+
+        problems = []
+        outputs = {row['output'] for row in rows if row['output']}
+        if len(outputs) != 1:
+            problems.append(f'进程拿到的路径不一致: {sorted(outputs)}')
+        expected = len(reference)
+        published = sum(row['published'] for row in rows)
+        if published != expected:
+            problems.append(f'渲染了 {published} 次，应为 {expected} 次（每个文件一次）')
+        for row in rows:
+            if row['error'] and not row['error'].startswith('timeout'):
+                problems.append(f"进程 {row['pid']} 失败: {row['error']}")
+        leftovers = [name for _, _, names in os.walk(tmp_dir) for name in names if name.endswith('.tmp')]
+        if leftovers:
+            problems.append(f'残留临时文件: {leftovers}')
+        for path, length in reference.items():
+            full_path = os.path.join(tmp_dir, path)
+            if not os.path.exists(full_path):
+                problems.append(f'文件不存在: {path}')
+                continue
+            decoded, errors = decode(full_path)
+            if errors:
+                problems.append(f'{path} 解码出错: {errors}')
+            if decoded != length:
+                problems.append(f'{path} 解码后 {decoded} 字节，参考文件 {length} 字节（截断）')
+
+        stats = {
+            'published': published,
+            'coalesced': sum(row['coalesced'] for row in rows),
+            'timeouts': sum(1 for row in rows if row['error']),
+            'max_seconds': max(row['seconds'] for row in rows),
+        }
+        return problems, stats
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.kill()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='多进程同时请求同一个未缓存音频的压力测试')
+    parser.add_argument('--kind', choices=sorted(JOBS), default='interval')
+    parser.add_argument('--processes', type=int, default=16, help='同时请求的进程数')
+    parser.add_argument('--rounds', type=int, default=5, help='轮数（每轮使用新的临时目录）')
+    parser.add_argument('--lock-timeout', type=float, help='等锁超时（秒），默认取 AUDIO_RENDER_LOCK_TIMEOUT')
+    args = parser.parse_args(argv)
+
+    import app  # noqa: F401  在父进程导入一次，fork 出的进程直接复用
+    from sample_bank import get_sample_bank
+
+    get_sample_bank('piano').warm(JOBS[args.kind])
+    reference = reference_lengths(args.kind)
+    print(f"🎯 {args.kind} {'+'.join(JOBS[args.kind])}: {len(reference)} 个文件，"
+          f"{args.processes} 个进程 × {args.rounds} 轮")
+
+    failed = 0
+    for i in range(1, args.rounds + 1):
+        problems, stats = run_round(args.kind, args.processes, args.lock_timeout, reference)
+        status = '✅' if not problems else '❌'
+        print(f"{status} 第 {i} 轮: 渲染 {stats['published']} 次，复用 {stats['coalesced']} 次，"
+              f"等锁超时 {stats['timeouts']} 个进程，最慢 {stats['max_seconds'] * 1000:.0f} ms")
+        for problem in problems:
+            print(f"   {problem}")
+        failed += bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""结构化日志：分级、JSON 行格式、队列异步写出
+
+各模块使用自己的 logger（logging.getLogger(__name__)），日志统一经过根 logger 上的
+队列处理器：请求线程只把记录放进有界内存队列（不做任何 I/O、不等锁），
+由每个进程一个后台线程（QueueListener）格式化并写入文件 / 控制台。
+队列满时丢弃新记录并计数，不阻塞请求。
+
+文件中每行一个 JSON 对象：
+
+    {"ts": "2026-10-17T14:03:22.481+08:00", "level": "WARNING", "logger": "app", "pid": 4121,
+     "msg": "⚠️ 无法生成缩短版根音音频，使用原始文件: C4.mp3", "exc": "Traceback ..."}
+
+logger.info(..., extra={'note': 'C4'}) 中的额外字段原样写入 JSON。
+
+调试用的诊断信息（目录列表、音频时长、逐个音符的处理过程）只在 DEBUG 级别输出；
+计算开销较大的诊断先用 logger.isEnabledFor(logging.DEBUG) 判断，生产环境（INFO）不会执行。
+
+配置（环境变量）：
+    LOG_LEVEL       根 logger 级别，默认 INFO（排查问题时设为 DEBUG）
+    LOG_FILE        日志文件，默认 logs/app.log；设为空字符串时只输出到控制台
+    LOG_FORMAT      json（默认）/ text（文件和控制台都用单行文本）
+    LOG_CONSOLE     设为 1 时同时输出到 stderr（文本格式），未配置 LOG_FILE 时总是输出
+    LOG_QUEUE_SIZE  内存队列上限（条），默认 10000
+
+日志文件的轮转、压缩归档和按时间检索见 log_archive.py。
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime
+
+basedir = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_LOG_FILE = os.path.join(basedir, 'logs', 'app.log')
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+# LogRecord 自带的属性；其余属性视为 extra 字段写入 JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+_EXC_FORMATTER = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录格式化为一行 JSON"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时丢弃记录并计数（标准 QueueHandler 会把 queue.Full 当作错误打印堆栈）"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # 在请求线程里只合并 msg % args 并格式化异常（参数和 traceback 可能引用请求中的对象），
+        # 完整的格式化（JSON / 文本）留给后台线程
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXC_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_handler = None
+_listener = None
+_lock = threading.Lock()
+
+
+def _build_handlers():
+    fmt = os.environ.get('LOG_FORMAT', 'json')
+    log_file = os.environ.get('LOG_FILE', DEFAULT_LOG_FILE)
+    handlers = []
+    if log_file:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        # 文件被轮转（移走）后自动重新打开，见 log_archive.py
+        file_handler = logging.handlers.WatchedFileHandler(log_file, encoding='utf-8', delay=True)
+        file_handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+        handlers.append(file_handler)
+    if not log_file or os.environ.get('LOG_CONSOLE') == '1':
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(console)
+    return handlers
+
+
+def _start_listener():
+    global _listener
+    _listener = logging.handlers.QueueListener(_handler.queue, *_build_handlers(), respect_handler_level=True)
+    _listener.start()
+
+
+def configure():
+    """给根 logger 安装队列处理器并启动后台写出线程（每个进程调用一次，重复调用无效果）"""
+    global _handler
+    with _lock:
+        if _handler is not None:
+            return _handler
+        level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+        _handler = DroppingQueueHandler(queue.Queue(int(os.environ.get('LOG_QUEUE_SIZE', '10000'))))
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(getattr(logging, level, logging.INFO))
+        _start_listener()
+        atexit.register(shutdown)
+        # gunicorn preload 时在主进程配置：fork 出的 worker 没有后台线程，需要重新启动
+        os.register_at_fork(after_in_child=_restart_after_fork)
+        return _handler
+
+
+def _restart_after_fork():
+    if _handler is None:
+        return
+    # 子进程继承的队列可能带着父进程的锁状态，换一个新队列
+    _handler.queue = queue.Queue(_handler.queue.maxsize)
+    _handler.dropped = 0
+    _start_listener()
+
+
+def shutdown():
+    """写出队列中剩余的记录并停止后台线程（进程退出时自动调用）"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def stats():
+    return {
+        'queued': _handler.queue.qsize() if _handler else 0,
+        'dropped': _handler.dropped if _handler else 0,
+    }